@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+package_formats.py.
+
+Compares the legacy and latest (zstd) package formats on existing packages.
+Every package is repackaged from its own collection and media in the legacy format and
+in the latest format at several zstd levels, so all variants hold identical content.
+For each variant the benchmark reports the file size, the time to write it and the
+time to import it: into a fresh collection with Anki's own importer when the anki
+package is installed, otherwise the time to extract the collection and read its notes.
+
+Usage:
+  python src/generate.py --mode uber && python src/generate.py --mode per-level
+  python benchmarks/package_formats.py src/output/italian-*-v$(cat VERSION).apkg
+  python benchmarks/package_formats.py deck.apkg --levels 3,19 --repeat 5
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from apkg import extract_collection, package_collection, require_zstandard  # noqa: E402
+
+try:
+    from anki.collection import Collection, ImportAnkiPackageRequest
+except ImportError:  # Optional, only used to measure real import times
+    Collection = None
+
+
+def unpack(apkg_path: str, work_dir: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Extract the collection and media of a package.
+
+    Args:
+        apkg_path: Package written by generate.py
+        work_dir: Directory the files are extracted to
+
+    Returns:
+        Tuple of (collection database path, mapping of media names to files)
+    """
+    db_path = os.path.join(work_dir, "collection.anki2")
+    extract_collection(apkg_path, db_path)
+    media: Dict[str, str] = {}
+    with zipfile.ZipFile(apkg_path) as zf:
+        if "meta" in zf.namelist():
+            raise ValueError(f"{apkg_path} is not in the legacy format")
+        for number, name in json.loads(zf.read("media")).items():
+            path = os.path.join(work_dir, name)
+            with open(path, "wb") as f:
+                f.write(zf.read(number))
+            media[name] = path
+    return db_path, media
+
+
+def import_with_anki(apkg_path: str) -> None:
+    """Import a package into a fresh collection with Anki's importer."""
+    with tempfile.TemporaryDirectory() as col_dir:
+        col = Collection(os.path.join(col_dir, "collection.anki2"))
+        try:
+            col.import_anki_package(ImportAnkiPackageRequest(package_path=apkg_path))
+        finally:
+            col.close()
+
+
+def read_notes(apkg_path: str) -> None:
+    """Extract the collection of a package and read all of its notes."""
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_path = os.path.join(db_dir, "collection.anki2")
+        extract_collection(apkg_path, db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("SELECT * FROM notes").fetchall()
+        conn.close()
+
+
+def timed(action: Callable[[], None], repeat: int) -> float:
+    """
+    Time an action.
+
+    Args:
+        action: Function to run
+        repeat: Number of runs
+
+    Returns:
+        Median duration in seconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def compare(apkg_path: str, levels: List[int], repeat: int) -> List[List[str]]:
+    """
+    Repackage one package in every variant and measure it.
+
+    Args:
+        apkg_path: Package in the legacy format
+        levels: zstd levels of the latest format
+        repeat: Number of runs per measurement
+
+    Returns:
+        One table row per variant
+    """
+    load = import_with_anki if Collection is not None else read_notes
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path, media = unpack(apkg_path, work_dir)
+        variants = [("legacy", 0)] + [("latest", level) for level in levels]
+        legacy_size = 0
+        for package_format, level in variants:
+            out = os.path.join(work_dir, f"{package_format}-{level}.apkg")
+            write_time = timed(
+                lambda: package_collection(db_path, out, media, package_format, level),
+                repeat,
+            )
+            size = os.path.getsize(out)
+            legacy_size = legacy_size or size
+            load_time = timed(lambda: load(out), repeat)
+            rows.append(
+                [
+                    os.path.basename(apkg_path),
+                    package_format if package_format == "legacy" else f"zstd {level}",
+                    f"{size / 1024:.1f} KiB",
+                    f"{100 * size / legacy_size:.0f}%",
+                    f"{write_time * 1000:.0f} ms",
+                    f"{load_time * 1000:.0f} ms",
+                ]
+            )
+    return rows
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 for success, non-zero for errors)
+    """
+    parser = argparse.ArgumentParser(description="Compare package formats")
+    parser.add_argument("packages", nargs="+", help="packages in the legacy format")
+    parser.add_argument(
+        "--levels", default="3,10,19", help="zstd levels to compare (default: 3,10,19)"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement")
+    args = parser.parse_args()
+
+    try:
+        require_zstandard()
+        levels = [int(level) for level in args.levels.split(",")]
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+    load_label = "import" if Collection is not None else "read"
+    header = ["package", "format", "size", "vs legacy", "write", load_label]
+    rows = [header]
+    for apkg_path in args.packages:
+        try:
+            rows.extend(compare(apkg_path, levels, args.repeat))
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"Error: {apkg_path}: {str(e)}")
+            return 1
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+    if Collection is None:
+        print("(anki is not installed; 'read' is the time to extract and read notes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
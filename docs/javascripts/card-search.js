@@ -0,0 +1,125 @@
+// Card search for the documentation site.
+//
+// Queries the static index written by src/search_index.py to docs/card-index/.
+// Only the manifest, one term shard per query word and the document blocks of the
+// displayed results are downloaded, and every file is fetched at most once per page.
+(function () {
+  "use strict";
+
+  const base = new URL("../card-index/", document.currentScript.src);
+  const cache = new Map();
+  const MAX_RESULTS = 10;
+  let manifest = null;
+
+  function load(path) {
+    if (!cache.has(path)) {
+      const url = new URL(path, base);
+      if (manifest) {
+        url.search = "v=" + manifest.stamp;
+      }
+      cache.set(
+        path,
+        fetch(url).then((response) => (response.ok ? response.json() : null))
+      );
+    }
+    return cache.get(path);
+  }
+
+  // Must match fold() and tokenize() in src/search_index.py
+  function tokenize(text) {
+    const folded = text
+      .normalize("NFKD")
+      .replace(/[\u0300-\u036f]/g, "")
+      .toLowerCase();
+    return (folded.match(/[a-z0-9]+/g) || []).filter(
+      (word) => word.length >= manifest.prefix
+    );
+  }
+
+  // Notes containing a term that starts with the word
+  async function matches(word) {
+    const shard = await load("terms/" + word.slice(0, manifest.prefix) + ".json");
+    const notes = new Set();
+    for (const [term, deltas] of Object.entries(shard || {})) {
+      if (term.startsWith(word)) {
+        let note = 0;
+        for (const delta of deltas) {
+          note += delta;
+          notes.add(note);
+        }
+      }
+    }
+    return notes;
+  }
+
+  async function search(query) {
+    manifest = manifest || (await load("index.json"));
+    const words = tokenize(query);
+    if (!words.length) {
+      return { total: 0, results: [] };
+    }
+    const sets = await Promise.all(words.map(matches));
+    const found = sets.reduce((a, b) => new Set([...a].filter((n) => b.has(n))));
+    const notes = [...found].sort((a, b) => a - b);
+    const results = await Promise.all(
+      notes.slice(0, MAX_RESULTS).map(async (note) => {
+        const block = await load("docs/" + Math.floor(note / manifest.block) + ".json");
+        return block[note % manifest.block];
+      })
+    );
+    return { total: notes.length, results };
+  }
+
+  function render(status, list, query, found) {
+    list.replaceChildren(
+      ...found.results.map(([front, back, deck]) => {
+        const item = document.createElement("li");
+        const title = document.createElement("strong");
+        title.textContent = front;
+        const meta = document.createElement("small");
+        meta.textContent = " (" + deck + ")";
+        item.append(title, " — " + back, meta);
+        return item;
+      })
+    );
+    let text = query.trim() ? found.total + " cards" : "";
+    if (found.total > MAX_RESULTS) {
+      text += ", showing the first " + MAX_RESULTS;
+    }
+    status.textContent = text;
+  }
+
+  function bind() {
+    const input = document.getElementById("card-search");
+    if (!input || input.dataset.bound) {
+      return;
+    }
+    input.dataset.bound = "true";
+    const status = document.getElementById("card-search-status");
+    const list = document.getElementById("card-search-results");
+    let timer = null;
+    let latest = 0;
+    input.addEventListener("input", () => {
+      clearTimeout(timer);
+      timer = setTimeout(async () => {
+        const request = ++latest;
+        const query = input.value;
+        try {
+          const found = await search(query);
+          if (request === latest) {
+            render(status, list, query, found);
+          }
+        } catch (error) {
+          status.textContent = "The card index could not be loaded.";
+        }
+      }, 150);
+    });
+  }
+
+  // With instant navigation, Material for MkDocs swaps pages without reloading
+  if (typeof document$ !== "undefined") {
+    document$.subscribe(bind);
+  } else {
+    document.addEventListener("DOMContentLoaded", bind);
+  }
+})();
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+apkg.py.
+
+Reproducible .apkg writing and a content-addressed artifact store.
+genanki stamps every note with the current time and writes its zip with file mtimes,
+so the same sources never produce the same bytes twice. Packages written here use a
+timestamp derived from their sources and a canonical zip layout (fixed entry order,
+dates and permissions), so unchanged decks produce byte-identical packages.
+
+Packages are stored once under output/store/<sha256>.apkg; the versioned
+italian-<level>-<topic>-v<VERSION>.apkg names are hard links to the store entries.
+Media files are streamed into the zip from the media store (see media.py).
+
+Packages are written in one of two layouts:
+- legacy  collection.anki2 and a JSON media list, deflated; imported by every Anki
+          version
+- latest  zstd-compressed collection.anki21b, media list and media files, with a
+          'meta' entry announcing the format; smaller, imported by Anki 2.1.50 and
+          later (requires the zstandard package)
+"""
+import hashlib
+import io
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import subprocess  # nosec B404 - Used to read commit times from git
+import tempfile
+import zipfile
+from typing import BinaryIO, Dict, Iterable, List, Optional, Union
+
+import genanki
+
+from media import is_compressed
+
+try:
+    import zstandard
+except ImportError:  # Optional, only needed for the latest package format
+    zstandard = None  # type: ignore[assignment]
+
+# Timestamp given to every zip entry (the earliest date the zip format supports)
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Permissions recorded for every zip entry (regular file, rw-r--r--)
+ZIP_FILE_MODE = 0o100644 << 16
+
+# Directory, relative to the output directory, holding the content-addressed packages
+STORE_DIRNAME = "store"
+
+# Package layouts, the first being the default
+PACKAGE_FORMATS = ("legacy", "latest")
+
+# zstd compression level of the latest package format
+DEFAULT_ZSTD_LEVEL = 19
+
+# First collection schema with separate tables for decks and note types
+SCHEMA_TABLES = 18
+
+# Timestamps derived from the content of uncommitted sources lie in the year starting
+# here (2020-01-01), before every commit of the repository, so committing an edited
+# deck always moves its notes forward
+CONTENT_EPOCH = 1577836800
+CONTENT_SPAN = 365 * 24 * 3600
+
+# 'meta' entry of latest packages: the PackageMetadata message with version LATEST (3)
+LATEST_META = b"\x08\x03"
+
+
+def _git_commit_time(paths: List[str]) -> Optional[int]:
+    """
+    Return the time of the last commit touching paths, if they are all clean.
+
+    Args:
+        paths: Source files
+
+    Returns:
+        Commit timestamp, or None if git is unavailable, the clone is shallow (its
+        history cannot tell when a file last changed), a path is untracked or has
+        uncommitted changes
+    """
+    cwd = os.path.dirname(os.path.abspath(paths[0]))
+    try:
+        shallow = subprocess.run(  # nosec B603 B607 - fixed git arguments
+            ["git", "rev-parse", "--is-shallow-repository"],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        if shallow != "false":
+            return None
+        dirty = subprocess.run(  # nosec B603 B607 - fixed git arguments
+            ["git", "status", "--porcelain", "--", *paths],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        if dirty:
+            return None
+        last = subprocess.run(  # nosec B603 B607 - fixed git arguments
+            ["git", "log", "-1", "--format=%ct", "--", *paths],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return int(last) if last else None
+
+
+def content_timestamp(paths: List[str]) -> int:
+    """
+    Derive a timestamp from the content of source files.
+
+    Args:
+        paths: Source files
+
+    Returns:
+        Timestamp within CONTENT_SPAN seconds after CONTENT_EPOCH
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return CONTENT_EPOCH + int(digest.hexdigest()[:8], 16) % CONTENT_SPAN
+
+
+def source_timestamp(paths: List[str]) -> int:
+    """
+    Choose the note timestamp for a package built from paths.
+
+    SOURCE_DATE_EPOCH takes precedence. Otherwise the time of the last commit touching
+    the sources is used, so unchanged sources keep their timestamp across releases while
+    edited ones move forward (Anki only updates notes whose timestamp is newer). This
+    needs the full history: release builds must not run in a shallow clone. Files
+    outside git, in a shallow clone or with uncommitted changes get a timestamp derived
+    from their content (see content_timestamp), so the package bytes still depend on
+    the sources alone.
+
+    Args:
+        paths: Source files of the package
+
+    Returns:
+        Timestamp in seconds since the Unix epoch
+    """
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if epoch:
+        return int(epoch)
+    if not paths:
+        return 0
+    commit_time = _git_commit_time(paths)
+    if commit_time is not None:
+        return commit_time
+    return content_timestamp(paths)
+
+
+def _zip_info(name: str, compress_type: int) -> zipfile.ZipInfo:
+    """Create a zip entry header with a fixed date and permissions."""
+    info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+    info.compress_type = compress_type
+    info.external_attr = ZIP_FILE_MODE
+    info.create_system = 3  # Unix, regardless of the build platform
+    return info
+
+
+def write_canonical_zip(
+    path: str, entries: Dict[str, str], uncompressed: Iterable[str] = ()
+) -> None:
+    """
+    Write a zip archive with a canonical layout.
+
+    Entries are streamed from their source files, so large files are never held in
+    memory. Deflated entries use zlib's default compression level.
+
+    Args:
+        path: Destination file
+        entries: Mapping of archive names to source files, written in the given order
+        uncompressed: Archive names stored without compression, for files that are
+            already compressed
+    """
+    stored = set(uncompressed)
+    with zipfile.ZipFile(path, "w") as outzip:
+        for name, source in entries.items():
+            compress_type = (
+                zipfile.ZIP_STORED if name in stored else zipfile.ZIP_DEFLATED
+            )
+            info = _zip_info(name, compress_type)
+            info.file_size = os.path.getsize(source)
+            with open(source, "rb") as src, outzip.open(info, "w") as dst:
+                for chunk in iter(lambda: src.read(1 << 20), b""):
+                    dst.write(chunk)
+
+
+def require_zstandard() -> None:
+    """
+    Check that the latest package format can be written and read.
+
+    Raises:
+        ValueError: If the zstandard package is not installed
+    """
+    if zstandard is None:
+        raise ValueError(
+            "The latest package format requires the zstandard package "
+            "(pip install zstandard)"
+        )
+
+
+def _protobuf_field(number: int, value: Union[int, bytes]) -> bytes:
+    """Encode one protobuf field: a varint for integers, length-delimited for bytes."""
+
+    def varint(n: int) -> bytes:
+        out = bytearray()
+        while n > 0x7F:
+            out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        out.append(n)
+        return bytes(out)
+
+    if isinstance(value, int):
+        return varint(number << 3) + varint(value)
+    return varint(number << 3 | 2) + varint(len(value)) + value
+
+
+def media_entries(media: Dict[str, str]) -> bytes:
+    """
+    Encode the media list of a latest package.
+
+    Args:
+        media: Mapping of media names to files, in zip entry order
+
+    Returns:
+        MediaEntries protobuf message with the name, size and SHA-1 of every file
+    """
+    entries = b""
+    for name, source in media.items():
+        sha1 = hashlib.sha1(usedforsecurity=False)  # type: ignore
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                sha1.update(block)
+        entry = _protobuf_field(1, name.encode("utf-8"))
+        entry += _protobuf_field(2, os.path.getsize(source))
+        entry += _protobuf_field(3, sha1.digest())
+        entries += _protobuf_field(1, entry)
+    return entries
+
+
+def write_latest_zip(
+    path: str, db_path: str, media: Dict[str, str], zstd_level: int
+) -> None:
+    """
+    Write a package in the latest layout with a canonical zip layout.
+
+    The collection, the media list and the media files are compressed with zstd and
+    stored in the zip without further compression.
+
+    Args:
+        path: Destination .apkg file
+        db_path: Collection database
+        media: Mapping of media names to files
+        zstd_level: zstd compression level
+
+    Raises:
+        ValueError: If the zstandard package is not installed
+    """
+    require_zstandard()
+    compressor = zstandard.ZstdCompressor(level=zstd_level)
+
+    def add(outzip: zipfile.ZipFile, name: str, src: BinaryIO) -> None:
+        with outzip.open(_zip_info(name, zipfile.ZIP_STORED), "w") as dst:
+            compressor.copy_stream(src, dst)
+
+    with zipfile.ZipFile(path, "w") as outzip:
+        with open(db_path, "rb") as src:
+            add(outzip, "collection.anki21b", src)
+        add(outzip, "media", io.BytesIO(media_entries(media)))
+        outzip.writestr(_zip_info("meta", zipfile.ZIP_STORED), LATEST_META)
+        for i, source in enumerate(media.values()):
+            with open(source, "rb") as src:
+                add(outzip, str(i), src)
+
+
+def package_collection(
+    db_path: str,
+    path: str,
+    media: Optional[Dict[str, str]] = None,
+    package_format: str = "legacy",
+    zstd_level: int = DEFAULT_ZSTD_LEVEL,
+) -> None:
+    """
+    Zip a collection database into an .apkg with a canonical layout.
+
+    Media files are numbered in the given order and read from their store paths;
+    in the legacy format, already compressed formats are not compressed again.
+
+    Args:
+        db_path: Collection database (collection.anki2)
+        path: Destination .apkg file
+        media: Optional mapping of media names, as referenced by the notes, to files
+        package_format: Package layout, one of PACKAGE_FORMATS
+        zstd_level: zstd compression level of the latest format
+
+    Raises:
+        ValueError: If the latest format is requested without zstandard installed
+    """
+    media = media or {}
+    if package_format == "latest":
+        write_latest_zip(path, db_path, media, zstd_level)
+        return
+
+    fd, media_path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({str(i): name for i, name in enumerate(media)}, f)
+    entries = {"collection.anki2": db_path, "media": media_path}
+    uncompressed = []
+    for i, (name, source) in enumerate(media.items()):
+        entries[str(i)] = source
+        if is_compressed(name):
+            uncompressed.append(str(i))
+    try:
+        write_canonical_zip(path, entries, uncompressed)
+    finally:
+        os.remove(media_path)
+
+
+def collection_name(apkg_path: str) -> str:
+    """
+    Choose the collection database to read from a package written by Anki.
+
+    Packages exported for Anki 2.1 carry their notes in collection.anki21 next to a
+    placeholder collection.anki2; both use the legacy schema. Packages exported by
+    Anki 2.1.50+, and latest packages of write_reproducible_package, carry their notes
+    in a zstd-compressed collection.anki21b, and any legacy collection next to it is a
+    placeholder, so collection.anki21b is looked for first (as in inspect_apkg.py).
+    extract_collection decompresses it.
+
+    Args:
+        apkg_path: Package to read
+
+    Returns:
+        Archive name of the collection database
+
+    Raises:
+        ValueError: If the package has no collection database
+    """
+    with zipfile.ZipFile(apkg_path) as zf:
+        names = set(zf.namelist())
+    for name in ("collection.anki21b", "collection.anki21", "collection.anki2"):
+        if name in names:
+            return name
+    raise ValueError(f"{apkg_path} has no collection database")
+
+
+def extract_collection(
+    apkg_path: str, db_path: str, name: Optional[str] = None
+) -> None:
+    """
+    Copy the collection database out of an .apkg, streaming it to disk.
+
+    Args:
+        apkg_path: Package to read
+        db_path: Destination file for the collection database
+        name: Archive name of the collection database; defaults to the collection of
+            a package written by write_reproducible_package, in either format.
+            collection.anki21b is decompressed.
+
+    Raises:
+        ValueError: If the package has no such collection database, or a compressed
+            one without zstandard installed
+    """
+    with zipfile.ZipFile(apkg_path) as zf:
+        names = zf.namelist()
+        if name is None:
+            latest = "collection.anki21b" in names
+            name = "collection.anki21b" if latest else "collection.anki2"
+        if name not in names:
+            raise ValueError(f"{apkg_path} has no {name}")
+        with zf.open(name) as src, open(db_path, "wb") as dst:
+            if name.endswith(".anki21b"):
+                require_zstandard()
+                zstandard.ZstdDecompressor().copy_stream(src, dst)
+            else:
+                shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def write_reproducible_package(
+    package: genanki.Package,
+    path: str,
+    timestamp: int,
+    media: Optional[Dict[str, str]] = None,
+    package_format: str = "legacy",
+    zstd_level: int = DEFAULT_ZSTD_LEVEL,
+) -> None:
+    """
+    Write a genanki package with fixed timestamps and a canonical zip layout.
+
+    Args:
+        package: Package to write
+        path: Destination .apkg file
+        timestamp: Timestamp given to notes, cards and models; note and card IDs are
+            derived from it as well
+        media: Optional mapping of media names, as referenced by the notes, to files
+        package_format: Package layout, one of PACKAGE_FORMATS
+        zstd_level: zstd compression level of the latest format
+    """
+    fd, db_path = tempfile.mkstemp(suffix=".anki2")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        package.write_to_db(cursor, timestamp, itertools.count(timestamp * 1000))
+        conn.commit()
+        conn.close()
+        package_collection(db_path, path, media, package_format, zstd_level)
+    finally:
+        os.remove(db_path)
+
+
+def store_package(temp_path: str, out_dir: str, filename: str) -> str:
+    """
+    Move a written package into the content-addressed store and link its versioned name.
+
+    Args:
+        temp_path: Freshly written package; it is consumed
+        out_dir: Output directory
+        filename: Versioned package name
+
+    Returns:
+        Path of the versioned package name
+    """
+    digest = hashlib.sha256()
+    with open(temp_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+
+    store_dir = os.path.join(out_dir, STORE_DIRNAME)
+    os.makedirs(store_dir, exist_ok=True)
+    stored = os.path.join(store_dir, f"{digest.hexdigest()}.apkg")
+    if os.path.exists(stored):
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, stored)
+
+    return link_package(stored, out_dir, filename)
+
+
+def stored_package(out_dir: str, sha256: str) -> Optional[str]:
+    """
+    Look up a package in the content-addressed store.
+
+    Args:
+        out_dir: Output directory
+        sha256: Hex SHA-256 of the package
+
+    Returns:
+        Path of the stored package, or None if it is not in the store
+    """
+    stored = os.path.join(out_dir, STORE_DIRNAME, f"{sha256}.apkg")
+    return stored if os.path.isfile(stored) else None
+
+
+def link_package(stored: str, out_dir: str, filename: str) -> str:
+    """
+    Point a versioned package name at a store entry.
+
+    Args:
+        stored: Path of the stored package
+        out_dir: Output directory
+        filename: Versioned package name
+
+    Returns:
+        Path of the versioned package name
+    """
+    path = os.path.join(out_dir, filename)
+    if os.path.lexists(path):
+        os.remove(path)
+    try:
+        os.link(stored, path)
+    except OSError:
+        shutil.copyfile(stored, path)
+    return path
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+build_manifest.py.
+
+Sharded builds and build manifests for generate.py.
+A build is split into shards by estimated cost (note count and source bytes), so every
+runner given the same sources and the same --shard i/N computes the same partition.
+Each shard writes a partial manifest next to its packages; this script merges the
+partial manifests of all shards into one release manifest and artifact directory.
+
+Usage:
+  python generate.py --mode per-file --all --shard 1/3    # on each of three runners
+  python build_manifest.py shard1/manifest-shard-1-of-3.json \
+      shard2/manifest-shard-2-of-3.json shard3/manifest-shard-3-of-3.json \
+      --output-dir release                                # merge the shards
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, List, Tuple
+
+# Name of the merged release manifest
+RELEASE_MANIFEST = "manifest.json"
+
+# Estimated cost of rendering one note, expressed in source bytes
+NOTE_COST_BYTES = 200
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse a shard specification of the form 'i/N'.
+
+    Args:
+        spec: Shard specification, with i counted from 1
+
+    Returns:
+        Tuple of (shard index, shard count)
+
+    Raises:
+        ValueError: If the specification is malformed or out of range
+    """
+    try:
+        index_str, count_str = spec.split("/")
+        index, count = int(index_str), int(count_str)
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/N (for example 1/4)")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{spec}', i must be between 1 and N")
+    return index, count
+
+
+def estimate_cost(target: Dict[str, Any]) -> int:
+    """
+    Estimate the build cost of a target from its note count and source size.
+
+    Args:
+        target: Build target with 'notes' and 'bytes' keys
+
+    Returns:
+        Estimated cost in byte-equivalents
+    """
+    return target["notes"] * NOTE_COST_BYTES + target["bytes"]
+
+
+def assign_shards(
+    targets: List[Dict[str, Any]], count: int
+) -> List[List[Dict[str, Any]]]:
+    """
+    Partition build targets into shards of similar estimated cost.
+
+    Targets are placed most expensive first on the least loaded shard. Ties are
+    broken by target key and shard number, so the partition is deterministic.
+
+    Args:
+        targets: Build targets with 'key', 'notes' and 'bytes' keys
+        count: Number of shards
+
+    Returns:
+        One list of targets per shard, each in the original build order
+    """
+    order = {target["key"]: idx for idx, target in enumerate(targets)}
+    shards: List[List[Dict[str, Any]]] = [[] for _ in range(count)]
+    loads = [0] * count
+    for target in sorted(targets, key=lambda t: (-estimate_cost(t), t["key"])):
+        shard = min(range(count), key=lambda i: (loads[i], i))
+        shards[shard].append(target)
+        loads[shard] += estimate_cost(target)
+    return [sorted(shard, key=lambda t: order[t["key"]]) for shard in shards]
+
+
+def file_sha256(path: str) -> str:
+    """
+    Hash a file in blocks.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_entry(target: Dict[str, Any], decks_dir: str) -> Dict[str, Any]:
+    """
+    Describe a built target for the manifest.
+
+    Args:
+        target: Built target with a 'package' path
+        decks_dir: Root of the decks tree, used to relativize source paths
+
+    Returns:
+        JSON-serializable manifest entry
+    """
+    package = target["package"]
+    return {
+        "key": target["key"],
+        "level": target["level"],
+        "topic": target["topic"],
+        "notes": target["notes"],
+        "cards": target["cards"],
+        "bytes": target["bytes"],
+        "sources": [
+            {
+                "path": os.path.relpath(item.path, decks_dir).replace(os.sep, "/"),
+                "sha256": item.sha256,
+            }
+            for item in target["files"]
+        ],
+        "package": os.path.basename(package),
+        "package_sha256": file_sha256(package),
+        "package_size": os.path.getsize(package),
+    }
+
+
+def write_partial_manifest(
+    out_dir: str,
+    version: str,
+    mode: str,
+    shard: Tuple[int, int],
+    planned: List[Dict[str, Any]],
+    assigned: List[Dict[str, Any]],
+    built: List[Dict[str, Any]],
+    decks_dir: str,
+) -> str:
+    """
+    Write the manifest of one shard.
+
+    Args:
+        out_dir: Directory holding the shard's packages
+        version: Release version
+        mode: Build mode
+        shard: Tuple of (shard index, shard count)
+        planned: All targets of the build, across every shard
+        assigned: Targets assigned to this shard
+        built: Targets of this shard that produced a package
+        decks_dir: Root of the decks tree
+
+    Returns:
+        Path of the written manifest
+    """
+    index, count = shard
+    manifest = {
+        "version": version,
+        "mode": mode,
+        "shard": {"index": index, "count": count},
+        "planned": [target["key"] for target in planned],
+        "assigned": [target["key"] for target in assigned],
+        "targets": [manifest_entry(target, decks_dir) for target in built],
+    }
+    path = os.path.join(out_dir, f"manifest-shard-{index}-of-{count}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Wrote {path}")
+    return path
+
+
+def merge_manifests(paths: List[str], output_dir: str) -> Dict[str, Any]:
+    """
+    Merge the partial manifests of every shard into one release.
+
+    Checks that all shards of the same build are present, that no target was built
+    twice and that every package matches its recorded hash. Packages are collected
+    from next to each partial manifest into output_dir.
+
+    Args:
+        paths: Paths of the partial manifests
+        output_dir: Directory receiving the release manifest and packages
+
+    Returns:
+        The release manifest
+
+    Raises:
+        ValueError: If the partial manifests do not form one complete build
+    """
+    partials = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            partials.append((path, json.load(f)))
+    if not partials:
+        raise ValueError("No manifests to merge")
+
+    first = partials[0][1]
+    count = first["shard"]["count"]
+    seen_shards = set()
+    assigned: List[str] = []
+    for path, manifest in partials:
+        for field in ("version", "mode", "planned"):
+            if manifest[field] != first[field]:
+                raise ValueError(f"{path}: '{field}' differs from {partials[0][0]}")
+        if manifest["shard"]["count"] != count:
+            raise ValueError(f"{path}: shard count differs from {partials[0][0]}")
+        index = manifest["shard"]["index"]
+        if index in seen_shards:
+            raise ValueError(f"{path}: shard {index}/{count} given twice")
+        seen_shards.add(index)
+        assigned.extend(manifest["assigned"])
+
+    missing = sorted(set(range(1, count + 1)) - seen_shards)
+    if missing:
+        raise ValueError(
+            f"Missing shards: {', '.join(f'{i}/{count}' for i in missing)}"
+        )
+    if sorted(assigned) != sorted(first["planned"]):
+        raise ValueError("Shards do not cover the planned targets exactly once")
+
+    os.makedirs(output_dir, exist_ok=True)
+    targets = []
+    packages = set()
+    for path, manifest in partials:
+        source_dir = os.path.dirname(os.path.abspath(path))
+        for entry in manifest["targets"]:
+            if entry["package"] in packages:
+                raise ValueError(f"{path}: package {entry['package']} built twice")
+            packages.add(entry["package"])
+            source = os.path.join(source_dir, entry["package"])
+            if file_sha256(source) != entry["package_sha256"]:
+                raise ValueError(f"{source}: content does not match {path}")
+            destination = os.path.join(output_dir, entry["package"])
+            if os.path.abspath(source) != os.path.abspath(destination):
+                shutil.copyfile(source, destination)
+            targets.append(entry)
+
+    order = {key: idx for idx, key in enumerate(first["planned"])}
+    targets.sort(key=lambda entry: order[entry["key"]])
+    release = {"version": first["version"], "mode": first["mode"], "targets": targets}
+    with open(os.path.join(output_dir, RELEASE_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(release, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return release
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 for success, non-zero for errors)
+    """
+    parser = argparse.ArgumentParser(description="Merge partial build manifests")
+    parser.add_argument("manifests", nargs="+", help="partial manifests of every shard")
+    parser.add_argument(
+        "--output-dir",
+        default="release",
+        help="directory receiving the release manifest and packages",
+    )
+    args = parser.parse_args()
+
+    try:
+        release = merge_manifests(args.manifests, args.output_dir)
+    except (ValueError, OSError, KeyError) as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+    print(
+        f"Merged {len(args.manifests)} shards into {len(release['targets'])} packages "
+        f"in {args.output_dir}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+cloze.py.
+
+Single-pass lexer for Anki cloze deletions, {{c1::answer}} or {{c1::answer::hint}}.
+A field is scanned once, token by token, and the scan reports:
+- the cloze numbers used, which give the number of cards a cloze note produces
+- unbalanced markers: '{{c' without a closing '}}' and '}}' without an opening '{{'
+- malformed openers such as '{{c0::', '{{c::', '{{C1::' or '{{c1:'
+- empty answers and hints, and hints containing a further '::'
+- Markdown emphasis ('*', '**') opened inside a deletion and closed outside of it, or
+  the other way round, which would put the rendered HTML tags across the deletion
+
+Used by deck_catalog.py to count the cards of every note, and by deck_schema.py to
+report malformed deletions in validate.py and while generate.py loads notes.
+"""
+import re
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional
+
+# Tokens the lexer stops at: escapes, markers, hint separators and emphasis runs
+TOKEN_RE = re.compile(r"\\.|\{\{|\}\}|::|\*+")
+
+# Matches what follows '{{' when it looks like a cloze opener
+OPENER_RE = re.compile(r"([cC])(\d*)(:{0,2})")
+
+
+class ClozeError(NamedTuple):
+    """A problem with the cloze deletions of a field."""
+
+    offset: int
+    message: str
+
+
+class ClozeScan(NamedTuple):
+    """Result of scanning one field."""
+
+    ordinals: FrozenSet[int]
+    errors: List[ClozeError]
+
+
+class _Open(NamedTuple):
+    """A '{{' waiting for its '}}'."""
+
+    start: int
+    ordinal: Optional[int]
+    body: int
+
+
+def _is_literal(text: str, start: int, end: int) -> bool:
+    """Tell whether an emphasis run stands alone between spaces, like ' * '."""
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return before.isspace() and after.isspace()
+
+
+def scan_cloze(text: str) -> ClozeScan:
+    """
+    Scan a field for cloze deletions.
+
+    Args:
+        text: Markdown source of the field
+
+    Returns:
+        The cloze numbers used and the problems found, in text order
+    """
+    ordinals = set()
+    errors: List[ClozeError] = []
+    opened: List[_Open] = []
+    hints: Dict[int, int] = {}
+    emphasis: List[List[int]] = []
+
+    def error(offset: int, message: str) -> None:
+        errors.append(ClozeError(offset, message))
+
+    pos = 0
+    while True:
+        match = TOKEN_RE.search(text, pos)
+        if match is None:
+            break
+        token, start, pos = match.group(), match.start(), match.end()
+
+        if token == "{{":
+            opener = OPENER_RE.match(text, pos)
+            if opener is None or not opener.group(0):
+                opened.append(_Open(start, None, pos))
+                continue
+            letter, number, colons = opener.groups()
+            pos = opener.end()
+            if letter != "c" or not number or int(number) < 1 or colons != "::":
+                error(
+                    start,
+                    f"Malformed cloze opener '{{{{{opener.group(0)}' "
+                    "(expected '{{c<number>::', numbered from 1)",
+                )
+                opened.append(_Open(start, 0, pos))
+                continue
+            ordinals.add(int(number))
+            opened.append(_Open(start, int(number), pos))
+
+        elif token == "::":
+            if not opened or not opened[-1].ordinal:
+                continue
+            cloze = opened[-1]
+            if cloze.start in hints:
+                error(start, f"Hint of cloze c{cloze.ordinal} contains '::'")
+            else:
+                if not text[cloze.body : start].strip():
+                    error(cloze.start, f"Empty answer in cloze c{cloze.ordinal}")
+                hints[cloze.start] = pos
+
+        elif token == "}}":
+            if not opened:
+                error(start, "'}}' without an opening '{{c<number>::'")
+                continue
+            cloze = opened.pop()
+            if cloze.ordinal:
+                hint = hints.pop(cloze.start, None)
+                if hint is None and not text[cloze.body : start].strip():
+                    error(cloze.start, f"Empty answer in cloze c{cloze.ordinal}")
+                elif hint is not None and not text[hint:start].strip():
+                    error(cloze.start, f"Empty hint in cloze c{cloze.ordinal}")
+            while emphasis and emphasis[-1][1] > len(opened):
+                run = emphasis.pop()
+                error(
+                    run[0],
+                    f"Emphasis '{text[run[0] : run[0] + run[2]]}' opened inside "
+                    "a cloze is closed after it",
+                )
+
+        elif token[0] == "*" and not _is_literal(text, start, pos):
+            if emphasis and emphasis[-1][2] == len(token):
+                run = emphasis.pop()
+                if run[1] < len(opened):
+                    error(
+                        start,
+                        f"Emphasis '{token}' opened before a cloze is closed "
+                        "inside it",
+                    )
+            else:
+                emphasis.append([start, len(opened), len(token)])
+
+    for cloze in opened:
+        if cloze.ordinal:
+            error(cloze.start, "Cloze opener without a closing '}}'")
+    errors.sort()
+    return ClozeScan(frozenset(ordinals), errors)
+
+
+def card_count(note: Dict[str, Any], default_model: Optional[str] = None) -> int:
+    """
+    Count the cards a note produces.
+
+    Args:
+        note: Note as a [[notes]] entry
+        default_model: Model of notes that do not set one, by default the one of the
+            deck schema
+
+    Returns:
+        1 for notes of models the deck schema does not mark as cloze; for cloze notes,
+        the number of distinct cloze numbers in the text field
+    """
+    # deck_schema.py imports this module, so it can only be imported once both exist
+    from deck_schema import get_schema
+
+    schema = get_schema()
+    rule = schema.models.get(note.get("model", default_model or schema.default_model))
+    if rule is None or not rule.cloze:
+        return 1
+    fields = note.get("fields")
+    if not isinstance(fields, list) or not fields or not isinstance(fields[0], str):
+        return 0
+    return len(scan_cloze(fields[0]).ordinals)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+collection.py.
+
+Writes decks straight into a local Anki collection file, without building an .apkg.
+Notes are matched by GUID and upserted inside a single transaction:
+- missing note types (models) and decks are created
+- new notes are inserted together with their cards
+- existing notes are updated only when their fields or tags changed
+- cards, review history and scheduling of existing notes are never touched,
+  except that cards are added for new cloze deletions
+
+Only the legacy collection schema (version 11) is supported. Newer Anki versions store
+note types and decks in a different layout; use "Downgrade & Quit" in Anki's profile
+manager to convert a profile's collection before upserting into it.
+
+Used by generate.py through the --collection option.
+"""
+import hashlib
+import html
+import itertools
+import json
+import os
+import re
+import sqlite3
+import time
+from typing import Any, Dict, List, Set
+
+import genanki
+
+# Collection schema version understood by this module
+SUPPORTED_SCHEMA = 11
+
+# Matches the HTML tags stripped from a field before it is checksummed
+TAG_RE = re.compile(r"<[^>]*>")
+
+
+def _next_id(cursor: sqlite3.Cursor, timestamp: float) -> int:
+    """Return an ID larger than every note and card ID in the collection."""
+    (max_note,) = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM notes").fetchone()
+    (max_card,) = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM cards").fetchone()
+    return max(max_note, max_card, int(timestamp * 1000)) + 1
+
+
+def _field_checksum(fields: List[str]) -> int:
+    """
+    Return the checksum Anki stores in the csum column of a note.
+
+    Anki finds duplicate notes by this checksum: the first 8 hex digits of the SHA-1
+    of the first field, with HTML tags stripped, as an integer.
+    """
+    first = fields[0] if fields else ""
+    text = html.unescape(TAG_RE.sub("", first)).strip()
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def upsert_decks(collection_path: str, decks: List[genanki.Deck]) -> Dict[str, int]:
+    """
+    Upsert the notes of decks into an existing Anki collection.
+
+    Args:
+        collection_path: Path to the collection.anki2 file
+        decks: Decks whose notes, models and deck entries should be written
+
+    Returns:
+        Counts of 'added', 'updated' and 'unchanged' notes, and of created
+        'decks' and 'models'
+
+    Raises:
+        ValueError: If the file does not exist or is not a supported Anki collection
+    """
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "decks": 0, "models": 0}
+    timestamp = time.time()
+    now = int(timestamp)
+
+    # sqlite3 would create an empty database for a mistyped path
+    if not os.path.isfile(collection_path):
+        raise ValueError(f"Collection {collection_path} does not exist")
+    try:
+        conn = sqlite3.connect(collection_path, isolation_level=None)
+    except sqlite3.Error as e:
+        raise ValueError(f"Cannot open collection {collection_path}: {str(e)}")
+
+    try:
+        cursor = conn.cursor()
+        try:
+            row = cursor.execute("SELECT ver, models, decks, tags FROM col").fetchone()
+        except sqlite3.Error as e:
+            raise ValueError(f"{collection_path} is not an Anki collection: {str(e)}")
+        if row is None:
+            raise ValueError(
+                f"{collection_path} is not an Anki collection: empty col table"
+            )
+        ver, models_json, decks_json, tags_json = row
+        if ver != SUPPORTED_SCHEMA:
+            raise ValueError(
+                f"{collection_path} uses collection schema {ver}; only schema "
+                f"{SUPPORTED_SCHEMA} is supported (use 'Downgrade & Quit' in Anki's "
+                "profile manager first)"
+            )
+
+        cursor.execute("BEGIN IMMEDIATE")
+        models = json.loads(models_json)
+        col_decks = json.loads(decks_json)
+        col_tags = json.loads(tags_json) if tags_json else {}
+        id_gen = itertools.count(_next_id(cursor, timestamp))
+        (due,) = cursor.execute(
+            "SELECT COALESCE(MAX(due), 0) + 1 FROM cards WHERE type = 0"
+        ).fetchone()
+        seen_tags: Set[str] = set()
+
+        for deck in decks:
+            if str(deck.deck_id) not in col_decks:
+                col_decks[str(deck.deck_id)] = deck.to_json()
+                stats["decks"] += 1
+
+            for note in deck.notes:
+                model = note.model
+                if str(model.model_id) not in models:
+                    models[str(model.model_id)] = model.to_json(now, deck.deck_id)
+                    stats["models"] += 1
+                seen_tags.update(note.tags)
+
+                existing = cursor.execute(
+                    "SELECT id, mid, flds, tags FROM notes WHERE guid = ?", (note.guid,)
+                ).fetchone()
+                csum = _field_checksum(note.fields)
+                if existing is None:
+                    note.due = due
+                    due += 1
+                    note.write_to_db(cursor, now, deck.deck_id, id_gen)
+                    # genanki leaves the checksum at 0
+                    cursor.execute(
+                        "UPDATE notes SET csum = ? WHERE guid = ?", (csum, note.guid)
+                    )
+                    stats["added"] += 1
+                    continue
+
+                note_id, mid, flds, tags = existing
+                if mid != model.model_id:
+                    print(
+                        f"Warning: note {note.guid} uses a different note type in the "
+                        "collection; skipped"
+                    )
+                    continue
+                if flds == note._format_fields() and tags == note._format_tags():
+                    stats["unchanged"] += 1
+                    continue
+
+                cursor.execute(
+                    "UPDATE notes SET flds = ?, sfld = ?, csum = ?, tags = ?, mod = ?, "
+                    "usn = -1 WHERE id = ?",
+                    (
+                        note._format_fields(),
+                        note.sort_field,
+                        csum,
+                        note._format_tags(),
+                        now,
+                        note_id,
+                    ),
+                )
+                have = {
+                    ord_
+                    for (ord_,) in cursor.execute(
+                        "SELECT ord FROM cards WHERE nid = ?", (note_id,)
+                    )
+                }
+                for card in note.cards:
+                    if card.ord not in have:
+                        card.write_to_db(
+                            cursor, now, deck.deck_id, note_id, id_gen, due
+                        )
+                        due += 1
+                stats["updated"] += 1
+
+        for tag in sorted(seen_tags):
+            col_tags.setdefault(tag, -1)
+        cursor.execute(
+            "UPDATE col SET models = ?, decks = ?, tags = ?, mod = ?",
+            (
+                json.dumps(models),
+                json.dumps(col_decks),
+                json.dumps(col_tags),
+                int(timestamp * 1000),
+            ),
+        )
+        cursor.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return stats
+
+
+def describe_stats(stats: Dict[str, Any]) -> str:
+    """
+    Summarize upsert counts for printing.
+
+    Args:
+        stats: Counts returned by upsert_decks
+
+    Returns:
+        One-line summary
+    """
+    return (
+        f"{stats['added']} added, {stats['updated']} updated, "
+        f"{stats['unchanged']} unchanged notes; "
+        f"{stats['decks']} new decks, {stats['models']} new note types"
+    )
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+conjugations.py.
+
+Template expansion for verb conjugation decks.
+Instead of one [[notes]] entry per form, a deck file can hold conjugation tables and
+card templates. Every combination of tense, verb, person and card template is expanded
+into a note while the file is loaded:
+
+  [conjugations]
+  persons = ["io", "tu", "lui/lei", "noi", "voi", "loro"]  # the default
+
+  [conjugations.meanings]
+  andare = "to go"
+
+  [[conjugations.tenses]]
+  name = "futuro semplice"
+  forms.andare = ["andrò", "andrai", "andrà", "andremo", "andrete", "andranno"]
+
+  [[conjugations.cards]]
+  id = "forma"
+  fields = ["**{infinitive}** — {tense}, {person}", "{form}"]
+
+  [[conjugations.cards]]
+  id = "tabella"
+  per = "verb"
+  fields = ["**{infinitive}** — {tense}", "{forms}"]
+
+Templates can use {infinitive}, {meaning}, {tense}, {person} and {form}; cards with
+per = "verb" are expanded once per verb and tense and can use {forms}, the whole tense
+with one person per line. An empty form skips that person.
+
+Expanded notes get the leading tags of the deck schema, [level, topic] (see
+deck_schema.py), plus the card's extra tags, and the note_id
+"<tense>/<infinitive>/<person>/<card id>" (without the person for per-verb cards), so
+adding verbs, tenses or cards never changes the GUIDs of existing notes.
+
+Used by generate.py, validate.py, deck_catalog.py, note_index.py and stats.py.
+"""
+import itertools
+import re
+from typing import Any, Dict, Iterator
+
+from deck_schema import get_schema
+
+# Persons used when a deck does not list its own
+DEFAULT_PERSONS = ["io", "tu", "lui/lei", "noi", "voi", "loro"]
+
+# Matches a {placeholder}; cloze markers such as {{c1::...}} do not match
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+
+def fill(template: str, values: Dict[str, str], where: str) -> str:
+    """
+    Substitute the placeholders of one template string.
+
+    Args:
+        template: Template text
+        values: Placeholder values
+        where: Description of the template, used in error messages
+
+    Returns:
+        The filled-in text
+
+    Raises:
+        ValueError: If the template is not a string or uses an unknown placeholder
+    """
+    if not isinstance(template, str):
+        raise ValueError(f"{where}: templates should be strings")
+
+    def substitute(match: "re.Match[str]") -> str:
+        name = match.group(1)
+        if name not in values:
+            raise ValueError(
+                f"{where}: unknown placeholder '{{{name}}}', expected one of "
+                f"{', '.join('{' + key + '}' for key in values)}"
+            )
+        return values[name]
+
+    return PLACEHOLDER_RE.sub(substitute, template)
+
+
+def _is_strings(value: Any) -> bool:
+    """Return whether a value is a list of strings."""
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def _tables(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check the conjugation tables of a deck file.
+
+    Every table, list and value is checked for its type, so that expanding the
+    tables afterwards cannot fail on a half-written file.
+
+    Args:
+        data: Parsed deck file
+
+    Returns:
+        The [conjugations] table
+
+    Raises:
+        ValueError: If the tables are malformed
+    """
+    tables = data["conjugations"]
+    if not isinstance(tables, dict):
+        raise ValueError("'conjugations' should be a table")
+    persons = tables.get("persons", DEFAULT_PERSONS)
+    if not _is_strings(persons) or not persons:
+        raise ValueError("'conjugations.persons' should be a non-empty list of strings")
+    meanings = tables.get("meanings", {})
+    if not isinstance(meanings, dict) or not all(
+        isinstance(meaning, str) for meaning in meanings.values()
+    ):
+        raise ValueError("'conjugations.meanings' should be a table of strings")
+
+    cards = tables.get("cards", [])
+    if not isinstance(cards, list):
+        raise ValueError("'conjugations.cards' should be an array of tables")
+    if not cards:
+        raise ValueError("'conjugations' needs at least one [[conjugations.cards]]")
+    for idx, card in enumerate(cards, start=1):
+        if not isinstance(card, dict):
+            raise ValueError(f"conjugations card {idx}: should be a table")
+        if card.get("per", "form") not in ("form", "verb"):
+            raise ValueError(f"conjugations card {idx}: 'per' should be form or verb")
+        if not _is_strings(card.get("fields")):
+            raise ValueError(
+                f"conjugations card {idx}: 'fields' should be a list of strings"
+            )
+        if not _is_strings(card.get("tags", [])):
+            raise ValueError(
+                f"conjugations card {idx}: 'tags' should be a list of strings"
+            )
+        for key in ("back", "model"):
+            if key in card and not isinstance(card[key], str):
+                raise ValueError(f"conjugations card {idx}: '{key}' should be a string")
+
+    tenses = tables.get("tenses", [])
+    if not isinstance(tenses, list):
+        raise ValueError("'conjugations.tenses' should be an array of tables")
+    for idx, tense in enumerate(tenses, start=1):
+        if not isinstance(tense, dict):
+            raise ValueError(f"conjugations tense {idx}: should be a table")
+        if not tense.get("name"):
+            raise ValueError(f"conjugations tense {idx}: missing 'name'")
+        if not isinstance(tense["name"], str):
+            raise ValueError(f"conjugations tense {idx}: 'name' should be a string")
+        forms_table = tense.get("forms", {})
+        if not isinstance(forms_table, dict):
+            raise ValueError(f"{tense['name']}: 'forms' should be a table")
+        for infinitive, forms in forms_table.items():
+            if not isinstance(forms, list) or len(forms) != len(persons):
+                raise ValueError(
+                    f"{tense['name']}/{infinitive}: expected {len(persons)} forms, "
+                    f"one per person"
+                )
+            if not _is_strings(forms):
+                raise ValueError(
+                    f"{tense['name']}/{infinitive}: forms should be strings"
+                )
+    return tables
+
+
+def expand_conjugations(
+    data: Dict[str, Any], level: str, topic: str
+) -> Iterator[Dict[str, Any]]:
+    """
+    Expand the conjugation tables of a deck file into notes, one at a time.
+
+    Args:
+        data: Parsed deck file
+        level: Level of the deck file
+        topic: Topic of the deck file
+
+    Yields:
+        Notes shaped like [[notes]] entries, with 'note_id', 'tags', 'model' and
+        'fields' (and 'back' for cards that define one)
+
+    Raises:
+        ValueError: If the tables or templates are malformed
+    """
+    if "conjugations" not in data:
+        return
+    tables = _tables(data)
+    persons = tables.get("persons", DEFAULT_PERSONS)
+    meanings = tables.get("meanings", {})
+    cards = tables["cards"]
+    schema = get_schema()
+    default_model = data.get("model", schema.default_model)
+    tags = schema.tags(level, topic)
+
+    def make_note(
+        card: Dict[str, Any], idx: int, key: str, values: Dict[str, str]
+    ) -> Dict[str, Any]:
+        card_id = str(card.get("id", idx))
+        where = f"conjugations card '{card_id}'"
+        note = {
+            "note_id": f"{key}/{card_id}",
+            "tags": [*tags, *card.get("tags", [])],
+            "model": card.get("model", default_model),
+            "fields": [fill(field, values, where) for field in card["fields"]],
+        }
+        if "back" in card:
+            note["back"] = fill(card["back"], values, where)
+        return note
+
+    for tense in tables.get("tenses", []):
+        for infinitive, forms in tense.get("forms", {}).items():
+            base = {
+                "infinitive": infinitive,
+                "meaning": meanings.get(infinitive, ""),
+                "tense": tense["name"],
+            }
+            for person, form in zip(persons, forms):
+                if not form:
+                    continue
+                values = dict(base, person=person, form=form)
+                for idx, card in enumerate(cards, start=1):
+                    if card.get("per", "form") == "form":
+                        key = f"{tense['name']}/{infinitive}/{person}"
+                        yield make_note(card, idx, key, values)
+
+            table = "\n".join(f"{p} {f}" for p, f in zip(persons, forms) if f)
+            for idx, card in enumerate(cards, start=1):
+                if card.get("per", "form") == "verb":
+                    key = f"{tense['name']}/{infinitive}"
+                    yield make_note(card, idx, key, dict(base, forms=table))
+
+
+def iter_deck_notes(
+    data: Dict[str, Any], level: str, topic: str
+) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the hand-written notes of a deck file, then its expanded notes.
+
+    Args:
+        data: Parsed deck file
+        level: Level of the deck file
+        topic: Topic of the deck file
+
+    Returns:
+        Iterator over notes shaped like [[notes]] entries; it raises ValueError
+        when it reaches malformed conjugation tables
+    """
+    return itertools.chain(
+        data.get("notes", []), expand_conjugations(data, level, topic)
+    )
+
+
+def count_expanded_notes(data: Dict[str, Any]) -> int:
+    """
+    Count the notes the conjugation tables of a deck file expand to.
+
+    Args:
+        data: Parsed deck file
+
+    Returns:
+        Number of expanded notes, or 0 if the tables are missing or malformed
+    """
+    if "conjugations" not in data:
+        return 0
+    try:
+        tables = _tables(data)
+    except ValueError:
+        return 0
+    per_form = sum(1 for card in tables["cards"] if card.get("per", "form") == "form")
+    per_verb = len(tables["cards"]) - per_form
+    total = 0
+    for tense in tables.get("tenses", []):
+        for forms in tense.get("forms", {}).values():
+            total += per_form * sum(1 for form in forms if form) + per_verb
+    return total
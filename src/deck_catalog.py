@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+"""
+deck_catalog.py.
+
+Shared catalog of deck files under decks/<level>/*.toml.
+Records level, topic, path, mtime, size, content hash, note count and card count for every
+deck file.
+The tree is walked with os.scandir and the result is persisted next to the decks, so later
+runs only re-stat directories and files and re-hash the files whose mtime or size changed.
+Listing or selecting the decks of one level never touches the other levels.
+
+Deck files are handed to the build as DeckSource handles: their metadata comes from the
+catalog, and the file is only parsed once its notes are needed.
+
+Used by generate.py, validate.py, fix_tags.py and html_to_markdown.py.
+
+Usage:
+  python deck_catalog.py                # list all catalogued deck files
+  python deck_catalog.py --level a1     # list the deck files of one level
+  python deck_catalog.py --rebuild      # discard the persisted catalog and rescan
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from cloze import card_count
+from conjugations import count_expanded_notes, iter_deck_notes
+from deck_schema import get_schema
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# Name of the persisted catalog file, stored in the root of the decks directory
+CATALOG_FILENAME = ".catalog.json"
+
+# Bump when the persisted layout changes so stale catalogs are rebuilt
+CATALOG_VERSION = 3
+
+# Matches the start of a [[notes]] array-of-tables entry
+NOTE_HEADER_RE = re.compile(rb"^[ \t]*\[\[notes\]\]", re.MULTILINE)
+
+# Matches the header of conjugation tables, which expand into further notes
+CONJUGATIONS_RE = re.compile(rb"^[ \t]*\[+conjugations[\].]", re.MULTILINE)
+
+# Matches content that may hold notes producing other than one card
+CLOZE_RE = re.compile(rb"cloze|\{\{")
+
+
+class CatalogEntry(NamedTuple):
+    """Metadata for one deck file, available without parsing it."""
+
+    level: str
+    topic: str
+    path: str
+    mtime_ns: int
+    size: int
+    sha256: str
+    note_count: int
+    card_count: int
+    card_counts: Dict[str, int]
+
+
+def count_notes(content: bytes) -> int:
+    """
+    Count the notes of raw TOML content.
+
+    [[notes]] headers are counted without parsing; only files with conjugation
+    tables are parsed to count the notes they expand to.
+
+    Args:
+        content: Raw file content
+
+    Returns:
+        Number of notes
+    """
+    count = len(NOTE_HEADER_RE.findall(content))
+    if CONJUGATIONS_RE.search(content):
+        try:
+            count += count_expanded_notes(tomllib.loads(content.decode("utf-8")))
+        except (UnicodeDecodeError, tomllib.TOMLDecodeError):
+            pass
+    return count
+
+
+def count_cards(
+    content: bytes, note_count: int, level: str, topic: str
+) -> Tuple[int, Dict[str, int]]:
+    """
+    Count the cards the notes of raw TOML content produce.
+
+    Only files that may contain cloze notes are parsed; every other note produces
+    exactly one card.
+
+    Args:
+        content: Raw file content
+        note_count: Number of notes, as returned by count_notes
+        level: Level the file belongs to
+        topic: Topic of the file
+
+    Returns:
+        Tuple of (number of cards, card counts of the notes that do not produce
+        exactly one card, keyed by the note position as a string)
+    """
+    if not CLOZE_RE.search(content):
+        return note_count, {}
+    default_model = get_schema().default_model
+    try:
+        data = tomllib.loads(content.decode("utf-8"))
+        default_model = data.get("model", default_model)
+        counts = [
+            card_count(note, default_model)
+            for note in iter_deck_notes(data, level, topic)
+        ]
+    except (UnicodeDecodeError, ValueError):
+        return note_count, {}
+    others = {str(pos): count for pos, count in enumerate(counts) if count != 1}
+    return sum(counts), others
+
+
+def _describe_file(path: str, level: str, stat: os.stat_result) -> CatalogEntry:
+    """
+    Hash a deck file and count its notes and cards.
+
+    Args:
+        path: Absolute path to the deck file
+        level: Level the file belongs to
+        stat: Result of stat() for the file
+
+    Returns:
+        A fresh catalog entry
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    topic = os.path.splitext(os.path.basename(path))[0]
+    note_count = count_notes(content)
+    folder = os.path.basename(os.path.dirname(path))
+    cards, card_counts = count_cards(content, note_count, folder, topic)
+    return CatalogEntry(
+        level=level,
+        topic=topic,
+        path=path,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        sha256=hashlib.sha256(content).hexdigest(),
+        note_count=note_count,
+        card_count=cards,
+        card_counts=card_counts,
+    )
+
+
+class DeckSource:
+    """
+    Lazy handle on one deck file.
+
+    Level, topic, path, size, hash and note and card counts come from the catalog, so
+    planning with sources never opens the file. The notes are parsed on first access:
+    iter_notes() streams them without keeping them, notes() keeps them until release().
+
+    Args:
+        entry: Catalog entry of the deck file
+        positions: Optional positions of the notes to use, in file order
+    """
+
+    def __init__(self, entry: CatalogEntry, positions: Optional[List[int]] = None):
+        """Wrap a catalog entry without reading the file."""
+        self.entry = entry
+        self.positions = positions
+        self._notes: Optional[List[Dict[str, Any]]] = None
+
+    def __repr__(self) -> str:
+        """Name the deck file, for debugging output."""
+        return f"DeckSource({self.entry.path!r})"
+
+    @property
+    def level(self) -> str:
+        """Level the file belongs to."""
+        return self.entry.level
+
+    @property
+    def topic(self) -> str:
+        """Topic, the file name without extension."""
+        return self.entry.topic
+
+    @property
+    def path(self) -> str:
+        """Absolute path of the file."""
+        return self.entry.path
+
+    @property
+    def size(self) -> int:
+        """Size of the file in bytes."""
+        return self.entry.size
+
+    @property
+    def sha256(self) -> str:
+        """Content hash of the file."""
+        return self.entry.sha256
+
+    @property
+    def note_count(self) -> int:
+        """Number of notes used from the file."""
+        if self.positions is not None:
+            return len(self.positions)
+        return self.entry.note_count
+
+    @property
+    def card_count(self) -> int:
+        """Number of cards the used notes produce."""
+        if self.positions is None:
+            return self.entry.card_count
+        counts = self.entry.card_counts
+        return sum(counts.get(str(position), 1) for position in self.positions)
+
+    @property
+    def folder(self) -> str:
+        """Name of the directory holding the file, which note GUIDs are derived from."""
+        return os.path.basename(os.path.dirname(self.entry.path))
+
+    def select(self, positions: List[int]) -> "DeckSource":
+        """
+        Restrict the source to some of its notes.
+
+        Args:
+            positions: Positions of the notes to use, in file order
+
+        Returns:
+            A new source for the same file
+        """
+        return DeckSource(self.entry, positions)
+
+    def _parse(self) -> Iterator[Dict[str, Any]]:
+        """Parse the file and yield the used notes."""
+        try:
+            with open(self.path, "rb") as f:
+                data = tomllib.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"File not found: {self.path}")
+        except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+            raise ValueError(f"Failed to parse file {self.path}: {str(e)}")
+        default_model = data.get("model", get_schema().default_model)
+        wanted = None if self.positions is None else set(self.positions)
+        for position, note in enumerate(iter_deck_notes(data, self.folder, self.topic)):
+            if wanted is None or position in wanted:
+                yield dict(note, model=note.get("model", default_model))
+
+    def iter_notes(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the notes one at a time.
+
+        Notes kept by notes() are reused; otherwise the file is parsed and the notes
+        are not kept.
+
+        Yields:
+            Notes shaped like [[notes]] entries, hand-written notes first, with the
+            default model of the file filled in
+
+        Raises:
+            ValueError: If the file cannot be read or parsed, or its conjugation
+                tables are malformed
+        """
+        if self._notes is not None:
+            yield from self._notes
+        else:
+            yield from self._parse()
+
+    def notes(self) -> List[Dict[str, Any]]:
+        """
+        Parse the notes once and keep them until release().
+
+        Returns:
+            Notes, as yielded by iter_notes()
+
+        Raises:
+            ValueError: If the file cannot be read or parsed (see iter_notes)
+        """
+        if self._notes is None:
+            self._notes = list(self._parse())
+        return self._notes
+
+    def release(self) -> None:
+        """Drop the notes kept by notes()."""
+        self._notes = None
+
+
+class DeckCatalog:
+    """
+    Persisted, lazily revalidated index of the deck files in a decks directory.
+
+    Each directory record keeps its mtime and the names of its .toml files and
+    subdirectories. A directory whose mtime is unchanged is not listed again; a file
+    whose mtime and size are unchanged is not read again.
+    """
+
+    def __init__(self, decks_dir: str, cache_path: Optional[str] = None):
+        """
+        Open the catalog for a decks directory.
+
+        Args:
+            decks_dir: Root directory containing one subdirectory per level
+            cache_path: Optional location of the persisted catalog
+                (defaults to <decks_dir>/.catalog.json)
+        """
+        self.decks_dir = os.path.abspath(decks_dir)
+        self.cache_path = cache_path or os.path.join(self.decks_dir, CATALOG_FILENAME)
+        self._dirs: Dict[str, Dict[str, Any]] = {}
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._fresh_dirs: Dict[str, bool] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        """Load the persisted catalog, ignoring it if it is missing or unreadable."""
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError, OSError):
+            return
+        if data.get("version") != CATALOG_VERSION:
+            return
+        self._dirs = data.get("dirs", {})
+        self._files = data.get("files", {})
+
+    def save(self) -> None:
+        """Persist the catalog if anything changed since it was loaded."""
+        if not self._dirty:
+            return
+        data = {"version": CATALOG_VERSION, "dirs": self._dirs, "files": self._files}
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+            self._dirty = False
+        except OSError as e:
+            print(f"Warning: Could not write deck catalog {self.cache_path}: {str(e)}")
+
+    def _rel(self, path: str) -> str:
+        """Return a path relative to the decks directory, using '/' separators."""
+        rel = os.path.relpath(path, self.decks_dir)
+        return "." if rel == "." else rel.replace(os.sep, "/")
+
+    def _abs(self, rel: str) -> str:
+        """Return the absolute path for a catalog-relative path."""
+        if rel == ".":
+            return self.decks_dir
+        return os.path.join(self.decks_dir, *rel.split("/"))
+
+    def _directory(self, rel_dir: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the up-to-date record for a directory, rescanning it if its mtime changed.
+
+        Args:
+            rel_dir: Directory path relative to the decks directory
+
+        Returns:
+            Directory record, or None if the directory does not exist
+        """
+        if self._fresh_dirs.get(rel_dir):
+            return self._dirs.get(rel_dir)
+
+        abs_dir = self._abs(rel_dir)
+        try:
+            mtime_ns = os.stat(abs_dir).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            if self._dirs.pop(rel_dir, None) is not None:
+                self._dirty = True
+            return None
+
+        record = self._dirs.get(rel_dir)
+        if record is None or record.get("mtime_ns") != mtime_ns:
+            files: List[str] = []
+            dirs: List[str] = []
+            try:
+                with os.scandir(abs_dir) as it:
+                    for entry in it:
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_dir():
+                            dirs.append(entry.name)
+                        elif entry.name.endswith(".toml") and entry.is_file():
+                            files.append(entry.name)
+            except PermissionError:
+                print(f"Permission denied when accessing directory: {abs_dir}")
+            record = {
+                "mtime_ns": mtime_ns,
+                "files": sorted(files),
+                "dirs": sorted(dirs),
+            }
+            self._dirs[rel_dir] = record
+            self._dirty = True
+
+        self._fresh_dirs[rel_dir] = True
+        return record
+
+    def _entry(self, rel_path: str, level: str) -> Optional[CatalogEntry]:
+        """
+        Return the up-to-date entry for a file, re-hashing it only if it changed.
+
+        Args:
+            rel_path: File path relative to the decks directory
+            level: Level the file belongs to
+
+        Returns:
+            Catalog entry, or None if the file vanished
+        """
+        abs_path = self._abs(rel_path)
+        try:
+            stat = os.stat(abs_path)
+        except FileNotFoundError:
+            if self._files.pop(rel_path, None) is not None:
+                self._dirty = True
+            return None
+
+        cached = self._files.get(rel_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if cached is not None and (cached["mtime_ns"], cached["size"]) == stamp:
+            return CatalogEntry(
+                level=level,
+                topic=cached["topic"],
+                path=abs_path,
+                mtime_ns=cached["mtime_ns"],
+                size=cached["size"],
+                sha256=cached["sha256"],
+                note_count=cached["note_count"],
+                card_count=cached["card_count"],
+                card_counts=cached["card_counts"],
+            )
+
+        try:
+            entry = _describe_file(abs_path, level, stat)
+        except OSError as e:
+            print(f"Warning: Could not read {abs_path}: {str(e)}")
+            return None
+        self._files[rel_path] = {
+            "topic": entry.topic,
+            "mtime_ns": entry.mtime_ns,
+            "size": entry.size,
+            "sha256": entry.sha256,
+            "note_count": entry.note_count,
+            "card_count": entry.card_count,
+            "card_counts": entry.card_counts,
+        }
+        self._dirty = True
+        return entry
+
+    def entry(self, path: str) -> Optional[CatalogEntry]:
+        """
+        Return the up-to-date entry for a single deck file.
+
+        Args:
+            path: Path to a deck file below the decks directory
+
+        Returns:
+            Catalog entry, or None if the file is missing or outside the decks directory
+        """
+        rel_path = self._rel(os.path.abspath(path))
+        if rel_path == "." or rel_path.startswith(".."):
+            return None
+        return self._entry(rel_path, rel_path.split("/")[0])
+
+    def levels(self) -> List[str]:
+        """
+        List the level directories.
+
+        Returns:
+            Sorted list of level names
+        """
+        root = self._directory(".")
+        return list(root["dirs"]) if root else []
+
+    def entries_in(self, directory: str, recursive: bool = False) -> List[CatalogEntry]:
+        """
+        List the deck files in a directory below the decks directory.
+
+        Args:
+            directory: Directory path (absolute or relative to the current directory)
+            recursive: If True, include deck files in subdirectories
+
+        Returns:
+            Catalog entries sorted by path
+        """
+        rel_dir = self._rel(os.path.abspath(directory))
+        if rel_dir == "." or rel_dir.startswith(".."):
+            return []
+        level = rel_dir.split("/")[0]
+
+        entries: List[CatalogEntry] = []
+        pending = [rel_dir]
+        while pending:
+            current = pending.pop(0)
+            record = self._directory(current)
+            if record is None:
+                continue
+            for name in record["files"]:
+                entry = self._entry(f"{current}/{name}", level)
+                if entry is not None:
+                    entries.append(entry)
+            if recursive:
+                pending.extend(f"{current}/{name}" for name in record["dirs"])
+
+        entries.sort(key=lambda e: e.path)
+        return entries
+
+    def entries(
+        self, level: Optional[str] = None, recursive: bool = True
+    ) -> List[CatalogEntry]:
+        """
+        List the deck files of one level, or of all levels.
+
+        Args:
+            level: Optional level name; all levels are listed if omitted
+            recursive: If True, include deck files nested below the level directory
+
+        Returns:
+            Catalog entries sorted by level, then path
+        """
+        levels = [level] if level else self.levels()
+        result: List[CatalogEntry] = []
+        for lvl in levels:
+            result.extend(self.entries_in(os.path.join(self.decks_dir, lvl), recursive))
+        return result
+
+    def by_level(
+        self, levels: Optional[List[str]] = None, recursive: bool = True
+    ) -> Dict[str, List[CatalogEntry]]:
+        """
+        Group catalog entries by level.
+
+        Args:
+            levels: Optional list of levels to include; all levels if omitted
+            recursive: If True, include deck files nested below the level directories
+
+        Returns:
+            Dictionary mapping level names to their catalog entries
+        """
+        result: Dict[str, List[CatalogEntry]] = {}
+        for lvl in levels if levels is not None else self.levels():
+            entries = self.entries(lvl, recursive)
+            if entries:
+                result[lvl] = entries
+        return result
+
+    def sources(
+        self, levels: Optional[List[str]] = None, recursive: bool = True
+    ) -> Dict[str, List[DeckSource]]:
+        """
+        Group lazy deck handles by level.
+
+        Args:
+            levels: Optional list of levels to include; all levels if omitted
+            recursive: If True, include deck files nested below the level directories
+
+        Returns:
+            Dictionary mapping level names to the sources of their deck files
+        """
+        return {
+            level: [DeckSource(entry) for entry in entries]
+            for level, entries in self.by_level(levels, recursive).items()
+        }
+
+
+_CATALOGS: Dict[str, DeckCatalog] = {}
+
+
+def get_catalog(decks_dir: str) -> DeckCatalog:
+    """
+    Return the shared catalog for a decks directory, opening it on first use.
+
+    Args:
+        decks_dir: Root directory containing one subdirectory per level
+
+    Returns:
+        The catalog for that directory
+    """
+    key = os.path.abspath(decks_dir)
+    if key not in _CATALOGS:
+        _CATALOGS[key] = DeckCatalog(key)
+    return _CATALOGS[key]
+
+
+def _owning_catalog(directory: str, decks_dir: str) -> Optional[DeckCatalog]:
+    """Return the catalog covering a directory, or None if it lies outside decks_dir."""
+    root = os.path.abspath(decks_dir)
+    target = os.path.abspath(directory)
+    try:
+        if os.path.commonpath([root, target]) != root or target == root:
+            return None
+    except ValueError:
+        return None
+    return get_catalog(root)
+
+
+def list_deck_files(
+    directory: str, recursive: bool = False, decks_dir: str = "decks"
+) -> List[str]:
+    """
+    List the deck files in a directory through the catalog when possible.
+
+    Directories outside the decks directory are listed with os.scandir directly.
+
+    Args:
+        directory: Directory to list
+        recursive: If True, include deck files in subdirectories
+        decks_dir: Root of the catalogued decks tree
+
+    Returns:
+        Sorted list of paths, prefixed with the directory as given
+    """
+    catalog = _owning_catalog(directory, decks_dir)
+    if catalog is not None:
+        abs_dir = os.path.abspath(directory)
+        paths = [
+            os.path.join(directory, os.path.relpath(e.path, abs_dir))
+            for e in catalog.entries_in(directory, recursive)
+        ]
+        catalog.save()
+        return paths
+
+    paths = []
+    pending = [directory]
+    while pending:
+        current = pending.pop(0)
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir() and recursive and not entry.name.startswith("."):
+                        pending.append(os.path.join(current, entry.name))
+                    elif entry.name.endswith(".toml") and entry.is_file():
+                        paths.append(os.path.join(current, entry.name))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    return sorted(paths)
+
+
+def find_deck_files(
+    path: Optional[str] = None,
+    levels: Optional[List[str]] = None,
+    recursive: bool = False,
+    decks_dir: str = "decks",
+) -> List[str]:
+    """
+    Resolve a path argument or level selection to a list of deck files.
+
+    This is the shared lookup behind the command line tools:
+    - a .toml file resolves to itself
+    - a directory resolves to the deck files directly inside it
+    - anything else is treated as a glob pattern and searched recursively
+    - without a path, the selected levels (or all levels) of decks_dir are listed
+
+    Args:
+        path: Optional path to a specific file or directory
+        levels: Optional list of levels, used when no path is given
+        recursive: If True, include nested deck files when listing levels
+        decks_dir: Root of the catalogued decks tree
+
+    Returns:
+        List of deck file paths
+    """
+    if path:
+        if os.path.isfile(path) and path.endswith(".toml"):
+            return [path]
+        elif os.path.isdir(path):
+            return list_deck_files(path, decks_dir=decks_dir)
+        else:
+            return glob.glob(os.path.join(path, "**/*.toml"), recursive=True)
+
+    catalog = get_catalog(decks_dir)
+    selected = levels if levels else catalog.levels()
+    files = []
+    for level in selected:
+        files.extend(
+            list_deck_files(os.path.join(decks_dir, level), recursive, decks_dir)
+        )
+    catalog.save()
+    return files
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 for success, non-zero for errors)
+    """
+    parser = argparse.ArgumentParser(description="List the deck catalog")
+    parser.add_argument("--decks-dir", default="decks", help="root of the decks tree")
+    parser.add_argument("--level", help="only list this level")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="discard the persisted catalog and rescan",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print entries as JSON lines"
+    )
+    args = parser.parse_args()
+
+    if args.rebuild:
+        try:
+            os.remove(os.path.join(args.decks_dir, CATALOG_FILENAME))
+        except FileNotFoundError:
+            pass
+
+    catalog = get_catalog(args.decks_dir)
+    entries = catalog.entries(args.level)
+    catalog.save()
+
+    for entry in entries:
+        if args.json:
+            print(json.dumps(entry._asdict(), sort_keys=True))
+        else:
+            rel = os.path.relpath(entry.path, catalog.decks_dir)
+            print(
+                f"{entry.level:8} {entry.note_count:5} notes {entry.card_count:5} cards "
+                f"{entry.size:8} bytes  {rel}"
+            )
+    if not args.json:
+        notes = sum(e.note_count for e in entries)
+        cards = sum(e.card_count for e in entries)
+        print(f"{len(entries)} deck files, {notes} notes, {cards} cards")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
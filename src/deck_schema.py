@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+deck_schema.py.
+
+Declarative schema of deck files, compiled into specialized note validators.
+The schema in config/deck_schema.toml defines the deck name, the tag shape, the field
+counts and the known models. It is loaded once per run and compiled, for every level
+and topic, into a validator with all per-file values filled in: the leading tags are
+one list compared against one slice of the note's tags, messages are formatted up
+front, and the checks of a model are found by one lookup of the note's model, so a
+note only runs the rules of its own model. Changing a rule is an edit of the schema
+file.
+
+Used by validate.py (and through it by deck_server.py and import_table.py),
+generate.py, deck_catalog.py, conjugations.py, deck_writer.py, fix_tags.py,
+import_apkg.py, note_index.py and stats.py.
+"""
+import os
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+from cloze import scan_cloze
+from orthography import position
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# The schema lives in the config directory of the repository root
+SCHEMA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    "config",
+    "deck_schema.toml",
+)
+
+# Checks one note, given the default model of its file, and returns error messages
+NoteValidator = Callable[[Dict[str, Any], str], List[str]]
+
+
+class TagRule(NamedTuple):
+    """A tag every note starts with, and the message when it does not."""
+
+    value: str
+    message: str
+
+
+class ModelRule(NamedTuple):
+    """Constraints on the notes of one model."""
+
+    min_fields: int
+    cloze: bool
+
+
+def plural(count: int, noun: str) -> str:
+    """Return a count with its noun, such as '1 element' or '2 elements'."""
+    return f"{count} {noun}" if count == 1 else f"{count} {noun}s"
+
+
+def check_cloze(text: str) -> List[str]:
+    """
+    Check the cloze deletions in the text field of a cloze note.
+
+    Args:
+        text: Text field
+
+    Returns:
+        List of error messages with line and column, empty if no errors
+    """
+    scan = scan_cloze(text)
+    if not scan.ordinals and not scan.errors:
+        return ["field 1: Cloze note has no cloze deletions"]
+    errors = []
+    for error in scan.errors:
+        line, column = position(text, error.offset)
+        errors.append(f"field 1 line {line} col {column}: {error.message}")
+    return errors
+
+
+class DeckSchema:
+    """
+    Deck schema, with the validators compiled from it.
+
+    Args:
+        data: Parsed schema file
+        path: Schema file, used in error messages
+
+    Raises:
+        ValueError: If the schema is malformed
+    """
+
+    def __init__(self, data: Dict[str, Any], path: str = SCHEMA_PATH):
+        """Read the schema values and check that they fit together."""
+        try:
+            self.default_model = str(data["default_model"])
+            self.name_template = str(data["deck"]["name"])
+            self.prefix_template = str(data["deck"]["prefix"])
+            self.min_tags = int(data["tags"]["min"])
+            self.leading = [
+                TagRule(str(rule["value"]), str(rule["message"]))
+                for rule in data["tags"].get("leading", [])
+            ]
+            self.min_fields = int(data["fields"]["min"])
+            self.models = {
+                str(name): ModelRule(int(rule["min_fields"]), bool(rule.get("cloze")))
+                for name, rule in data["models"].items()
+            }
+            self.deck_name("level", "topic")
+            self.tags("level", "topic")
+        except KeyError as e:
+            raise ValueError(f"{path}: missing or unknown key {str(e)}")
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: malformed schema: {str(e)}")
+        if self.default_model not in self.models:
+            raise ValueError(
+                f"{path}: default model '{self.default_model}' is not a known model"
+            )
+        if self.min_tags < len(self.leading):
+            raise ValueError(f"{path}: tags.min must be at least the leading tags")
+        self._validators: Dict[Tuple[str, str], NoteValidator] = {}
+
+    def deck_name(self, level: str, topic: str) -> str:
+        """
+        Name a new deck file.
+
+        Args:
+            level: Level of the deck file
+            topic: Topic of the deck file
+
+        Returns:
+            Deck name
+        """
+        return self.name_template.format(level=level, topic=topic)
+
+    def tags(self, level: str, topic: str) -> List[str]:
+        """
+        List the tags every note of a deck file starts with.
+
+        Args:
+            level: Level of the deck file
+            topic: Topic of the deck file
+
+        Returns:
+            Leading tags, in order
+        """
+        return [rule.value.format(level=level, topic=topic) for rule in self.leading]
+
+    def check_header(self, data: Dict[str, Any], level: str, topic: str) -> List[str]:
+        """
+        Check the deck-level keys of a deck file.
+
+        Args:
+            data: Parsed deck file
+            level: Level of the deck file
+            topic: Topic of the deck file
+
+        Returns:
+            List of error messages, empty if no errors
+        """
+        if "deck" not in data:
+            return ["Missing 'deck' field"]
+        prefix = self.prefix_template.format(level=level, topic=topic)
+        if not str(data["deck"]).startswith(prefix):
+            return [f"Deck name should start with '{prefix}'"]
+        return []
+
+    def validator(self, level: str, topic: str) -> NoteValidator:
+        """
+        Return the validator for the notes of a deck file, compiling it on first use.
+
+        Args:
+            level: Level of the deck file
+            topic: Topic of the deck file
+
+        Returns:
+            Function checking one note against the default model of its file
+        """
+        try:
+            return self._validators[level, topic]
+        except KeyError:
+            validate = self._validators[level, topic] = self._compile(level, topic)
+            return validate
+
+    def _compile(self, level: str, topic: str) -> NoteValidator:
+        """
+        Build the validator of one level and topic.
+
+        A note passing the schema is accepted by a single condition over its tags,
+        fields and model; only notes that fail it, and cloze notes, walk the rules
+        to collect their messages.
+        """
+        expected = self.tags(level, topic)
+        leading = len(expected)
+        tag_messages = [rule.message for rule in self.leading]
+        min_tags, min_fields = self.min_tags, self.min_fields
+        few_tags = f"'tags' should have at least {plural(min_tags, 'element')}"
+        few_fields = f"'fields' should have at least {plural(min_fields, 'element')}"
+        models = {
+            name: (
+                rule,
+                f"{name.capitalize()} model requires at least "
+                f"{plural(rule.min_fields, 'field')}",
+            )
+            for name, rule in self.models.items()
+        }
+        # Fields a valid note of each model has at least; cloze notes always walk
+        # the rules, since their text has to be scanned
+        required = {
+            name: max(rule.min_fields, min_fields)
+            for name, rule in self.models.items()
+            if not rule.cloze
+        }
+
+        def check(note: Dict[str, Any], default_model: str) -> List[str]:
+            errors = []
+            if "tags" not in note:
+                errors.append("Missing 'tags' field")
+            else:
+                tags = note["tags"]
+                if not isinstance(tags, list):
+                    errors.append("'tags' should be a list")
+                elif len(tags) < min_tags:
+                    errors.append(few_tags)
+                elif tags[:leading] != expected:
+                    for message, value, tag in zip(tag_messages, expected, tags):
+                        if tag != value:
+                            errors.append(
+                                message.format(
+                                    expected=value, actual=tag, level=level, topic=topic
+                                )
+                            )
+                            break
+
+            fields = note.get("fields")
+            valid_fields = False
+            if fields is None:
+                errors.append("Missing 'fields' field")
+            elif not isinstance(fields, list):
+                errors.append("'fields' should be a list")
+            elif len(fields) < min_fields:
+                errors.append(few_fields)
+            else:
+                valid_fields = True
+
+            model = note.get("model", default_model)
+            if model not in models:
+                errors.append(f"Unknown model '{model}'")
+            elif valid_fields and isinstance(fields, list):
+                rule, few_model_fields = models[model]
+                if len(fields) < rule.min_fields:
+                    errors.append(few_model_fields)
+                elif rule.cloze and isinstance(fields[0], str):
+                    errors.extend(check_cloze(fields[0]))
+            return errors
+
+        def validate(note: Dict[str, Any], default_model: str) -> List[str]:
+            tags = note.get("tags")
+            fields = note.get("fields")
+            count = required.get(note.get("model", default_model))
+            if type(tags) is list and type(fields) is list and count is not None:
+                enough = len(fields) >= count and len(tags) >= min_tags
+                if enough and tags[:leading] == expected:
+                    return []
+            return check(note, default_model)
+
+        return validate
+
+
+def load_schema(path: str = SCHEMA_PATH) -> DeckSchema:
+    """
+    Load a deck schema.
+
+    Args:
+        path: Schema file
+
+    Returns:
+        The schema
+
+    Raises:
+        ValueError: If the file cannot be read or the schema is malformed
+    """
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        raise ValueError(f"Failed to load deck schema {path}: {str(e)}")
+    return DeckSchema(data, path)
+
+
+_SCHEMAS: Dict[str, DeckSchema] = {}
+
+
+def get_schema(path: str = SCHEMA_PATH) -> DeckSchema:
+    """
+    Return the schema of a schema file, loading it on first use.
+
+    Args:
+        path: Schema file
+
+    Returns:
+        The schema
+
+    Raises:
+        ValueError: If the file cannot be read or the schema is malformed
+    """
+    schema = _SCHEMAS.get(path)
+    if schema is None:
+        key = os.path.abspath(path)
+        if key not in _SCHEMAS:
+            _SCHEMAS[key] = load_schema(key)
+        schema = _SCHEMAS[path] = _SCHEMAS[key]
+    return schema
@@ -0,0 +1,818 @@
+#!/usr/bin/env python3
+"""
+deck_server.py.
+
+Language server for deck files, speaking the Language Server Protocol over stdio.
+Open deck files are checked with the rules of validate.py while they are edited:
+- diagnostics for tags, fields, models, the deck name, TOML syntax and orthography,
+  published with line and column positions
+- completion of the level and topic in 'tags' arrays
+- hover over a note to preview its fields rendered by the Markdown pipeline of the
+  deck build
+
+Each document is split into blocks at its [[notes]] headers and every block is parsed
+and validated on its own. Results are kept per block, so an edit only parses and
+validates the blocks whose text changed.
+
+Usage:
+  python deck_server.py    # started by the editor for decks/**/*.toml
+"""
+import json
+import os
+import re
+import sys
+from typing import Any, BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from conjugations import expand_conjugations
+from deck_schema import get_schema
+from orthography import Automaton, get_automaton
+from render import render_markdown
+from validate import note_texts, validate_header, validate_note
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# Matches the [[notes]] headers that split a document into blocks
+NOTE_HEADER_RE = re.compile(r"^[ \t]*\[\[notes\]\]", re.MULTILINE)
+
+# Matches a key assignment at the start of a line
+KEY_RE = re.compile(r"^[ \t]*([A-Za-z0-9_-]+)[ \t]*=")
+
+# Matches the position tomllib reports in its error messages
+TOML_POSITION_RE = re.compile(r"\(at line (\d+), column (\d+)\)")
+
+# Keys whose line a validation message is reported on, by a word in the message
+MESSAGE_KEYS = (("tag", "tags"), ("field", "fields"), ("model", "model"))
+
+# Characters written by the escape sequences of TOML basic strings
+ESCAPES = {"b": "\b", "t": "\t", "n": "\n", "f": "\f", "r": "\r", '"': '"', "\\": "\\"}
+
+# A decoded string, with the source span of each of its characters
+Literal = Tuple[str, List[Tuple[int, int]]]
+
+# LSP constants
+SEVERITY_ERROR = 1
+SYNC_INCREMENTAL = 2
+COMPLETION_VALUE = 12
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class Diagnostic(NamedTuple):
+    """A problem at a position, with lines relative to the start of its block."""
+
+    line: int
+    start: int
+    end: int
+    message: str
+
+
+class Block(NamedTuple):
+    """A parsed block of a document and its diagnostics."""
+
+    data: Optional[Dict[str, Any]]
+    diagnostics: List[Diagnostic]
+
+
+def uri_to_path(uri: str) -> str:
+    """
+    Convert a file URI to a path.
+
+    Args:
+        uri: Document URI
+
+    Returns:
+        Local path
+    """
+    parsed = urlparse(uri)
+    return unquote(parsed.path) if parsed.scheme == "file" else uri
+
+
+def utf16_length(text: str) -> int:
+    """Return the length of text in UTF-16 code units, as LSP counts columns."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def utf16_to_index(line: str, units: int) -> int:
+    """
+    Convert an LSP column to an index into a line.
+
+    Args:
+        line: Line text
+        units: Column in UTF-16 code units
+
+    Returns:
+        Character index
+    """
+    for index, ch in enumerate(line):
+        if units <= 0:
+            return index
+        units -= 2 if ord(ch) > 0xFFFF else 1
+    return len(line)
+
+
+def split_blocks(text: str) -> List[Tuple[int, str]]:
+    """
+    Split a document at its [[notes]] headers.
+
+    Args:
+        text: Document text
+
+    Returns:
+        List of (first line, text) pairs; the first block holds everything before
+        the first [[notes]] header and may be empty
+    """
+    starts = [0] + [m.start() for m in NOTE_HEADER_RE.finditer(text)]
+    blocks = []
+    line = 0
+    for idx, start in enumerate(starts):
+        end = starts[idx + 1] if idx + 1 < len(starts) else len(text)
+        chunk = text[start:end]
+        blocks.append((line, chunk))
+        line += chunk.count("\n")
+    return blocks
+
+
+def key_lines(lines: List[str]) -> Dict[str, Tuple[int, int]]:
+    """
+    Find the lines spanned by each key of a block.
+
+    Args:
+        lines: Lines of the block
+
+    Returns:
+        Dictionary mapping keys to (first line, line after the value)
+    """
+    spans: Dict[str, Tuple[int, int]] = {}
+    current = None
+    for idx, line in enumerate(lines):
+        match = KEY_RE.match(line)
+        if match is None and not line.lstrip().startswith("["):
+            continue
+        if current is not None:
+            spans[current] = (spans[current][0], idx)
+            current = None
+        if match is not None and match.group(1) not in spans:
+            current = match.group(1)
+            spans[current] = (idx, len(lines))
+    return spans
+
+
+def line_range(text: str) -> Tuple[int, int]:
+    """Return the columns a line's content spans, without surrounding whitespace."""
+    return len(text) - len(text.lstrip()), len(text.rstrip())
+
+
+def read_literal(text: str, start: int) -> Optional[Tuple[Literal, int]]:
+    """
+    Decode the TOML string starting at an offset.
+
+    Args:
+        text: Source text
+        start: Offset of the opening quote
+
+    Returns:
+        The decoded string with the span of each character, and the offset after the
+        closing quote; None if the string is malformed or not closed
+    """
+    quote = text[start]
+    multiline = text.startswith(quote * 3, start)
+    pos = start + (3 if multiline else 1)
+    if multiline and text.startswith("\n", pos):
+        pos += 1
+    elif multiline and text.startswith("\r\n", pos):
+        pos += 2
+    chars: List[str] = []
+    spans: List[Tuple[int, int]] = []
+    while pos < len(text):
+        ch = text[pos]
+        if multiline and text.startswith(quote * 3, pos):
+            # Up to two quotes may directly precede the closing delimiter
+            extra = min(len(text) - pos - 3, 2)
+            while extra and text[pos + 3 : pos + 3 + extra] != quote * extra:
+                extra -= 1
+            for offset in range(pos, pos + extra):
+                chars.append(quote)
+                spans.append((offset, offset + 1))
+            return ("".join(chars), spans), pos + 3 + extra
+        if not multiline and ch == quote:
+            return ("".join(chars), spans), pos + 1
+        if ch == "\n" and not multiline:
+            return None
+        if ch != "\\" or quote == "'":
+            chars.append(ch)
+            spans.append((pos, pos + 1))
+            pos += 1
+            continue
+        escape = text[pos + 1 : pos + 2]
+        if escape in ESCAPES:
+            chars.append(ESCAPES[escape])
+            spans.append((pos, pos + 2))
+            pos += 2
+        elif escape in ("u", "U"):
+            digits = 4 if escape == "u" else 8
+            try:
+                chars.append(chr(int(text[pos + 2 : pos + 2 + digits], 16)))
+            except ValueError:
+                return None
+            spans.append((pos, pos + 2 + digits))
+            pos += 2 + digits
+        elif multiline and escape in (" ", "\t", "\r", "\n"):
+            # A line-ending backslash drops the whitespace up to the next content
+            pos += 1
+            while pos < len(text) and text[pos] in " \t\r\n":
+                pos += 1
+        else:
+            return None
+    return None
+
+
+def string_literals(text: str, start: int, end: int) -> List[Literal]:
+    """
+    Decode the strings of a TOML value, such as an array of strings.
+
+    Args:
+        text: Source text
+        start: Offset of the value
+        end: Offset after the value
+
+    Returns:
+        The strings in order, with the source span of each character
+    """
+    literals = []
+    pos = start
+    while pos < end:
+        ch = text[pos]
+        if ch == "#":
+            newline = text.find("\n", pos)
+            pos = end if newline < 0 else newline
+        elif ch in "\"'":
+            result = read_literal(text, pos)
+            if result is None:
+                break
+            literal, pos = result
+            literals.append(literal)
+        else:
+            pos += 1
+    return literals
+
+
+def merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    """Merge the tables of one block into the data of the whole document."""
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge(target[key], value)
+        elif isinstance(value, list) and isinstance(target.get(key), list):
+            target[key].extend(value)
+        else:
+            target[key] = value
+
+
+class DeckDocument:
+    """
+    An open deck file.
+
+    Args:
+        uri: Document URI
+        text: Document text
+    """
+
+    def __init__(self, uri: str, text: str):
+        """Remember the document and the level and topic its path gives it."""
+        self.uri = uri
+        self.path = uri_to_path(uri)
+        self.level = os.path.basename(os.path.dirname(self.path))
+        self.topic = os.path.splitext(os.path.basename(self.path))[0]
+        self.text = text
+        self.blocks: List[Tuple[int, str]] = []
+        self._results: Dict[Tuple[str, str], Block] = {}
+        self.parsed = 0
+
+    def apply_change(self, change: Dict[str, Any]) -> None:
+        """
+        Apply one content change of a didChange notification.
+
+        Args:
+            change: Change with 'text' and, for incremental changes, 'range'
+        """
+        if "range" not in change:
+            self.text = change["text"]
+            return
+        start = self.offset(change["range"]["start"])
+        end = self.offset(change["range"]["end"])
+        self.text = self.text[:start] + change["text"] + self.text[end:]
+
+    def offset(self, position: Dict[str, int]) -> int:
+        """
+        Convert an LSP position to an offset into the text.
+
+        Args:
+            position: Position with 'line' and 'character'
+
+        Returns:
+            Character offset
+        """
+        lines = self.text.split("\n")
+        line = position["line"]
+        if line >= len(lines):
+            return len(self.text)
+        offset = sum(len(text) + 1 for text in lines[:line])
+        return offset + utf16_to_index(lines[line], position["character"])
+
+    def diagnose(self, automaton: Optional[Automaton]) -> List[Dict[str, Any]]:
+        """
+        Validate the document, reusing the results of unchanged blocks.
+
+        Args:
+            automaton: Optional compiled orthography rules
+
+        Returns:
+            LSP diagnostics
+        """
+        self.blocks = split_blocks(self.text)
+        results: Dict[Tuple[str, str], Block] = {}
+
+        def cached(idx: int, text: str, default_model: str) -> Block:
+            key = (text, default_model)
+            block = results.get(key) or self._results.get(key)
+            if block is None:
+                block = self._block(idx, text, default_model, automaton)
+            results[key] = block
+            return block
+
+        header = cached(0, self.blocks[0][1], "")
+        default_model = (header.data or {}).get("model", get_schema().default_model)
+
+        found: List[Tuple[int, Diagnostic]] = []
+        data: Dict[str, Any] = {}
+        for idx, (first_line, text) in enumerate(self.blocks):
+            block = cached(idx, text, default_model) if idx else header
+            found.extend((first_line, d) for d in block.diagnostics)
+            if block.data is not None:
+                merge(data, block.data)
+        self._results = results
+
+        if header.data is not None:
+            found.extend((0, d) for d in self._header_diagnostics(data))
+        if "conjugations" in data:
+            found.extend(self._conjugation_diagnostics(data, default_model))
+
+        lines = self.text.split("\n")
+        diagnostics = []
+        for first_line, d in found:
+            line = min(first_line + d.line, len(lines) - 1)
+            text = lines[line]
+            end = d.end if d.end > d.start else len(text)
+            diagnostics.append(
+                {
+                    "range": {
+                        "start": {
+                            "line": line,
+                            "character": utf16_length(text[: d.start]),
+                        },
+                        "end": {"line": line, "character": utf16_length(text[:end])},
+                    },
+                    "severity": SEVERITY_ERROR,
+                    "source": "validate",
+                    "message": d.message,
+                }
+            )
+        return diagnostics
+
+    def _block(
+        self, idx: int, text: str, default_model: str, automaton: Optional[Automaton]
+    ) -> Block:
+        """Parse and validate one block."""
+        self.parsed += 1
+        try:
+            data = tomllib.loads(text)
+        except tomllib.TOMLDecodeError as e:
+            match = TOML_POSITION_RE.search(str(e))
+            line, column = (
+                (int(match.group(1)) - 1, int(match.group(2)) - 1) if match else (0, 0)
+            )
+            message = TOML_POSITION_RE.sub("", str(e)).strip()
+            return Block(None, [Diagnostic(line, column, 0, message)])
+
+        if idx == 0 or not data.get("notes"):
+            return Block(data, [])
+
+        lines = text.split("\n")
+        spans = key_lines(lines)
+        note = data["notes"][0]
+        prefix = f"ERR {self.path} [note]: "
+        diagnostics = []
+        for error in validate_note(
+            self.path, "note", note, default_model, self.level, self.topic
+        ):
+            message = error[len(prefix) :] if error.startswith(prefix) else error
+            line = 0
+            for word, key in MESSAGE_KEYS:
+                if word in message.lower():
+                    line = spans.get(key, (0, 0))[0]
+                    break
+            diagnostics.append(Diagnostic(line, *line_range(lines[line]), message))
+
+        if automaton is not None:
+            diagnostics.extend(self._lint(text, lines, spans, note, automaton))
+
+        return Block(data, diagnostics)
+
+    def _lint(
+        self,
+        text: str,
+        lines: List[str],
+        spans: Dict[str, Tuple[int, int]],
+        note: Dict[str, Any],
+        automaton: Automaton,
+    ) -> List[Diagnostic]:
+        """
+        Check the parsed texts of a note for misspellings.
+
+        The texts are scanned as parsed, with their escapes decoded, and every finding
+        is mapped back to the characters of the string it was written as.
+        """
+        literals: Dict[str, List[Literal]] = {}
+        for key in ("fields", "back"):
+            if key in spans:
+                first, last = spans[key]
+                start = sum(len(line) + 1 for line in lines[:first])
+                start += lines[first].index("=") + 1
+                end = min(sum(len(line) + 1 for line in lines[:last]), len(text))
+                literals[key] = string_literals(text, start, end)
+
+        diagnostics = []
+        seen: Dict[str, int] = {}
+        for key, _, value in note_texts(note):
+            # The n-th string of a key is its n-th literal, unless the source could
+            # not be decoded the way the parser did
+            count = seen[key] = seen.get(key, -1) + 1
+            source = literals.get(key, [])
+            literal = source[count] if count < len(source) else None
+            if literal is not None and literal[0] != value:
+                literal = None
+            for finding in automaton.scan(value):
+                message = (
+                    f"'{finding.text}' should be '{finding.suggestion}' "
+                    f"({finding.message})"
+                )
+                if literal is None:
+                    line = spans.get(key, (0, 0))[0]
+                    diagnostics.append(
+                        Diagnostic(line, *line_range(lines[line]), message)
+                    )
+                    continue
+                start = literal[1][finding.start][0]
+                end = literal[1][finding.end - 1][1]
+                line = text.count("\n", 0, start)
+                line_start = text.rfind("\n", 0, start) + 1
+                # A finding never spans lines; clip it to its first line otherwise
+                end = min(end, line_start + len(lines[line]))
+                diagnostics.append(
+                    Diagnostic(line, start - line_start, end - line_start, message)
+                )
+        return diagnostics
+
+    def _header_diagnostics(self, data: Dict[str, Any]) -> List[Diagnostic]:
+        """Validate the deck name against the level of the document."""
+        prefix = f"ERR {self.path}: "
+        lines = self.blocks[0][1].split("\n")
+        spans = key_lines(lines)
+        line = spans.get("deck", (0, 0))[0]
+        return [
+            Diagnostic(line, *line_range(lines[line]), error[len(prefix) :])
+            for error in validate_header(self.path, data, self.level)
+        ]
+
+    def _conjugation_diagnostics(
+        self, data: Dict[str, Any], default_model: str
+    ) -> List[Tuple[int, Diagnostic]]:
+        """Validate the notes expanded from conjugation tables."""
+        line = next(
+            (
+                idx
+                for idx, text in enumerate(self.text.split("\n"))
+                if text.lstrip().startswith(("[conjugations", "[[conjugations"))
+            ),
+            0,
+        )
+        found = []
+        try:
+            for note in expand_conjugations(data, self.level, self.topic):
+                label = f"note {note['note_id']}"
+                prefix = f"ERR {self.path} [{label}]: "
+                for error in validate_note(
+                    self.path, label, note, default_model, self.level, self.topic
+                ):
+                    found.append(
+                        (line, Diagnostic(0, 0, 0, f"{label}: {error[len(prefix):]}"))
+                    )
+        except ValueError as e:
+            found.append((line, Diagnostic(0, 0, 0, str(e))))
+        return found
+
+    def block_at(self, line: int) -> Tuple[int, str]:
+        """
+        Find the block containing a line.
+
+        Args:
+            line: Line number
+
+        Returns:
+            The (first line, text) pair of the block
+        """
+        current = self.blocks[0] if self.blocks else (0, "")
+        for block in self.blocks:
+            if block[0] > line:
+                break
+            current = block
+        return current
+
+    def completions(self, position: Dict[str, int]) -> List[Dict[str, Any]]:
+        """
+        Complete a value of a 'tags' array.
+
+        Args:
+            position: Cursor position
+
+        Returns:
+            Completion items for the level and topic, or an empty list outside tags
+        """
+        self.blocks = split_blocks(self.text)
+        first_line, text = self.block_at(position["line"])
+        lines = text.split("\n")
+        line = position["line"] - first_line
+        if not 0 <= line < len(lines):
+            return []
+        column = utf16_to_index(lines[line], position["character"])
+        before = "\n".join(lines[:line] + [lines[line][:column]])
+        tags = before.rfind("tags")
+        if tags < 0 or not re.match(r"tags\s*=\s*\[", before[tags:]):
+            return []
+        if "]" in before[tags:]:
+            return []
+        quoted = before.endswith('"')
+        return [
+            {
+                "label": tag,
+                "kind": COMPLETION_VALUE,
+                "detail": detail,
+                "insertText": tag if quoted else f'"{tag}"',
+            }
+            for tag, detail in ((self.level, "level"), (self.topic, "topic"))
+        ]
+
+    def hover(self, position: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """
+        Preview the rendered fields of the note under the cursor.
+
+        Args:
+            position: Cursor position
+
+        Returns:
+            Hover result, or None outside notes
+        """
+        self.blocks = split_blocks(self.text)
+        first_line, text = self.block_at(position["line"])
+        if not NOTE_HEADER_RE.match(text):
+            return None
+        try:
+            note = tomllib.loads(text)["notes"][0]
+        except (tomllib.TOMLDecodeError, KeyError, IndexError):
+            return None
+        parts = [
+            (f"Field {idx}", field)
+            for idx, field in enumerate(note.get("fields", []), start=1)
+            if isinstance(field, str)
+        ]
+        if isinstance(note.get("back"), str):
+            parts.append(("Back", note["back"]))
+        if not parts:
+            return None
+        value = "\n\n".join(
+            f"**{title}**\n```html\n{render_markdown(field)}\n```"
+            for title, field in parts
+        )
+        return {"contents": {"kind": "markdown", "value": value}}
+
+
+class DeckServer:
+    """
+    Language server state and request dispatch.
+
+    Args:
+        reader: Binary stream the client writes to
+        writer: Binary stream the client reads from
+    """
+
+    def __init__(self, reader: BinaryIO, writer: BinaryIO):
+        """Set up the streams and load the orthography rules."""
+        self.reader = reader
+        self.writer = writer
+        self.documents: Dict[str, DeckDocument] = {}
+        self.shutdown = False
+        try:
+            self.automaton = get_automaton()
+        except ValueError as e:
+            print(f"Warning: {str(e)}", file=sys.stderr)
+            self.automaton = None
+
+    def read_message(self) -> Optional[Dict[str, Any]]:
+        """
+        Read one message from the client.
+
+        Returns:
+            The message, or None at the end of the stream
+        """
+        length = None
+        while True:
+            line = self.reader.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.decode("ascii").partition(":")
+            if name.lower() == "content-length":
+                length = int(value.strip())
+        if length is None:
+            return None
+        return json.loads(self.reader.read(length).decode("utf-8"))
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """
+        Write one message to the client.
+
+        Args:
+            message: JSON-RPC message without the 'jsonrpc' member
+        """
+        body = json.dumps(dict(message, jsonrpc="2.0"), ensure_ascii=False).encode(
+            "utf-8"
+        )
+        self.writer.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+        self.writer.flush()
+
+    def publish(self, document: DeckDocument) -> None:
+        """Validate a document and publish its diagnostics."""
+        self.send(
+            {
+                "method": "textDocument/publishDiagnostics",
+                "params": {
+                    "uri": document.uri,
+                    "diagnostics": document.diagnose(self.automaton),
+                },
+            }
+        )
+
+    def handle(self, message: Dict[str, Any]) -> Optional[int]:
+        """
+        Handle one message.
+
+        Args:
+            message: Request or notification
+
+        Returns:
+            Exit code once the client sent 'exit', otherwise None
+        """
+        method = message.get("method")
+        params = message.get("params") or {}
+        handler = getattr(self, f"on_{str(method).replace('/', '_')}", None)
+
+        if "id" not in message:
+            if method == "exit":
+                return 0 if self.shutdown else 1
+            if handler is not None:
+                # Notifications get no response, so a failure is only logged; the
+                # server keeps running whatever a half-typed document does to it
+                try:
+                    handler(params)
+                except Exception as e:
+                    print(
+                        f"Error: {method}: {type(e).__name__}: {str(e)}",
+                        file=sys.stderr,
+                    )
+            return None
+
+        if handler is None:
+            self.send(
+                {
+                    "id": message["id"],
+                    "error": {
+                        "code": METHOD_NOT_FOUND,
+                        "message": f"Unknown method {method}",
+                    },
+                }
+            )
+            return None
+        try:
+            result = handler(params)
+        except (KeyError, TypeError, ValueError) as e:
+            self.send(
+                {
+                    "id": message["id"],
+                    "error": {"code": INVALID_PARAMS, "message": str(e)},
+                }
+            )
+            return None
+        except Exception as e:
+            print(f"Error: {method}: {type(e).__name__}: {str(e)}", file=sys.stderr)
+            self.send(
+                {
+                    "id": message["id"],
+                    "error": {
+                        "code": INTERNAL_ERROR,
+                        "message": f"{type(e).__name__}: {str(e)}",
+                    },
+                }
+            )
+            return None
+        self.send({"id": message["id"], "result": result})
+        return None
+
+    def on_initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Announce the capabilities of the server."""
+        return {
+            "capabilities": {
+                "textDocumentSync": {"openClose": True, "change": SYNC_INCREMENTAL},
+                "completionProvider": {"triggerCharacters": ['"']},
+                "hoverProvider": True,
+            },
+            "serverInfo": {"name": "deck_server"},
+        }
+
+    def on_shutdown(self, params: Dict[str, Any]) -> None:
+        """Prepare for exit."""
+        self.shutdown = True
+
+    def on_textDocument_didOpen(self, params: Dict[str, Any]) -> None:
+        """Start tracking a document and validate it."""
+        item = params["textDocument"]
+        document = DeckDocument(item["uri"], item["text"])
+        self.documents[item["uri"]] = document
+        self.publish(document)
+
+    def on_textDocument_didChange(self, params: Dict[str, Any]) -> None:
+        """Apply edits to a document and validate the changed blocks."""
+        document = self.documents.get(params["textDocument"]["uri"])
+        if document is None:
+            return
+        for change in params["contentChanges"]:
+            document.apply_change(change)
+        self.publish(document)
+
+    def on_textDocument_didClose(self, params: Dict[str, Any]) -> None:
+        """Stop tracking a document and clear its diagnostics."""
+        uri = params["textDocument"]["uri"]
+        self.documents.pop(uri, None)
+        self.send(
+            {
+                "method": "textDocument/publishDiagnostics",
+                "params": {"uri": uri, "diagnostics": []},
+            }
+        )
+
+    def on_textDocument_completion(
+        self, params: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Complete tag values."""
+        document = self.documents.get(params["textDocument"]["uri"])
+        return document.completions(params["position"]) if document else []
+
+    def on_textDocument_hover(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Preview the rendered note under the cursor."""
+        document = self.documents.get(params["textDocument"]["uri"])
+        return document.hover(params["position"]) if document else None
+
+    def run(self) -> int:
+        """
+        Serve until the client exits or closes the stream.
+
+        Returns:
+            Exit code
+        """
+        while True:
+            message = self.read_message()
+            if message is None:
+                return 0 if self.shutdown else 1
+            code = self.handle(message)
+            if code is not None:
+                return code
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 after a clean shutdown, 1 otherwise)
+    """
+    return DeckServer(sys.stdin.buffer, sys.stdout.buffer).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+deck_writer.py.
+
+Batched writing of notes to deck files (decks/<level>/<topic>.toml).
+Notes are buffered and appended as [[notes]] blocks once the buffer is full, so
+importers can write any number of notes with constant memory. Missing deck files are
+created with a deck header named after the deck schema (see deck_schema.py); existing
+ones are appended to, and notes only name their model when it differs from the file's
+default model.
+
+Used by import_apkg.py and import_table.py.
+"""
+import os
+import sys
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import tomli_w
+
+from deck_schema import get_schema
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# Number of buffered notes, over all deck files, that triggers a write
+DEFAULT_BATCH_SIZE = 1000
+
+
+def deck_header(level: str, topic: str, model: Optional[str] = None) -> str:
+    """
+    Return the header of a new deck file.
+
+    Args:
+        level: Level of the deck file
+        topic: Topic of the deck file
+        model: Default model of its notes (defaults to the schema's default model)
+
+    Returns:
+        TOML text with the deck name and default model
+    """
+    schema = get_schema()
+    name = schema.deck_name(level, topic)
+    return tomli_w.dumps({"deck": name, "model": model or schema.default_model})
+
+
+def read_existing(path: str) -> Tuple[str, Set[Any]]:
+    """
+    Read the default model and note_ids of a deck file.
+
+    Args:
+        path: Path to the deck file
+
+    Returns:
+        Tuple of (default model, note_ids); the schema's default model and an empty
+        set if the file does not exist
+
+    Raises:
+        ValueError: If the file exists but cannot be parsed
+    """
+    default_model = get_schema().default_model
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except FileNotFoundError:
+        return default_model, set()
+    except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        raise ValueError(f"Failed to parse file {path}: {str(e)}")
+    note_ids = {note["note_id"] for note in data.get("notes", []) if "note_id" in note}
+    return data.get("model", default_model), note_ids
+
+
+def format_notes(notes: List[Dict[str, Any]]) -> str:
+    """
+    Format notes as [[notes]] blocks.
+
+    Args:
+        notes: Notes as [[notes]] entries
+
+    Returns:
+        TOML text
+    """
+    return tomli_w.dumps({"notes": notes})
+
+
+class DeckWriter:
+    """
+    Buffered writer for the notes of many deck files.
+
+    Args:
+        decks_dir: Root directory containing one subdirectory per level
+        batch_size: Number of buffered notes that triggers a write
+        dry_run: If True, count notes without writing anything
+    """
+
+    def __init__(
+        self,
+        decks_dir: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        dry_run: bool = False,
+    ):
+        """Start with empty buffers; nothing is read or written yet."""
+        self.decks_dir = decks_dir
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.counts: Dict[str, int] = {}
+        self.created: List[str] = []
+        self._models: Dict[str, str] = {}
+        self._buffers: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._buffered = 0
+
+    def path(self, level: str, topic: str) -> str:
+        """
+        Return the deck file of a level and topic.
+
+        Args:
+            level: Level of the deck file
+            topic: Topic of the deck file
+
+        Returns:
+            Path of the deck file
+        """
+        return os.path.join(self.decks_dir, level, f"{topic}.toml")
+
+    def add(self, level: str, topic: str, note: Dict[str, Any]) -> None:
+        """
+        Queue a note for a deck file, writing all buffers once the batch is full.
+
+        Args:
+            level: Level of the deck file
+            topic: Topic of the deck file
+            note: Note as a [[notes]] entry; without a 'model' it gets the default
+                model of the deck schema
+        """
+        if "model" not in note:
+            note = dict(note, model=get_schema().default_model)
+        self._buffers.setdefault((level, topic), []).append(note)
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Append all buffered notes to their deck files.
+
+        Raises:
+            ValueError: If an existing deck file cannot be parsed
+        """
+        for (level, topic), notes in self._buffers.items():
+            path = self.path(level, topic)
+            if path not in self.counts and not os.path.exists(path):
+                self.created.append(path)
+            self.counts[path] = self.counts.get(path, 0) + len(notes)
+            if self.dry_run:
+                continue
+
+            if path not in self._models:
+                self._models[path] = read_existing(path)[0]
+            default_model = self._models[path]
+            notes = [
+                {
+                    key: value
+                    for key, value in note.items()
+                    if key != "model" or value != default_model
+                }
+                for note in notes
+            ]
+
+            # Separate the new blocks from the existing content by a blank line
+            text = format_notes(notes)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    f.seek(0, os.SEEK_END)
+                    if f.tell():
+                        f.seek(-1, os.SEEK_END)
+                        text = ("\n" if f.read(1) == b"\n" else "\n\n") + text
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                text = deck_header(level, topic) + "\n" + text
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(text)
+        self._buffers = {}
+        self._buffered = 0
+
+    def close(self) -> Dict[str, int]:
+        """
+        Write the remaining notes.
+
+        Returns:
+            Number of notes written per deck file
+        """
+        self.flush()
+        return self.counts
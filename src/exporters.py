@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+exporters.py.
+
+Streaming exporters for formats other than .apkg.
+generate.py --export loads and renders every note once, exactly as for a package
+build, and hands it to one writer per requested format:
+- anki-text  Anki's plain-text import format (tab-separated, with file headers)
+- csv        one row per note with the Markdown source of its fields
+- jsonl      one JSON object per note with its Markdown source and rendered fields
+- html       a static, searchable card browser
+
+Writers stream their output, so memory use does not depend on the size of the corpus.
+
+Used by generate.py through the --export option.
+"""
+import csv
+import html
+import json
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Type
+
+from render import render_markdown
+
+# Directory, relative to the output directory, holding the exports
+EXPORT_DIRNAME = "export"
+
+# Matches a cloze deletion and captures its answer
+CLOZE_RE = re.compile(r"\{\{c\d+::(.*?)(?:::[^}]*)?\}\}", re.DOTALL)
+
+
+class ExportRecord(NamedTuple):
+    """One note, as loaded from its deck file and as rendered for the package."""
+
+    deck: str
+    level: str
+    topic: str
+    model: str
+    model_name: str
+    guid: str
+    tags: List[str]
+    front: str
+    back: str
+    rendered: List[str]
+
+
+class Exporter:
+    """
+    Base class of the exporters; writes one output file.
+
+    Args:
+        path: Output file
+        stylesheet: Card stylesheet, for formats that display cards
+    """
+
+    extension = ""
+
+    def __init__(self, path: str, stylesheet: str = ""):
+        """Open the output file and write its beginning."""
+        self.path = path
+        self.stylesheet = stylesheet
+        self.count = 0
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self.start()
+
+    def start(self) -> None:
+        """Write the beginning of the file."""
+
+    def write_record(self, record: ExportRecord) -> None:
+        """Write one note."""
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        """Write the end of the file."""
+
+    def write(self, record: ExportRecord) -> None:
+        """
+        Write one note.
+
+        Args:
+            record: Note to write
+        """
+        self.write_record(record)
+        self.count += 1
+
+    def close(self) -> None:
+        """Finish and close the file."""
+        self.finish()
+        self._file.close()
+
+
+class AnkiTextExporter(Exporter):
+    """
+    Anki's plain-text import format.
+
+    The file headers tell Anki the separator, that fields are HTML, and which
+    columns hold the GUID, note type, deck and tags, so File > Import needs no
+    manual column mapping and updates notes by GUID.
+    """
+
+    extension = "txt"
+
+    def start(self) -> None:
+        """Write the file headers."""
+        self._file.write(
+            "#separator:tab\n#html:true\n#guid column:1\n#notetype column:2\n"
+            "#deck column:3\n#tags column:6\n"
+        )
+        self._writer = csv.writer(self._file, delimiter="\t", lineterminator="\n")
+
+    def write_record(self, record: ExportRecord) -> None:
+        """Write one note with its rendered fields."""
+        fields = (record.rendered + ["", ""])[:2]
+        self._writer.writerow(
+            [
+                record.guid,
+                record.model_name,
+                record.deck,
+                *fields,
+                " ".join(record.tags),
+            ]
+        )
+
+
+class CsvExporter(Exporter):
+    """One row per note with the Markdown source of its fields."""
+
+    extension = "csv"
+    columns = ["level", "topic", "deck", "model", "guid", "tags", "front", "back"]
+
+    def start(self) -> None:
+        """Write the header row."""
+        self._writer = csv.writer(self._file, lineterminator="\n")
+        self._writer.writerow(self.columns)
+
+    def write_record(self, record: ExportRecord) -> None:
+        """Write one note."""
+        self._writer.writerow(
+            [
+                record.level,
+                record.topic,
+                record.deck,
+                record.model,
+                record.guid,
+                " ".join(record.tags),
+                record.front,
+                record.back,
+            ]
+        )
+
+
+class JsonlExporter(Exporter):
+    """One JSON object per line with the Markdown source and rendered fields."""
+
+    extension = "jsonl"
+
+    def write_record(self, record: ExportRecord) -> None:
+        """Write one note."""
+        entry = {
+            "guid": record.guid,
+            "deck": record.deck,
+            "level": record.level,
+            "topic": record.topic,
+            "model": record.model,
+            "tags": record.tags,
+            "fields": {"front": record.front, "back": record.back},
+            "rendered": record.rendered,
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class HtmlExporter(Exporter):
+    """A single static page listing every card, with a search box."""
+
+    extension = "html"
+
+    PAGE_STYLE = (
+        "body{font-family:sans-serif;max-width:60em;margin:0 auto;padding:1em}"
+        "#search{width:100%;font-size:1.1em;padding:.4em;margin-bottom:1em}"
+        "article{border:1px solid #ccc;border-radius:6px;margin:.6em 0;padding:.6em}"
+        "article header{font-size:.8em;color:#666}"
+        ".back{border-top:1px dashed #ccc;margin-top:.5em;padding-top:.5em}"
+        ".cloze{font-weight:bold;color:#0645ad}"
+    )
+
+    SCRIPT = (
+        'const search=document.getElementById("search");'
+        'search.addEventListener("input",()=>{'
+        "const text=search.value.toLowerCase();"
+        'for(const card of document.querySelectorAll("article")){'
+        "card.hidden=text!==''&&!card.textContent.toLowerCase().includes(text);}"
+        'for(const section of document.querySelectorAll("section")){'
+        'section.hidden=!section.querySelector("article:not([hidden])");}});'
+    )
+
+    def start(self) -> None:
+        """Write the page head and search box."""
+        self._deck: Optional[str] = None
+        self._file.write(
+            '<!DOCTYPE html>\n<html lang="it">\n<head>\n<meta charset="utf-8">\n'
+            "<title>Italiano</title>\n"
+            f"<style>{self.PAGE_STYLE}{self.stylesheet}</style>\n</head>\n<body>\n"
+            '<input id="search" type="search" placeholder="Cerca...">\n'
+        )
+
+    def write_record(self, record: ExportRecord) -> None:
+        """Write one card, opening a new section when the deck changes."""
+        if record.deck != self._deck:
+            if self._deck is not None:
+                self._file.write("</section>\n")
+            self._deck = record.deck
+            self._file.write(f"<section>\n<h2>{html.escape(record.deck)}</h2>\n")
+
+        if record.model == "cloze":
+            front = CLOZE_RE.sub(r'<span class="cloze">\1</span>', record.rendered[0])
+            back = render_markdown(record.back) if record.back else ""
+        else:
+            front = record.rendered[0]
+            back = record.rendered[1] if len(record.rendered) > 1 else ""
+        tags = html.escape(" ".join(record.tags))
+        self._file.write(
+            f'<article class="card"><header>{tags}</header>'
+            f'<div class="front">{front}</div>'
+            f'<div class="back">{back}</div></article>\n'
+        )
+
+    def finish(self) -> None:
+        """Close the last section and the page."""
+        if self._deck is not None:
+            self._file.write("</section>\n")
+        self._file.write(f"<script>{self.SCRIPT}</script>\n</body>\n</html>\n")
+
+
+# Exporters by format name
+EXPORTERS: Dict[str, Type[Exporter]] = {
+    "anki-text": AnkiTextExporter,
+    "csv": CsvExporter,
+    "jsonl": JsonlExporter,
+    "html": HtmlExporter,
+}
+
+
+def parse_formats(text: str) -> List[str]:
+    """
+    Parse a comma-separated list of export formats.
+
+    Args:
+        text: Formats, for example 'csv,jsonl'
+
+    Returns:
+        Format names, without duplicates
+
+    Raises:
+        ValueError: If a format is unknown
+    """
+    formats: List[str] = []
+    for name in (part.strip() for part in text.split(",")):
+        if name not in EXPORTERS:
+            known = ", ".join(EXPORTERS)
+            raise ValueError(f"Unknown export format '{name}', expected one of {known}")
+        if name not in formats:
+            formats.append(name)
+    return formats
+
+
+def open_exporters(
+    formats: List[str], out_dir: str, basename: str, stylesheet: str = ""
+) -> List[Exporter]:
+    """
+    Open one exporter per format.
+
+    Args:
+        formats: Format names
+        out_dir: Directory the files are written to
+        basename: File name without extension
+        stylesheet: Card stylesheet, for formats that display cards
+
+    Returns:
+        Open exporters
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    return [
+        EXPORTERS[name](
+            os.path.join(out_dir, f"{basename}.{EXPORTERS[name].extension}"),
+            stylesheet,
+        )
+        for name in formats
+    ]
@@ -3,7 +3,8 @@
 fix_tags.py.
 
 Fixes tags in TOML deck files to ensure they follow the project's schema requirements.
-For each note, sets the tags to [level, topic], where:
+For each note, sets the tags to the leading tags of the deck schema (see
+deck_schema.py), [level, topic] with the shipped schema, where:
 - level is the directory name (a1, a2, etc.)
 - topic is the filename (without extension)
 
@@ -15,11 +16,13 @@ Usage:
   python fix_tags.py --path decks/a1/alfabeto.toml  # Fix a specific TOML file
 """
 import argparse
-import glob
 import os
 import sys
 from typing import List, Optional
 
+import deck_catalog
+from deck_schema import get_schema
+
 # Import appropriate TOML library based on Python version
 if sys.version_info >= (3, 11):
     import tomllib
@@ -50,9 +53,9 @@ def fix_tags_in_file(path: str, dry_run: bool = False) -> int:
                 data = tomllib.load(f)
 
             fixed_count = 0
+            new_tags = get_schema().tags(level, topic)
             for note in data.get("notes", []):
                 old_tags = note.get("tags", [])
-                new_tags = [level, topic]
 
                 if old_tags != new_tags:
                     if dry_run:
@@ -99,21 +102,7 @@ def find_deck_files(
     Returns:
         List of file paths to fix
     """
-    if path:
-        if os.path.isfile(path) and path.endswith(".toml"):
-            return [path]
-        elif os.path.isdir(path):
-            return glob.glob(os.path.join(path, "*.toml"))
-        else:
-            return glob.glob(os.path.join(path, "**/*.toml"), recursive=True)
-    elif levels:
-        files = []
-        for level in levels:
-            level_files = glob.glob(f"decks/{level}/*.toml")
-            files.extend(level_files)
-        return files
-    else:
-        return glob.glob("decks/*/*.toml")
+    return deck_catalog.find_deck_files(path, levels)
 
 
 def main() -> int:
@@ -3,7 +3,7 @@
 generate.py.
 
 Builds Anki .apkg decks from TOML definitions under decks/<level>/*.toml.
-Supports per-file, per-level, uber (all-in-one), and chunked modes.
+Supports per-file, per-level, uber (all-in-one), chunked, and multi-deck modes.
 Embeds repo VERSION into deck titles and filenames.
 Supports Markdown formatting in card content.
 Supports automatic discovery of deck files with the --auto-discover option.
@@ -13,26 +13,41 @@ Usage examples:
   python generate.py --all                          # per-file on all levels
   python generate.py --mode per-level               # one deck per level
   python generate.py --mode uber                    # one big deck with all cards
+  python generate.py --mode uber --dedup            # ... without duplicate notes
+  python generate.py --mode uber --incremental      # ... rendering only changed notes
+  python generate.py --mode multi                   # one package, one subdeck per topic
   python generate.py --mode chunk --chunk-size 10   # decks of 10 files each
+  python generate.py --mode chunk --chunk-notes 200 # decks of about 200 notes each
+  python generate.py --mode chunk --chunk-cards 300 # decks of about 300 cards each
   python generate.py --mode per-file --level a2     # per-file on a2
   python generate.py --auto-discover                # auto-discover all deck files
   python generate.py --auto-discover --mode uber    # auto-discover and build one big deck
+  python generate.py --select "tag:verbi_* AND level:a2" --name verbi-a2  # custom deck
+  python generate.py --all --shard 2/4              # build the second of four shards
+  python generate.py --all --collection collection.anki2  # upsert into a local collection
+  python generate.py --all --export csv,jsonl,html  # export notes in other formats
+  python generate.py --mode uber --package-format latest  # smaller, Anki 2.1.50+
 """
 import argparse
-import glob
 import hashlib
 import os
+import re
 import sys
-from typing import Any, Dict, List, Optional
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 import genanki
-import markdown  # type: ignore
 
-# Import appropriate TOML library based on Python version
-if sys.version_info >= (3, 11):
-    import tomllib
-else:
-    import tomli as tomllib
+import apkg
+import build_manifest
+import exporters
+import incremental
+import render
+from collection import describe_stats, upsert_decks
+from deck_catalog import DeckSource, get_catalog
+from deck_schema import get_schema
+from media import MediaStore, install_media, media_fingerprint, media_markup
+from note_index import get_note_index
 
 # Ensure script runs from its own directory
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -42,6 +57,9 @@ os.chdir(SCRIPT_DIR)
 # The decks directory is in the parent directory (root)
 DECKS_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "decks")
 
+# Generated packages are written to the output directory next to this script
+OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
+
 
 def read_version() -> str:
     """
@@ -64,6 +82,25 @@ VERSION = read_version()
 # Global variable to store the current mode
 CURRENT_MODE = "per-file"  # Default mode
 
+# Modes that combine several deck files into one package
+AGGREGATE_MODES = ("per-level", "uber", "chunk", "select")
+
+# Allowed names of custom decks built with --select
+CUSTOM_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*$")
+
+# Global flag: drop duplicate notes when building aggregate packages
+DEDUP_NOTES = False
+
+# Global flag: reuse the notes of previous aggregate packages (see incremental.py)
+INCREMENTAL_BUILD = False
+
+# Package layout (see apkg.py) and zstd level of the latest layout
+PACKAGE_FORMAT = apkg.PACKAGE_FORMATS[0]
+ZSTD_LEVEL = apkg.DEFAULT_ZSTD_LEVEL
+
+# Collapses runs of whitespace when normalizing rendered fields
+WHITESPACE_RE = re.compile(r"\s+")
+
 
 def stable_id(name: str) -> int:
     """
@@ -84,10 +121,27 @@ def stable_id(name: str) -> int:
     return int(digest[:10], 16)
 
 
+# Card stylesheet shared by all models, loaded once from styles.css
+CARD_CSS, CARD_CSS_HASH = render.load_stylesheet(render.STYLESHEET_PATH)
+
+
+def model_id(name: str) -> int:
+    """
+    Generate a stable model ID that also identifies the card stylesheet.
+
+    Args:
+        name: Model name
+
+    Returns:
+        Integer ID derived from the model name and the stylesheet hash
+    """
+    return stable_id(f"{name}-{CARD_CSS_HASH}" if CARD_CSS_HASH else name)
+
+
 # Shared models
 MODELS = {
     "basic": genanki.Model(
-        stable_id("basic-model"),
+        model_id("basic-model"),
         "Basic Model",
         fields=[{"name": "Front"}, {"name": "Back"}],
         templates=[
@@ -97,9 +151,10 @@ MODELS = {
                 "afmt": '{{FrontSide}}<hr id="answer">{{Back}}',
             }
         ],
+        css=CARD_CSS,
     ),
     "cloze": genanki.Model(
-        stable_id("cloze-model"),
+        model_id("cloze-model"),
         "Cloze Model",
         fields=[{"name": "Text"}],
         templates=[
@@ -109,83 +164,87 @@ MODELS = {
                 "afmt": "{{cloze:Text}}",
             }
         ],
+        css=CARD_CSS,
         model_type=genanki.Model.CLOZE,
     ),
 }
 
+# Shared models by model ID, used to restore notes from previous packages
+MODELS_BY_ID = {model.model_id: model for model in MODELS.values()}
+
+# Code that determines how notes are rendered; editing it invalidates incremental indexes
+RENDER_CODE = [
+    os.path.join(SCRIPT_DIR, name) for name in ("generate.py", "render.py", "media.py")
+]
 
-def load_deck_file(file_path: str) -> Dict[str, Any]:
+# Content-addressed media shared by the packages of all modes
+MEDIA_STORE = MediaStore(OUTPUT_DIR)
+
+
+def iter_cards(source: DeckSource) -> Iterator[Dict[str, Any]]:
     """
-    Load a deck file (TOML).
+    Read the cards of a deck file one at a time.
+
+    Conjugation tables in the file are expanded into cards after the hand-written
+    notes (see conjugations.py). Notes are checked against the deck schema (see
+    deck_schema.py) and problems, such as malformed cloze deletions that Anki would
+    show as they are, are reported as warnings.
 
     Args:
-        file_path: Path to the deck file
+        source: Deck file to read
 
-    Returns:
-        Dictionary containing the deck data
+    Yields:
+        Card dictionaries, in file order
 
     Raises:
-        ValueError: If the file cannot be read or parsed
+        ValueError: If the file cannot be read or parsed, its conjugation tables
+            are malformed or the deck schema is malformed
     """
-    try:
-        if file_path.endswith(".toml"):
-            with open(file_path, "rb") as f:
-                data = tomllib.load(f)
-
-                # Convert TOML structure to match internal structure
-                result: Dict[str, List[Dict[str, Any]]] = {"cards": []}
-
-                # Extract deck and model information
-                model_type = data.get("model", "basic")
-
-                # Process notes
-                for note in data.get("notes", []):
-                    card = {
-                        "model": note.get("model", model_type),
-                        "tags": note.get("tags", []),
-                        "note_id": note.get("note_id", None),
-                    }
-
-                    # Handle fields based on model type
-                    fields = note.get("fields", [])
-                    if card["model"] == "basic" and len(fields) >= 2:
-                        card["front"] = fields[0]
-                        card["back"] = fields[1]
-                    elif card["model"] == "cloze" and len(fields) >= 1:
-                        card["front"] = fields[0]
-                        card["back"] = note.get("back", "")
-
-                    result["cards"].append(card)
-
-                return result
-        else:
-            raise ValueError(f"Unsupported file format: {file_path}")
-    except UnicodeDecodeError as e:
-        raise ValueError(f"Failed to parse file {file_path}: {str(e)}")
-    except FileNotFoundError:
-        raise ValueError(f"File not found: {file_path}")
-    except IOError as e:
-        raise ValueError(f"Error reading {file_path}: {str(e)}")
+    schema = get_schema()
+    validate = schema.validator(source.folder, source.topic)
+    for position, note in enumerate(source.iter_notes(), 1):
+        for message in validate(note, schema.default_model):
+            print(f"Warning: {source.path}: note {position}: {message}")
+        card = {
+            "model": note["model"],
+            "tags": note.get("tags", []),
+            "note_id": note.get("note_id", None),
+        }
+        # Notes are identified by level, topic and note_id, so editing a note's
+        # fields updates it in Anki instead of creating a new one
+        if card["note_id"] is not None:
+            card["guid"] = genanki.guid_for(
+                source.folder, source.topic, card["note_id"]
+            )
+        if note.get("media"):
+            card["media"] = list(note["media"])
+
+        # Handle fields based on model type
+        fields = note.get("fields", [])
+        if card["model"] == "basic" and len(fields) >= 2:
+            card["front"] = fields[0]
+            card["back"] = fields[1]
+        elif card["model"] == "cloze" and len(fields) >= 1:
+            card["front"] = fields[0]
+            card["back"] = note.get("back", "")
 
+        yield card
 
-def build_deck(level: str, topic: str, cards: List[Dict[str, Any]]) -> None:
+
+def iter_notes(cards: Iterable[Dict[str, Any]]) -> Iterator[genanki.Note]:
     """
-    Build and write one Anki deck.
+    Render cards into Anki notes one at a time.
 
     Args:
-        level: Level tag (a1, a2, etc.)
-        topic: Topic name
-        cards: List of card dictionaries
+        cards: Iterable of card dictionaries
+
+    Yields:
+        Notes with Markdown rendered to HTML and their media appended to the last
+        field
 
     Raises:
-        ValueError: If a card has an unknown model
+        ValueError: If a card has an unknown model or a missing media file
     """
-    deck_name = f"Italiano::{level}/{topic}"
-    deck_id = stable_id(deck_name)
-    # Don't include version in deck title to ensure Anki treats it as the same deck across versions
-    deck_title = deck_name
-    deck = genanki.Deck(deck_id, deck_title)
-
     for card in cards:
         model_key = card.get("model", "")  # Default to empty string if model is missing
         model = MODELS.get(model_key)
@@ -201,14 +260,11 @@ def build_deck(level: str, topic: str, cards: List[Dict[str, Any]]) -> None:
         if not back:
             raise ValueError(f"Missing 'back' field in card: {card}")
 
-        # Convert Markdown to HTML for front and back fields
-        # Use nl2br extension to convert newlines to HTML break tags
-        # This ensures that line breaks in the text (e.g., "Meaning: one\nExample: Ho uno libro")
-        # are properly rendered as visual line breaks in the HTML output
+        # Convert Markdown to compact HTML for front and back fields
         if front:
-            front = markdown.markdown(front, extensions=["nl2br"])
+            front = render.render_markdown(front)
         if back:
-            back = markdown.markdown(back, extensions=["nl2br"])
+            back = render.render_markdown(back)
 
         if model_key == "basic":
             fields = [front, back]
@@ -217,76 +273,291 @@ def build_deck(level: str, topic: str, cards: List[Dict[str, Any]]) -> None:
             # but we still validate both front and back fields exist
             fields = [front]
 
-        note = genanki.Note(model=model, fields=fields, tags=card.get("tags", []))
-        deck.add_note(note)
+        # Reference media by its stored name, so every package shares the same files
+        if card.get("media"):
+            names = [MEDIA_STORE.add(path) for path in card["media"]]
+            fields[-1] += "<br>" + " ".join(media_markup(name) for name in names)
 
-    out_dir = os.path.join(SCRIPT_DIR, "output")
-    os.makedirs(out_dir, exist_ok=True)
-    # Use different filename formats based on the mode
-    if CURRENT_MODE == "per-level" or CURRENT_MODE == "uber":
-        # For per-level and uber modes, use a simple filename without topic
-        filename = f"italian-{level}-v{VERSION}.apkg"
-    else:
-        # For per-file and chunk modes, include the topic to avoid overwriting
-        filename = f"italian-{level}-{topic}-v{VERSION}.apkg"
+        yield genanki.Note(
+            model=model, fields=fields, tags=card.get("tags", []), guid=card.get("guid")
+        )
 
-    path = os.path.join(out_dir, filename)
+
+def build_notes(cards: List[Dict[str, Any]]) -> List[genanki.Note]:
+    """
+    Render cards into Anki notes.
+
+    Args:
+        cards: List of card dictionaries
+
+    Returns:
+        List of notes with Markdown rendered to HTML
+
+    Raises:
+        ValueError: If a card has an unknown model
+    """
+    return list(iter_notes(cards))
+
+
+def note_fingerprint(note: genanki.Note) -> str:
+    """
+    Hash a note's model and normalized rendered fields.
+
+    Fields are NFC-normalized and whitespace runs are collapsed, so notes that
+    only differ in spacing produce the same fingerprint.
+
+    Args:
+        note: Rendered note
+
+    Returns:
+        Hex digest identifying the note's content
+    """
+    digest = hashlib.sha256(str(note.model.model_id).encode("utf-8"))
+    for field in note.fields:
+        normalized = WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", field)).strip()
+        digest.update(b"\x1f")
+        digest.update(normalized.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def dedup_notes(
+    notes: Iterable[genanki.Note], stats: Dict[str, int]
+) -> Iterator[genanki.Note]:
+    """
+    Drop notes whose model and rendered fields were already seen.
+
+    The first occurrence is kept and receives the tags of every later duplicate.
+
+    Args:
+        notes: Iterable of rendered notes
+        stats: Dictionary whose 'removed' count is incremented for each dropped note
+
+    Yields:
+        Unique notes, in their original order
+    """
+    seen: Dict[str, genanki.Note] = {}
+    stats.setdefault("removed", 0)
+    for note in notes:
+        key = note_fingerprint(note)
+        kept = seen.get(key)
+        if kept is None:
+            seen[key] = note
+            yield note
+            continue
+        for tag in note.tags:
+            if tag not in kept.tags:
+                kept.tags.append(tag)
+        stats["removed"] += 1
+
+
+def write_package(
+    decks: List[genanki.Deck],
+    filename: str,
+    sources: Optional[List[str]] = None,
+    timestamp: Optional[int] = None,
+) -> Optional[str]:
+    """
+    Write decks into one reproducible .apkg file in the output directory.
+
+    The package is stored under output/store/<sha256>.apkg and filename is linked to
+    it, so rebuilding unchanged sources yields the same bytes and the same store entry.
+    Media referenced by the notes is read from the media store.
+
+    Args:
+        decks: Decks to include in the package
+        filename: Name of the package file
+        sources: Deck files the package is built from, used to pick its timestamp
+        timestamp: Note timestamp already chosen for the sources, if any
+
+    Returns:
+        Path of the written package, or None if writing failed
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    path = os.path.join(OUTPUT_DIR, filename)
+    temp_path = f"{path}.tmp"
 
     try:
-        genanki.Package(deck).write_to_file(path)
+        if timestamp is None:
+            timestamp = apkg.source_timestamp(sources or [])
+        media = MEDIA_STORE.referenced(decks)
+        apkg.write_reproducible_package(
+            genanki.Package(decks),
+            temp_path,
+            timestamp,
+            media,
+            PACKAGE_FORMAT,
+            ZSTD_LEVEL,
+        )
+        path = apkg.store_package(temp_path, OUTPUT_DIR, filename)
         print(f"Wrote {path}")
+        return path
     except Exception as e:
         print(f"Error writing deck to {path}: {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
 
 
-def get_deck_files(directory: str) -> List[str]:
+def make_deck(level: str, topic: str, cards: List[Dict[str, Any]]) -> genanki.Deck:
     """
-    Get all deck files (TOML) in a directory.
+    Build one Anki deck in memory.
 
     Args:
-        directory: Directory path
+        level: Level tag (a1, a2, etc.)
+        topic: Topic name
+        cards: List of card dictionaries
 
     Returns:
-        List of filenames (without path)
+        Deck holding the rendered notes
+
+    Raises:
+        ValueError: If a card has an unknown model
     """
-    try:
-        return [f for f in sorted(os.listdir(directory)) if f.endswith(".toml")]
-    except FileNotFoundError:
-        print(f"Directory not found: {directory}")
-        return []
-    except PermissionError:
-        print(f"Permission denied when accessing directory: {directory}")
-        return []
+    return make_deck_from_notes(level, topic, iter_notes(cards))
+
+
+def make_deck_from_notes(
+    level: str, topic: str, notes: Iterable[genanki.Note]
+) -> genanki.Deck:
+    """
+    Build one Anki deck in memory from rendered notes.
+
+    Args:
+        level: Level tag (a1, a2, etc.)
+        topic: Topic name
+        notes: Rendered notes
+
+    Returns:
+        Deck holding the notes, without duplicates if --dedup applies
+    """
+    deck_name = f"Italiano::{level}/{topic}"
+    deck_id = stable_id(deck_name)
+    # Don't include version in deck title to ensure Anki treats it as the same deck across versions
+    deck_title = deck_name
+    deck = genanki.Deck(deck_id, deck_title)
+
+    stats: Dict[str, int] = {}
+    if DEDUP_NOTES and CURRENT_MODE in AGGREGATE_MODES:
+        notes = dedup_notes(notes, stats)
+    for note in notes:
+        deck.add_note(note)
+    if stats.get("removed"):
+        print(f"Removed {stats['removed']} duplicate notes from {deck_name}")
+    return deck
+
+
+def build_deck(
+    level: str,
+    topic: str,
+    cards: List[Dict[str, Any]],
+    sources: Optional[List[str]] = None,
+) -> Optional[str]:
+    """
+    Build and write one Anki deck.
+
+    Args:
+        level: Level tag (a1, a2, etc.)
+        topic: Topic name
+        cards: List of card dictionaries
+        sources: Deck files the cards were loaded from
+
+    Returns:
+        Path of the written package, or None if writing failed
+
+    Raises:
+        ValueError: If a card has an unknown model
+    """
+    deck = make_deck(level, topic, cards)
+    return write_package([deck], package_filename(level, topic), sources)
+
+
+def package_filename(level: str, topic: str) -> str:
+    """
+    Name the package of one deck according to the current mode.
+
+    Args:
+        level: Level tag (a1, a2, etc.)
+        topic: Topic name
+
+    Returns:
+        Versioned package file name
+    """
+    # Use different filename formats based on the mode
+    if CURRENT_MODE == "per-level" or CURRENT_MODE == "uber":
+        # For per-level and uber modes, use a simple filename without topic
+        return f"italian-{level}-v{VERSION}.apkg"
+    # For per-file and chunk modes, include the topic to avoid overwriting
+    return f"italian-{level}-{topic}-v{VERSION}.apkg"
+
+
+def make_multi_decks(topics: List[Dict[str, Any]]) -> List[genanki.Deck]:
+    """
+    Build one Italiano::<level>::<topic> deck per topic in memory.
+
+    Args:
+        topics: Dictionaries with 'level', 'topic' and 'cards' keys
 
+    Returns:
+        One deck per topic
 
-def discover_deck_files() -> Dict[str, List[str]]:
+    Raises:
+        ValueError: If a card has an unknown model
+    """
+    decks = []
+    for entry in topics:
+        deck_name = f"Italiano::{entry['level']}::{entry['topic']}"
+        deck = genanki.Deck(stable_id(deck_name), deck_name)
+        for note in build_notes(entry["cards"]):
+            deck.add_note(note)
+        decks.append(deck)
+    return decks
+
+
+def build_multi_deck(
+    scope: str, topics: List[Dict[str, Any]], sources: Optional[List[str]] = None
+) -> Optional[str]:
+    """
+    Build and write one package holding every topic as its own subdeck.
+
+    Subdecks are named Italiano::<level>::<topic> and get their IDs from stable_id,
+    so re-importing a newer package updates the same decks. All subdecks share the
+    models and the collection of a single package.
+
+    Args:
+        scope: Level name, or 'all' when several levels are included
+        topics: Dictionaries with 'level', 'topic' and 'cards' keys
+        sources: Deck files the topics were loaded from
+
+    Returns:
+        Path of the written package, or None if writing failed
+
+    Raises:
+        ValueError: If a card has an unknown model
+    """
+    decks = make_multi_decks(topics)
+    if not decks:
+        return None
+    return write_package(decks, f"italian-{scope}-multi-v{VERSION}.apkg", sources)
+
+
+def discover_deck_files(
+    levels: Optional[List[str]] = None,
+) -> Dict[str, List[DeckSource]]:
     """
     Automatically discover all TOML deck files recursively.
 
+    Discovery goes through the shared deck catalog, so only the requested levels are
+    listed and unchanged files are not read again.
+
+    Args:
+        levels: Optional list of levels to discover; all levels if omitted
+
     Returns:
-        Dictionary mapping level names to lists of file paths
-    """
-    # Get all TOML files in the decks directory and its subdirectories
-    all_files = glob.glob(os.path.join(DECKS_DIR, "**/*.toml"), recursive=True)
-
-    # Group files by level
-    levels_dict: Dict[str, List[str]] = {}
-
-    for file_path in sorted(all_files):
-        # Extract level from path (e.g., "/path/to/decks/a1/file.toml" -> "a1")
-        # Get the relative path from DECKS_DIR
-        rel_path = os.path.relpath(file_path, DECKS_DIR)
-        parts = rel_path.split(os.sep)
-        if len(parts) >= 1:  # Ensure there's at least one part (the level)
-            level = parts[0]  # "a1/file.toml" -> parts = ["a1", "file.toml"]
-            if level:  # Ensure level is not empty
-                if level not in levels_dict:
-                    levels_dict[level] = []
-                levels_dict[level].append(file_path)
-            else:
-                print(f"Warning: Skipping file with invalid level in path: {file_path}")
-        else:
-            print(f"Warning: Skipping file with unexpected path structure: {file_path}")
+        Dictionary mapping level names to lists of deck sources
+    """
+    catalog = get_catalog(DECKS_DIR)
+    levels_dict = catalog.sources(levels)
+    catalog.save()
 
     # Log discovered decks for debugging
     for level, files in levels_dict.items():
@@ -295,168 +566,666 @@ def discover_deck_files() -> Dict[str, List[str]]:
     return levels_dict
 
 
-def process_per_file_mode(
-    levels: List[str], discovered_files: Optional[Dict[str, List[str]]] = None
-) -> None:
+def collect_level_files(
+    levels: List[str], discovered_files: Optional[Dict[str, List[DeckSource]]] = None
+) -> Dict[str, List[DeckSource]]:
     """
-    Process decks in per-file mode (one deck per TOML file).
+    Collect the deck files of each level, without parsing them.
 
     Args:
-        levels: List of levels to process
-        discovered_files: Optional dictionary mapping level names to lists of file paths
+        levels: List of levels to collect
+        discovered_files: Optional dictionary mapping level names to deck sources
+
+    Returns:
+        Dictionary mapping level names to lists of deck sources
     """
+    catalog = get_catalog(DECKS_DIR)
+    files: Dict[str, List[DeckSource]] = {}
     for lvl in levels:
         if discovered_files and lvl in discovered_files:
             # Use discovered files
-            for file_path in discovered_files[lvl]:
-                topic = os.path.splitext(os.path.basename(file_path))[0]
-                try:
-                    data = load_deck_file(file_path)
-                    cards = data.get("cards", [])
-                    if cards:
-                        build_deck(lvl, topic, cards)
-                except ValueError as e:
-                    print(f"Error processing {file_path}: {str(e)}")
-        else:
-            # Use traditional directory listing
-            lvl_dir = os.path.join(DECKS_DIR, lvl)
-            for fname in get_deck_files(lvl_dir):
-                topic = os.path.splitext(fname)[0]
-                file_path = os.path.join(lvl_dir, fname)
+            files[lvl] = discovered_files[lvl]
+            continue
+        # Use the deck files directly inside the level directory
+        lvl_dir = os.path.join(DECKS_DIR, lvl)
+        if not os.path.isdir(lvl_dir):
+            print(f"Directory not found: {lvl_dir}")
+            files[lvl] = []
+            continue
+        files[lvl] = [DeckSource(entry) for entry in catalog.entries_in(lvl_dir)]
+    catalog.save()
+    return files
+
+
+def make_target(
+    mode: str, level: str, topic: str, items: List[DeckSource]
+) -> Dict[str, Any]:
+    """
+    Describe one package to build.
 
-                try:
-                    data = load_deck_file(file_path)
-                    cards = data.get("cards", [])
-                    if cards:
-                        build_deck(lvl, topic, cards)
-                except ValueError as e:
-                    print(f"Error processing {file_path}: {str(e)}")
+    Args:
+        mode: Build mode
+        level: Level (or 'all') used in the deck and file name
+        topic: Topic used in the deck and file name
+        items: Deck files going into the package
+
+    Returns:
+        Build target dictionary
+    """
+    return {
+        "key": f"{mode}:{level}:{topic}",
+        "mode": mode,
+        "level": level,
+        "topic": topic,
+        "files": items,
+        "notes": sum(item.note_count for item in items),
+        "cards": sum(item.card_count for item in items),
+        "bytes": sum(item.size for item in items),
+    }
+
+
+def plan_targets(
+    mode: str,
+    levels: List[str],
+    discovered_files: Optional[Dict[str, List[DeckSource]]] = None,
+    chunk_size: int = 0,
+    chunk_notes: int = 0,
+    chunk_bytes: int = 0,
+    query: str = "",
+    chunk_cards: int = 0,
+    name: str = "custom",
+) -> List[Dict[str, Any]]:
+    """
+    Plan the packages a build produces, using only deck catalog metadata.
 
+    In select mode, the notes matching query are looked up in the note index and
+    planned as one custom package.
 
-def process_per_level_mode(
-    levels: List[str], discovered_files: Optional[Dict[str, List[str]]] = None
+    Args:
+        mode: Build mode (per-file, per-level, uber, chunk or multi)
+        levels: List of levels to process
+        discovered_files: Optional dictionary mapping level names to deck sources
+        chunk_size: Number of files per deck in chunk mode
+        chunk_notes: Target number of notes per deck in chunk mode (0 to chunk by file count)
+        chunk_bytes: Maximum source bytes per deck in chunk mode (0 for no limit)
+        query: Note query in select mode (see note_index.py)
+        name: Name of the custom deck in select mode
+        chunk_cards: Target number of cards per deck in chunk mode, instead of a note
+            target (0 to chunk by note target or file count)
+
+    Returns:
+        List of build targets in build order
+
+    Raises:
+        ValueError: If the mode is unknown, the chunk settings are invalid or the
+            query is malformed
+    """
+    if mode == "chunk":
+        if max(chunk_size, chunk_notes, chunk_cards, chunk_bytes) <= 0:
+            raise ValueError("Chunk size must be greater than 0")
+        if min(chunk_notes, chunk_cards, chunk_bytes) < 0:
+            raise ValueError(
+                "Chunk note and card targets and byte budget must not be negative"
+            )
+        if chunk_notes > 0 and chunk_cards > 0:
+            raise ValueError("Use either a chunk note target or a card target")
+    elif mode == "select":
+        selection = get_note_index(DECKS_DIR).select(query)
+    elif mode not in ("per-file", "per-level", "uber", "multi"):
+        raise ValueError(f"Unknown mode '{mode}'")
+
+    level_items = collect_level_files(levels, discovered_files)
+
+    targets = []
+    if mode == "uber":
+        items = [item for lvl in levels for item in level_items[lvl]]
+        targets.append(make_target(mode, "all", "all", items))
+    elif mode == "select":
+        items = []
+        for lvl in levels:
+            for item in level_items[lvl]:
+                positions = selection.get(item.path)
+                if positions:
+                    items.append(item.select(positions))
+        if not items:
+            print(f"No notes match '{query}'")
+        targets.append(make_target(mode, "custom", name, items))
+    elif mode == "multi":
+        items = [item for lvl in levels for item in level_items[lvl]]
+        scope = levels[0] if len(levels) == 1 else "all"
+        targets.append(make_target(mode, scope, "multi", items))
+    else:
+        for lvl in levels:
+            items = level_items[lvl]
+            if mode == "per-file":
+                targets.extend(
+                    make_target(mode, lvl, item.topic, [item]) for item in items
+                )
+            elif mode == "per-level":
+                targets.append(make_target(mode, lvl, lvl, items))
+            else:
+                if chunk_notes > 0 or chunk_cards > 0 or chunk_bytes > 0:
+                    chunks = plan_chunks(items, chunk_notes, chunk_bytes, chunk_cards)
+                else:
+                    chunks = [
+                        items[i : i + chunk_size]
+                        for i in range(0, len(items), chunk_size)
+                    ]
+                for chunk in chunks:
+                    topic = "_".join(item.topic for item in chunk)
+                    target = make_target(mode, lvl, topic, chunk)
+                    target["max_bytes"] = chunk_bytes
+                    targets.append(target)
+
+    return [target for target in targets if target["files"]]
+
+
+def iter_target_topics(target: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Load the deck files of a build target one at a time.
+
+    Files that fail to load are reported and skipped.
+
+    Args:
+        target: Build target, as returned by plan_targets
+
+    Yields:
+        Dictionaries with 'level', 'topic' and 'cards' keys, for files with cards
+    """
+    for source in target["files"]:
+        try:
+            cards = list(iter_cards(source))
+        except ValueError as e:
+            print(f"Error processing {source.path}: {str(e)}")
+            continue
+        if cards:
+            yield {"level": source.level, "topic": source.topic, "cards": cards}
+
+
+def load_target_topics(target: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Load the deck files of a build target.
+
+    Files that fail to load are reported and skipped.
+
+    Args:
+        target: Build target, as returned by plan_targets
+
+    Returns:
+        Dictionaries with 'level', 'topic' and 'cards' keys, for files with cards
+    """
+    return list(iter_target_topics(target))
+
+
+def target_decks(target: Dict[str, Any]) -> List[genanki.Deck]:
+    """
+    Build the decks of a build target in memory, without writing a package.
+
+    Args:
+        target: Build target, as returned by plan_targets
+
+    Returns:
+        Decks the target's package would contain
+    """
+    topics = load_target_topics(target)
+    if not topics:
+        return []
+    if target["mode"] == "multi":
+        return make_multi_decks(topics)
+    cards = [card for topic in topics for card in topic["cards"]]
+    return [make_deck(target["level"], target["topic"], cards)]
+
+
+def export_targets(
+    targets: List[Dict[str, Any]], formats: List[str], basename: str
+) -> List[str]:
+    """
+    Export the notes of build targets in other formats, in a single pass.
+
+    Each deck file is loaded and each note rendered once, as for a package build,
+    then handed to the writer of every format. Notes are placed in the deck the
+    target's package would put them in.
+
+    Args:
+        targets: Build targets, as returned by plan_targets
+        formats: Export format names (see exporters.py)
+        basename: File name of the exports, without extension
+
+    Returns:
+        Paths of the written files
+
+    Raises:
+        ValueError: If a card has an unknown model or is missing a field
+    """
+    out_dir = os.path.join(OUTPUT_DIR, exporters.EXPORT_DIRNAME)
+    writers = exporters.open_exporters(formats, out_dir, basename, CARD_CSS)
+    try:
+        for target in targets:
+            for topic in iter_target_topics(target):
+                if target["mode"] == "multi":
+                    deck = f"Italiano::{topic['level']}::{topic['topic']}"
+                else:
+                    deck = f"Italiano::{target['level']}/{target['topic']}"
+                cards = topic["cards"]
+                for card, note in zip(cards, iter_notes(cards)):
+                    record = exporters.ExportRecord(
+                        deck=deck,
+                        level=topic["level"],
+                        topic=topic["topic"],
+                        model=card["model"],
+                        model_name=note.model.name,
+                        guid=note.guid,
+                        tags=list(note.tags),
+                        front=card["front"],
+                        back=card["back"],
+                        rendered=list(note.fields),
+                    )
+                    for exporter in writers:
+                        exporter.write(record)
+    finally:
+        for exporter in writers:
+            exporter.close()
+
+    for exporter in writers:
+        print(f"Exported {exporter.count} notes to {exporter.path}")
+    return [exporter.path for exporter in writers]
+
+
+def build_target(target: Dict[str, Any]) -> Optional[str]:
+    """
+    Load the deck files of a build target and write its package.
+
+    Args:
+        target: Build target, as returned by plan_targets
+
+    Returns:
+        Path of the written package, or None if nothing was written
+    """
+    if INCREMENTAL_BUILD and target["mode"] in AGGREGATE_MODES:
+        path = build_target_incremental(target)
+    else:
+        topics = load_target_topics(target)
+        if not topics:
+            return None
+        sources = [source.path for source in target["files"]]
+        if target["mode"] == "multi":
+            return build_multi_deck(target["level"], topics, sources)
+
+        cards = [card for topic in topics for card in topic["cards"]]
+        path = build_deck(target["level"], target["topic"], cards, sources)
+    return path
+
+
+def split_target(target: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Split a chunk target into two, keeping its files in plan order.
+
+    The split point is the one that balances the source bytes of both halves best.
+
+    Args:
+        target: Chunk target with at least two files
+
+    Returns:
+        The two halves, with the byte budget of the target
+    """
+    files = target["files"]
+    total = sum(item.size for item in files)
+    best, best_load, prefix = 1, total, 0
+    for idx, item in enumerate(files[:-1], start=1):
+        prefix += item.size
+        load = max(prefix, total - prefix)
+        if load < best_load:
+            best, best_load = idx, load
+    halves = []
+    for items in (files[:best], files[best:]):
+        topic = "_".join(item.topic for item in items)
+        half = make_target(target["mode"], target["level"], topic, items)
+        half["max_bytes"] = target["max_bytes"]
+        halves.append(half)
+    return halves
+
+
+def build_target_incremental(target: Dict[str, Any]) -> Optional[str]:
+    """
+    Write the package of an aggregate build target, reusing the previous build.
+
+    Unchanged deck files are taken from the previous package without being read, and
+    only notes whose source changed are rendered. The package is written like in a
+    clean build, so it is byte-identical to one. Without a usable index (first build,
+    changed rendering code or settings, missing store entry) every note is rendered.
+    The previous package is only reused as a whole if its sources and its timestamp
+    (see apkg.source_timestamp) are both unchanged.
+
+    Args:
+        target: Build target in per-level, uber or chunk mode
+
+    Returns:
+        Path of the written package, or None if nothing was written
+
+    Raises:
+        ValueError: If a card has an unknown model
+    """
+    filename = package_filename(target["level"], target["topic"])
+    index_file = incremental.index_path(OUTPUT_DIR, target["key"])
+    fingerprint = incremental.code_fingerprint(
+        RENDER_CODE,
+        render.RENDERER_VERSION,
+        genanki.__version__,
+        CARD_CSS_HASH,
+        f"dedup={DEDUP_NOTES}",
+        f"format={PACKAGE_FORMAT}:{ZSTD_LEVEL}",
+        media_fingerprint(),
+    )
+
+    index = incremental.load_index(index_file)
+    previous = None
+    if index and index.get("fingerprint") == fingerprint:
+        previous = apkg.stored_package(OUTPUT_DIR, index.get("package_sha256", ""))
+    if previous is None:
+        index = None
+
+    current = [
+        (os.path.relpath(item.path, DECKS_DIR).replace(os.sep, "/"), item)
+        for item in target["files"]
+    ]
+    paths = [item.path for item in target["files"]]
+    timestamp = apkg.source_timestamp(paths)
+    if index and previous is not None and index.get("timestamp") == timestamp:
+        indexed = [[s["path"], s["sha256"], s.get("select")] for s in index["sources"]]
+        if indexed == [[rel, item.sha256, item.positions] for rel, item in current]:
+            path = apkg.link_package(previous, OUTPUT_DIR, filename)
+            print(f"Unchanged {path}")
+            return path
+
+    cache = incremental.NoteCache(index, previous, MODELS_BY_ID)
+    recorded = {source["path"]: source for source in index["sources"]} if index else {}
+    notes: List[genanki.Note] = []
+    sources: List[Dict[str, Any]] = []
+    changed = rendered = 0
+    for rel, item in current:
+        record = recorded.get(rel)
+        stamp = [item.sha256, item.positions]
+        if record and [record["sha256"], record.get("select")] == stamp:
+            restored = cache.restore_source(record["notes"])
+            if restored is not None:
+                notes.extend(restored)
+                sources.append(record)
+                continue
+
+        changed += 1
+        try:
+            cards = list(iter_cards(item))
+        except ValueError as e:
+            print(f"Error processing {item.path}: {str(e)}")
+            continue
+        entries = []
+        for card in cards:
+            source_hash = incremental.card_hash(card)
+            note = cache.lookup(source_hash)
+            if note is None:
+                note = next(iter_notes([card]))
+                rendered += 1
+            entries.append([source_hash, note.guid, incremental.note_row_hash(note)])
+            notes.append(note)
+        sources.append(
+            {
+                "path": rel,
+                "sha256": item.sha256,
+                "select": item.positions,
+                "notes": entries,
+            }
+        )
+
+    if not notes:
+        return None
+    deck = make_deck_from_notes(target["level"], target["topic"], notes)
+    written = write_package([deck], filename, paths, timestamp)
+    if written:
+        incremental.save_index(
+            index_file,
+            {
+                "fingerprint": fingerprint,
+                "timestamp": timestamp,
+                "package_sha256": build_manifest.file_sha256(written),
+                "sources": sources,
+            },
+        )
+        print(
+            f"Rendered {rendered} of {len(notes)} notes "
+            f"({changed} of {len(current)} deck files changed)"
+        )
+    return written
+
+
+def build_targets(targets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Build a list of targets.
+
+    Chunks are planned by source size, so a chunk package can still come out larger
+    than the byte budget. Such a package is removed, and its files are split into two
+    chunks that are built in its place, until every package fits or holds a single
+    deck file.
+
+    Args:
+        targets: Build targets, as returned by plan_targets
+
+    Returns:
+        The targets that produced a package, each with its 'package' path added
+    """
+    built = []
+    pending = list(reversed(targets))
+    planned = len(targets)
+    while pending:
+        target = pending.pop()
+        path = build_target(target)
+        if not path:
+            continue
+        max_bytes = target.get("max_bytes", 0)
+        written = os.path.getsize(path) if max_bytes > 0 else 0
+        if written > max_bytes and len(target["files"]) > 1:
+            print(
+                f"Splitting {path}: {written} bytes is over the chunk byte budget "
+                f"of {max_bytes}"
+            )
+            os.remove(path)
+            pending.extend(reversed(split_target(target)))
+            planned += 1
+            continue
+        if written > max_bytes:
+            print(
+                f"Warning: {path} is {written} bytes, over the chunk byte budget of "
+                f"{max_bytes}, and holds a single deck file"
+            )
+        built.append(dict(target, package=path))
+    if built:
+        notes = sum(target["notes"] for target in built)
+        cards = sum(target["cards"] for target in built)
+        print(
+            f"Built {len(built)} of {planned} packages: "
+            f"{notes} notes, {cards} cards"
+        )
+    return built
+
+
+def process_per_file_mode(
+    levels: List[str], discovered_files: Optional[Dict[str, List[DeckSource]]] = None
 ) -> None:
     """
-    Process decks in per-level mode (one deck per level).
+    Process decks in per-file mode (one deck per TOML file).
 
     Args:
         levels: List of levels to process
-        discovered_files: Optional dictionary mapping level names to lists of file paths
+        discovered_files: Optional dictionary mapping level names to deck sources
     """
-    for lvl in levels:
-        cards = []
+    build_targets(plan_targets("per-file", levels, discovered_files))
 
-        if discovered_files and lvl in discovered_files:
-            # Use discovered files
-            for file_path in discovered_files[lvl]:
-                try:
-                    data = load_deck_file(file_path)
-                    cards.extend(data.get("cards", []))
-                except ValueError as e:
-                    print(f"Error processing {file_path}: {str(e)}")
-        else:
-            # Use traditional directory listing
-            lvl_dir = os.path.join(DECKS_DIR, lvl)
-            for fname in get_deck_files(lvl_dir):
-                file_path = os.path.join(lvl_dir, fname)
 
-                try:
-                    data = load_deck_file(file_path)
-                    cards.extend(data.get("cards", []))
-                except ValueError as e:
-                    print(f"Error processing {file_path}: {str(e)}")
+def process_per_level_mode(
+    levels: List[str], discovered_files: Optional[Dict[str, List[DeckSource]]] = None
+) -> None:
+    """
+    Process decks in per-level mode (one deck per level).
 
-        if cards:
-            build_deck(lvl, lvl, cards)
+    Args:
+        levels: List of levels to process
+        discovered_files: Optional dictionary mapping level names to deck sources
+    """
+    build_targets(plan_targets("per-level", levels, discovered_files))
 
 
 def process_uber_mode(
-    levels: List[str], discovered_files: Optional[Dict[str, List[str]]] = None
+    levels: List[str], discovered_files: Optional[Dict[str, List[DeckSource]]] = None
 ) -> None:
     """
     Process decks in uber mode (one big deck with all cards).
 
     Args:
         levels: List of levels to process
-        discovered_files: Optional dictionary mapping level names to lists of file paths
+        discovered_files: Optional dictionary mapping level names to deck sources
     """
-    cards = []
+    build_targets(plan_targets("uber", levels, discovered_files))
+
+
+def process_multi_mode(
+    levels: List[str], discovered_files: Optional[Dict[str, List[DeckSource]]] = None
+) -> None:
+    """
+    Process decks in multi mode (one package with every topic as a subdeck).
+
+    Args:
+        levels: List of levels to process
+        discovered_files: Optional dictionary mapping level names to deck sources
+    """
+    build_targets(plan_targets("multi", levels, discovered_files))
 
-    for lvl in levels:
-        if discovered_files and lvl in discovered_files:
-            # Use discovered files
-            for file_path in discovered_files[lvl]:
-                try:
-                    data = load_deck_file(file_path)
-                    cards.extend(data.get("cards", []))
-                except ValueError as e:
-                    print(f"Error processing {file_path}: {str(e)}")
-        else:
-            # Use traditional directory listing
-            lvl_dir = os.path.join(DECKS_DIR, lvl)
-            for fname in get_deck_files(lvl_dir):
-                file_path = os.path.join(lvl_dir, fname)
 
-                try:
-                    data = load_deck_file(file_path)
-                    cards.extend(data.get("cards", []))
-                except ValueError as e:
-                    print(f"Error processing {file_path}: {str(e)}")
+def plan_chunks(
+    items: List[DeckSource],
+    chunk_notes: int = 0,
+    chunk_bytes: int = 0,
+    chunk_cards: int = 0,
+) -> List[List[DeckSource]]:
+    """
+    Pack deck files into size-balanced chunks without splitting any file.
+
+    The number of chunks is the smallest that meets the note or card target and the
+    byte budget. Files are then placed largest first into the least loaded chunk (LPT
+    scheduling), which keeps the biggest chunk close to the average. The byte budget
+    is a hard limit: a file that does not fit into any chunk opens a new one, and a
+    file that exceeds the budget on its own gets a chunk to itself.
 
-    if cards:
-        build_deck("all", "all", cards)
+    Args:
+        items: Deck sources; their catalog note and card counts and sizes are used
+        chunk_notes: Target number of notes per chunk (0 to ignore)
+        chunk_bytes: Maximum source bytes per chunk (0 for no limit)
+        chunk_cards: Target number of cards per chunk (0 to ignore); cloze notes
+            produce one card per cloze number
+
+    Returns:
+        List of chunks, each a list of items in their original order
+
+    Raises:
+        ValueError: If none of chunk_notes, chunk_cards and chunk_bytes is positive
+    """
+    if chunk_notes <= 0 and chunk_cards <= 0 and chunk_bytes <= 0:
+        raise ValueError(
+            "Chunk note or card target or byte budget must be greater than 0"
+        )
+    if not items:
+        return []
+
+    if chunk_cards > 0:
+        weight_attr, target_count = "card_count", chunk_cards
+    else:
+        weight_attr, target_count = "note_count", chunk_notes
+    if target_count <= 0:
+        weight_attr = "size"
+    total_bytes = sum(item.size for item in items)
+    bins = 1
+    if target_count > 0:
+        total = sum(getattr(item, weight_attr) for item in items)
+        bins = max(bins, -(-total // target_count))
+    if chunk_bytes > 0:
+        bins = max(bins, -(-total_bytes // chunk_bytes))
+    bins = min(bins, len(items))
+
+    order = {item.path: idx for idx, item in enumerate(items)}
+    chunks: List[List[DeckSource]] = [[] for _ in range(bins)]
+    loads = [0] * bins
+    sizes = [0] * bins
+
+    for item in sorted(
+        items, key=lambda it: (-getattr(it, weight_attr), order[it.path])
+    ):
+        if chunk_bytes > 0 and item.size > chunk_bytes:
+            print(
+                f"Warning: {item.path} is larger than the chunk byte budget "
+                f"({item.size} > {chunk_bytes} bytes) and gets its own chunk"
+            )
+            chunks.append([item])
+            loads.append(getattr(item, weight_attr))
+            sizes.append(item.size)
+            continue
+
+        candidates = [
+            i
+            for i in range(len(chunks))
+            if chunk_bytes <= 0 or sizes[i] + item.size <= chunk_bytes
+        ]
+        if candidates:
+            target = min(candidates, key=lambda i: (loads[i], i))
+        else:
+            chunks.append([])
+            loads.append(0)
+            sizes.append(0)
+            target = len(chunks) - 1
+        chunks[target].append(item)
+        loads[target] += getattr(item, weight_attr)
+        sizes[target] += item.size
+
+    result = [sorted(chunk, key=lambda it: order[it.path]) for chunk in chunks if chunk]
+    result.sort(key=lambda chunk: order[chunk[0].path])
+    return result
 
 
 def process_chunk_mode(
     levels: List[str],
     chunk_size: int,
-    discovered_files: Optional[Dict[str, List[str]]] = None,
+    discovered_files: Optional[Dict[str, List[DeckSource]]] = None,
+    chunk_notes: int = 0,
+    chunk_bytes: int = 0,
+    chunk_cards: int = 0,
 ) -> None:
     """
     Process decks in chunk mode (decks with a specified number of files each).
 
+    With chunk_notes, chunk_cards or chunk_bytes, files are instead packed into
+    size-balanced chunks by note count, card count or source byte size (see
+    plan_chunks). Card counts come from the deck catalog, so chunks are planned
+    without building anything.
+
     Args:
         levels: List of levels to process
         chunk_size: Number of files per deck
-        discovered_files: Optional dictionary mapping level names to lists of file paths
+        discovered_files: Optional dictionary mapping level names to deck sources
+        chunk_notes: Target number of notes per deck (0 to chunk by file count)
+        chunk_bytes: Maximum source bytes per deck (0 for no limit)
+        chunk_cards: Target number of cards per deck (0 to chunk by file count)
 
     Raises:
-        ValueError: If chunk_size is <= 0
+        ValueError: If no chunk size, note or card target or byte budget is > 0
     """
-    if chunk_size <= 0:
-        raise ValueError("Chunk size must be greater than 0")
-
-    for lvl in levels:
-        if discovered_files and lvl in discovered_files:
-            # Use discovered files
-            files = [os.path.basename(f) for f in discovered_files[lvl]]
-            file_paths = discovered_files[lvl]
-        else:
-            # Use traditional directory listing
-            lvl_dir = os.path.join(DECKS_DIR, lvl)
-            files = get_deck_files(lvl_dir)
-            file_paths = [os.path.join(lvl_dir, f) for f in files]
-
-        for i in range(0, len(files), chunk_size):
-            chunk_files = files[i : i + chunk_size]
-            chunk_paths = file_paths[i : i + chunk_size]
-            cards = []
-            topics = []
-
-            for j, fname in enumerate(chunk_files):
-                topic = os.path.splitext(fname)[0]
-                topics.append(topic)
-                file_path = chunk_paths[j]
-
-                try:
-                    data = load_deck_file(file_path)
-                    cards.extend(data.get("cards", []))
-                except ValueError as e:
-                    print(f"Error processing {file_path}: {str(e)}")
-
-            deck_topic = "_".join(topics)
-            if cards:
-                build_deck(lvl, deck_topic, cards)
+    build_targets(
+        plan_targets(
+            "chunk",
+            levels,
+            discovered_files,
+            chunk_size,
+            chunk_notes,
+            chunk_bytes,
+            chunk_cards=chunk_cards,
+        )
+    )
 
 
 def main() -> int:
@@ -476,7 +1245,9 @@ def main() -> int:
         "--all", action="store_true", help="legacy: per-file on all levels"
     )
     parser.add_argument(
-        "--mode", choices=["per-file", "per-level", "uber", "chunk"], help="build mode"
+        "--mode",
+        choices=["per-file", "per-level", "uber", "chunk", "multi"],
+        help="build mode",
     )
     parser.add_argument(
         "--chunk-size",
@@ -484,6 +1255,84 @@ def main() -> int:
         default=0,
         help="number of files per deck in chunk mode",
     )
+    parser.add_argument(
+        "--chunk-notes",
+        type=int,
+        default=0,
+        help="chunk mode: balance decks to about this many notes each",
+    )
+    parser.add_argument(
+        "--chunk-cards",
+        type=int,
+        default=0,
+        help="chunk mode: balance decks to about this many cards each "
+        "(cloze notes count once per cloze number)",
+    )
+    parser.add_argument(
+        "--chunk-bytes",
+        type=int,
+        default=0,
+        help="chunk mode: hard upper bound on the bytes of one deck; packages "
+        "written over it are split and rebuilt",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="drop duplicate notes in per-level, uber, chunk and select builds",
+    )
+    parser.add_argument(
+        "--select",
+        metavar="QUERY",
+        help="build one custom deck from the notes matching a query, "
+        "for example 'tag:verbi_* AND level:a2'",
+    )
+    parser.add_argument(
+        "--name",
+        default="custom",
+        help="name of the custom deck built with --select",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="per-level, uber, chunk and select builds: render only notes changed "
+        "since the last build",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="build only shard I of N (cost-balanced) and write a partial manifest",
+    )
+    parser.add_argument(
+        "--collection",
+        metavar="PATH",
+        help="upsert notes into this local collection.anki2 instead of writing packages",
+    )
+    parser.add_argument(
+        "--package-format",
+        choices=apkg.PACKAGE_FORMATS,
+        default=apkg.PACKAGE_FORMATS[0],
+        help="package layout: legacy (every Anki version) or latest "
+        "(zstd-compressed, smaller, Anki 2.1.50+)",
+    )
+    parser.add_argument(
+        "--zstd-level",
+        type=int,
+        default=apkg.DEFAULT_ZSTD_LEVEL,
+        help=f"zstd level of the latest package format (default: {apkg.DEFAULT_ZSTD_LEVEL})",
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=["auto", *render.BACKENDS],
+        default="auto",
+        help="Markdown backend: auto uses the fastest installed backends, falling "
+        "back to the python-markdown reference for fields they do not support",
+    )
+    parser.add_argument(
+        "--export",
+        metavar="FORMATS",
+        help="export notes instead of writing packages, in a comma-separated list "
+        "of formats: anki-text, csv, jsonl, html",
+    )
     parser.add_argument(
         "--auto-discover",
         action="store_true",
@@ -494,8 +1343,8 @@ def main() -> int:
     try:
         # Determine levels
         if args.auto_discover:
-            # Use automatic discovery
-            discovered_decks = discover_deck_files()
+            # Use automatic discovery, restricted to the requested level if any
+            discovered_decks = discover_deck_files([args.level] if args.level else None)
             all_levels = sorted(discovered_decks.keys())
 
             if args.level:
@@ -509,48 +1358,108 @@ def main() -> int:
             else:
                 levels = all_levels
         else:
-            # Use traditional directory listing
-            all_levels = sorted(
-                [
-                    d
-                    for d in os.listdir(DECKS_DIR)
-                    if os.path.isdir(os.path.join(DECKS_DIR, d))
-                ]
-            )
+            # Use the level directories known to the deck catalog
+            all_levels = get_catalog(DECKS_DIR).levels()
 
             if args.level:
                 levels = [args.level]
-            elif args.all or args.mode:
+            elif args.all or args.mode or args.select:
                 levels = all_levels
             else:
-                parser.error("Specify --level, --all, --mode, or --auto-discover")
+                parser.error(
+                    "Specify --level, --all, --mode, --select, or --auto-discover"
+                )
 
         if not levels:
             print("No levels to process")
             return 0
 
-        mode = args.mode or "per-file"
+        if args.select:
+            if args.mode:
+                parser.error(
+                    "--select builds one custom deck and cannot be used with --mode"
+                )
+            if not CUSTOM_NAME_RE.match(args.name):
+                parser.error(f"Invalid deck name '{args.name}'")
+            mode = "select"
+        else:
+            mode = args.mode or "per-file"
 
-        # Set the global mode variable
-        global CURRENT_MODE
+        # Set the global mode variables
+        global CURRENT_MODE, DEDUP_NOTES, INCREMENTAL_BUILD, PACKAGE_FORMAT, ZSTD_LEVEL
         CURRENT_MODE = mode
+        DEDUP_NOTES = args.dedup
+        INCREMENTAL_BUILD = args.incremental
+        PACKAGE_FORMAT = args.package_format
+        ZSTD_LEVEL = args.zstd_level
 
-        # Process according to mode
+        if PACKAGE_FORMAT == "latest":
+            try:
+                apkg.require_zstandard()
+            except ValueError as e:
+                parser.error(str(e))
+
+        try:
+            render.select_backends(args.renderer)
+        except ValueError as e:
+            parser.error(str(e))
+
+        shard = None
+        if args.shard:
+            try:
+                shard = build_manifest.parse_shard(args.shard)
+            except ValueError as e:
+                parser.error(str(e))
+
+        # Plan the packages of this mode, then build them
         discovered_files = discovered_decks if args.auto_discover else None
+        try:
+            targets = plan_targets(
+                mode,
+                levels,
+                discovered_files,
+                chunk_size=args.chunk_size,
+                chunk_notes=args.chunk_notes,
+                chunk_bytes=args.chunk_bytes,
+                chunk_cards=args.chunk_cards,
+                query=args.select or "",
+                name=args.name,
+            )
+        except ValueError as e:
+            parser.error(str(e))
 
-        if mode == "per-file":
-            process_per_file_mode(levels, discovered_files)
-        elif mode == "per-level":
-            process_per_level_mode(levels, discovered_files)
-        elif mode == "uber":
-            process_uber_mode(levels, discovered_files)
-        elif mode == "chunk":
+        if args.export:
             try:
-                process_chunk_mode(levels, args.chunk_size, discovered_files)
+                formats = exporters.parse_formats(args.export)
             except ValueError as e:
                 parser.error(str(e))
+            if mode == "select":
+                scope = args.name
+            else:
+                scope = levels[0] if len(levels) == 1 else "all"
+            export_targets(targets, formats, f"italian-{scope}-v{VERSION}")
+        elif args.collection:
+            decks = [deck for target in targets for deck in target_decks(target)]
+            stats = upsert_decks(args.collection, decks)
+            print(f"Updated {args.collection}: {describe_stats(stats)}")
+            media_dir = os.path.join(
+                os.path.dirname(args.collection), "collection.media"
+            )
+            copied = install_media(MEDIA_STORE.referenced(decks), media_dir)
+            if copied:
+                print(f"Copied {copied} media files to {media_dir}")
+        elif shard:
+            index, count = shard
+            assigned = build_manifest.assign_shards(targets, count)[index - 1]
+            print(
+                f"Shard {index}/{count}: building {len(assigned)} of {len(targets)} targets"
+            )
+            built = build_targets(assigned)
+            build_manifest.write_partial_manifest(
+                OUTPUT_DIR, VERSION, mode, shard, targets, assigned, built, DECKS_DIR
+            )
         else:
-            parser.error(f"Unknown mode '{mode}'")
+            build_targets(targets)
 
         return 0
 
@@ -13,12 +13,13 @@ Usage:
   python html_to_markdown.py --dry-run        # Show what would be changed without making changes
 """
 import argparse
-import glob
-import os
+import html
 import re
 import sys
 from typing import List, Optional, Tuple
 
+import deck_catalog
+
 # Import appropriate TOML library based on Python version
 if sys.version_info >= (3, 11):
     import tomllib
@@ -48,6 +49,58 @@ def convert_html_to_markdown(text: str) -> str:
     return text
 
 
+# Block elements; Anki's editor wraps every line in a <div>
+BLOCK_TAG_RE = re.compile(
+    r"<(/?)(div|p|li|ul|ol|tr|table|h[1-6])\b[^>]*>", re.IGNORECASE
+)
+
+# Text that starts each block element, by tag name (others start a new line)
+BLOCK_STARTS = {"p": "\n\n", "li": "\n- "}
+
+# Line break tags in any spelling (<br>, <br/>, <BR />)
+BR_TAG_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+
+# Any remaining tag
+TAG_RE = re.compile(r"<[^>]+>")
+
+# Bold and italic tags and their Markdown markers
+EMPHASIS_TAGS = (("b", "**"), ("strong", "**"), ("i", "*"), ("em", "*"))
+
+
+def convert_anki_html(text: str) -> str:
+    """
+    Convert the HTML of fields edited in Anki to Markdown.
+
+    Extends convert_html_to_markdown to the markup Anki's editor produces: block
+    elements start new lines (paragraphs and list items as in Markdown), italics
+    become *...*, other tags are dropped and entities such as &nbsp; are decoded.
+
+    Args:
+        text: Field HTML
+
+    Returns:
+        Field Markdown
+    """
+    text = BR_TAG_RE.sub("<br>", text)
+    for tag, marker in EMPHASIS_TAGS:
+        text = re.sub(
+            rf"<{tag}\b[^>]*>(.*?)</{tag}>",
+            rf"{marker}\1{marker}",
+            text,
+            flags=re.IGNORECASE | re.DOTALL,
+        )
+    text = BLOCK_TAG_RE.sub(
+        lambda m: "" if m.group(1) else BLOCK_STARTS.get(m.group(2).lower(), "\n"),
+        text,
+    )
+    text = convert_html_to_markdown(text)
+    text = html.unescape(TAG_RE.sub("", text)).replace("\xa0", " ")
+
+    # Collapse the blank lines left by nested blocks
+    lines = [line.rstrip() for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
 def process_toml_file(path: str, dry_run: bool = False) -> Tuple[int, int]:
     """
     Process a single TOML file, converting HTML to Markdown.
@@ -122,15 +175,7 @@ def find_toml_files(path: Optional[str] = None) -> List[str]:
     Returns:
         List of file paths to process
     """
-    if path:
-        if os.path.isfile(path) and path.endswith(".toml"):
-            return [path]
-        elif os.path.isdir(path):
-            return glob.glob(os.path.join(path, "*.toml"))
-        else:
-            return glob.glob(os.path.join(path, "**/*.toml"), recursive=True)
-    else:
-        return glob.glob("decks/**/*.toml", recursive=True)
+    return deck_catalog.find_deck_files(path, recursive=True)
 
 
 def main() -> int:
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+import_apkg.py.
+
+Imports the notes of an existing Anki package (.apkg) into deck files.
+The collection database is streamed out of the package to a temporary file and its
+notes are read row by row, so memory use does not grow with the size of the deck:
+- HTML fields are converted to Markdown (see html_to_markdown.py)
+- cloze note types become 'cloze' notes, all others 'basic' notes
+- every Anki deck becomes a topic (unless --topic is given) and notes get the
+  leading tags of the deck schema, [level, topic] (see deck_schema.py)
+- notes are appended to decks/<level>/<topic>.toml in batches
+
+The Anki note ID becomes the note_id, so importing the same package again yields the
+same note_ids; notes whose note_id is already in their deck file are skipped, which
+makes importing a package twice a no-op. Every converted note is checked with the
+rules of validate.py, including the orthography rules, before it is written; notes
+that fail are reported and skipped. Media files are not imported; notes referencing
+them are counted.
+
+Usage:
+  python import_apkg.py deck.apkg --level b1                 # one topic per Anki deck
+  python import_apkg.py deck.apkg --level b1 --topic lessico # everything in one topic
+  python import_apkg.py deck.apkg --level b1 --dry-run       # only report the counts
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import unicodedata
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from apkg import SCHEMA_TABLES, collection_name, extract_collection
+from deck_schema import get_schema
+from deck_writer import DEFAULT_BATCH_SIZE, DeckWriter, read_existing
+from html_to_markdown import convert_anki_html
+from orthography import Automaton, get_automaton
+from validate import validate_note
+
+# Anki model type of cloze note types
+MODEL_TYPE_CLOZE = 1
+
+# Matches a cloze deletion and captures its answer
+CLOZE_RE = re.compile(r"\{\{c\d+::(.*?)(?:::[^}]*)?\}\}", re.DOTALL)
+
+# Matches references to media files in fields
+MEDIA_RE = re.compile(r"<img\b|\[sound:", re.IGNORECASE)
+
+# Characters not allowed in topics
+UNSAFE_TOPIC_RE = re.compile(r"[^a-z0-9]+")
+
+# Levels and topics must be valid directory and file names
+NAME_RE = re.compile(r"^[a-z0-9_]+$")
+
+
+def slugify(name: str) -> str:
+    """
+    Turn an Anki deck name into a topic.
+
+    Args:
+        name: Deck name; only its last '::' component is used
+
+    Returns:
+        Lowercase ASCII topic with words joined by underscores
+    """
+    last = name.split("::")[-1]
+    ascii_name = unicodedata.normalize("NFKD", last).encode("ascii", "ignore").decode()
+    return UNSAFE_TOPIC_RE.sub("_", ascii_name.lower()).strip("_") or "importati"
+
+
+def reveal_clozes(text: str) -> str:
+    """
+    Replace the cloze deletions of a text by their answers.
+
+    Args:
+        text: Cloze text
+
+    Returns:
+        The text with every deletion filled in
+    """
+    return CLOZE_RE.sub(r"\1", text)
+
+
+def convert_note(
+    fields: List[str], model_type: int, note_id: int, level: str, topic: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Convert the fields of one Anki note into a [[notes]] entry.
+
+    Basic notes keep their first field as the front; the remaining non-empty fields
+    make up the back. Cloze notes keep their text, and use their extra field as the
+    back or, without one, the text with its deletions filled in.
+
+    Args:
+        fields: Field HTML as stored in the collection
+        model_type: Anki model type (1 for cloze)
+        note_id: Anki note ID
+        level: Level of the target deck file
+        topic: Topic of the target deck file
+
+    Returns:
+        The note, or None if it has no usable front or back
+    """
+    markdown = [convert_anki_html(field) for field in fields]
+    tags = get_schema().tags(level, topic)
+    note: Dict[str, Any] = {"note_id": note_id, "tags": tags}
+    if model_type == MODEL_TYPE_CLOZE:
+        text = markdown[0] if markdown else ""
+        if not CLOZE_RE.search(text):
+            return None
+        back = "\n\n".join(field for field in markdown[1:] if field)
+        note["model"] = "cloze"
+        note["fields"] = [text]
+        note["back"] = back or reveal_clozes(text)
+        return note
+
+    front = markdown[0] if markdown else ""
+    back = "\n\n".join(field for field in markdown[1:] if field)
+    if not front or not back:
+        return None
+    note["fields"] = [front, back]
+    return note
+
+
+def notetype_kind(config: bytes) -> int:
+    """
+    Read the kind of a note type from its config in a collection with note type tables.
+
+    The config is a NotetypeConfig protobuf message. Its kind is field 1, a varint
+    written before every other field and left out when it is 0 (standard); 1 is cloze,
+    as the type of a legacy model.
+
+    Args:
+        config: Config column of the notetypes table
+
+    Returns:
+        0 for standard note types, 1 for cloze note types
+    """
+    if len(config) > 1 and config[0] == 0x08:
+        return config[1]
+    return 0
+
+
+def iter_collection_notes(
+    db_path: str,
+) -> Iterator[Tuple[int, List[str], int, str]]:
+    """
+    Stream the notes of a collection database.
+
+    Args:
+        db_path: Collection database, in the legacy schema or one with separate deck
+            and note type tables
+
+    Yields:
+        Tuples of (note ID, fields, model type, deck name), in note ID order; the deck
+        is the one holding the note's first card
+
+    Raises:
+        ValueError: If the file is not an Anki collection
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        try:
+            (schema,) = conn.execute("SELECT ver FROM col").fetchone()
+            if schema >= SCHEMA_TABLES:
+                model_types = {
+                    mid: notetype_kind(config)
+                    for mid, config in conn.execute("SELECT id, config FROM notetypes")
+                }
+                deck_names = {
+                    did: name.replace("\x1f", "::")
+                    for did, name in conn.execute("SELECT id, name FROM decks")
+                }
+            else:
+                models_json, decks_json = conn.execute(
+                    "SELECT models, decks FROM col"
+                ).fetchone()
+                models = json.loads(models_json)
+                decks = json.loads(decks_json)
+                model_types = {
+                    int(mid): model.get("type", 0) for mid, model in models.items()
+                }
+                deck_names = {
+                    int(did): deck.get("name", "") for did, deck in decks.items()
+                }
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            raise ValueError(f"Not a supported Anki collection: {str(e)}")
+
+        rows = conn.execute(
+            "SELECT n.id, n.mid, n.flds, "
+            "(SELECT c.did FROM cards c WHERE c.nid = n.id ORDER BY c.ord LIMIT 1) "
+            "FROM notes n ORDER BY n.id"
+        )
+        for note_id, mid, flds, did in rows:
+            yield (
+                note_id,
+                flds.split("\x1f"),
+                model_types.get(mid, 0),
+                deck_names.get(did, ""),
+            )
+    finally:
+        conn.close()
+
+
+def import_package(
+    apkg_path: str,
+    level: str,
+    writer: DeckWriter,
+    topic: Optional[str] = None,
+    automaton: Optional[Automaton] = None,
+) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Import the notes of a package into deck files.
+
+    Args:
+        apkg_path: Package to import
+        level: Level of the target deck files
+        writer: Writer the converted notes are queued on
+        topic: Topic for all notes; defaults to one topic per Anki deck
+        automaton: Optional compiled orthography rules the fields are checked against
+
+    Returns:
+        Tuple of (counts, error messages). The counts are of 'imported' notes,
+        'skipped' notes without a usable front or back, 'invalid' notes failing
+        validation, 'existing' notes whose note_id is already in their deck file, and
+        notes referencing 'media'
+
+    Raises:
+        ValueError: If the package or an existing deck file cannot be read
+    """
+    stats = {"imported": 0, "skipped": 0, "invalid": 0, "existing": 0, "media": 0}
+    errors: List[str] = []
+    existing: Dict[str, Set[Any]] = {}
+    default_model = get_schema().default_model
+    name = collection_name(apkg_path)
+    fd, db_path = tempfile.mkstemp(suffix=".anki2")
+    os.close(fd)
+    try:
+        extract_collection(apkg_path, db_path, name)
+        for note_id, fields, model_type, deck in iter_collection_notes(db_path):
+            note_topic = topic or slugify(deck)
+            if any(MEDIA_RE.search(field) for field in fields):
+                stats["media"] += 1
+            note = convert_note(fields, model_type, note_id, level, note_topic)
+            if note is None:
+                stats["skipped"] += 1
+                continue
+            path = writer.path(level, note_topic)
+            if path not in existing:
+                existing[path] = read_existing(path)[1]
+            if note_id in existing[path]:
+                stats["existing"] += 1
+                continue
+            note_errors = validate_note(
+                apkg_path,
+                f"note {note_id}",
+                note,
+                default_model,
+                level,
+                note_topic,
+                automaton,
+            )
+            if note_errors:
+                errors.extend(note_errors)
+                stats["invalid"] += 1
+                continue
+            existing[path].add(note_id)
+            writer.add(level, note_topic, note)
+            stats["imported"] += 1
+        writer.close()
+    finally:
+        os.remove(db_path)
+    return stats, errors
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 for success, 1 if any note failed validation or the import failed)
+    """
+    parser = argparse.ArgumentParser(description="Import an Anki package into decks")
+    parser.add_argument("apkg", help="Anki package (.apkg) to import")
+    parser.add_argument("--level", required=True, help="level of the deck files")
+    parser.add_argument("--topic", help="topic for all notes (default: per Anki deck)")
+    parser.add_argument("--decks-dir", default="decks", help="root of the decks tree")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="notes buffered before they are written",
+    )
+    parser.add_argument(
+        "--no-lint", action="store_true", help="Skip the orthography checks"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show what would be written without writing anything",
+    )
+    args = parser.parse_args()
+
+    for label, value in (("level", args.level), ("topic", args.topic)):
+        if value is not None and not NAME_RE.match(value):
+            print(f"Error: Invalid {label} '{value}', use lowercase letters, digits, _")
+            return 1
+
+    writer = DeckWriter(args.decks_dir, args.batch_size, args.dry_run)
+    try:
+        automaton = None if args.no_lint else get_automaton()
+        stats, errors = import_package(
+            args.apkg, args.level, writer, args.topic, automaton
+        )
+    except (OSError, ValueError) as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+    for error in errors:
+        print(error)
+    action = "Would write" if args.dry_run else "Wrote"
+    for path, count in sorted(writer.counts.items()):
+        created = " (new)" if path in writer.created else ""
+        print(f"{action} {count} notes to {path}{created}")
+    print(
+        f"Imported {stats['imported']} notes into {len(writer.counts)} deck files, "
+        f"skipped {stats['skipped']} without a front or back"
+    )
+    if stats["invalid"]:
+        print(f"Skipped {stats['invalid']} notes with errors")
+    if stats["existing"]:
+        print(f"Skipped {stats['existing']} notes already in their deck files")
+    if stats["media"]:
+        print(f"Warning: {stats['media']} notes reference media, which is not imported")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+import_table.py.
+
+Imports notes authored in a spreadsheet, exported as TSV or CSV, into deck files.
+The file is read row by row. Each row becomes a note of decks/<level>/<topic>.toml,
+with the leading tags of the deck schema, [level, topic] (see deck_schema.py), and is
+appended in batches (see deck_writer.py). Columns are taken from the header row:
+- front, back        the fields of the note (for cloze notes, the text and its back)
+- model              basic or cloze (default: --model)
+- level, topic       target deck file (default: --level and --topic)
+- note_id            optional; rows without one get the next free number of their file
+
+Every note is checked with the rules of validate.py before it is written, so the deck
+files pass validation afterwards. Rows that fail are reported with their line number
+and skipped.
+
+Usage:
+  python import_table.py words.tsv --level a2 --topic vocab_casa
+  python import_table.py words.csv --map front=italiano --map back=inglese
+  python import_table.py words.tsv --level a2 --topic vocab_casa --dry-run
+"""
+import argparse
+import csv
+import re
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from deck_schema import get_schema
+from deck_writer import DEFAULT_BATCH_SIZE, DeckWriter, read_existing
+from orthography import Automaton, get_automaton
+from validate import validate_note
+
+# Note attributes that can be read from a column
+COLUMNS = ("front", "back", "model", "level", "topic", "note_id")
+
+# Levels and topics must be valid directory and file names
+NAME_RE = re.compile(r"^[a-z0-9_]+$")
+
+
+def parse_mapping(items: List[str]) -> Dict[str, str]:
+    """
+    Parse --map options into a column mapping.
+
+    Args:
+        items: Options of the form attribute=column
+
+    Returns:
+        Dictionary mapping every attribute to its column name
+
+    Raises:
+        ValueError: If an option is malformed or names an unknown attribute
+    """
+    mapping = {name: name for name in COLUMNS}
+    for item in items:
+        name, sep, column = item.partition("=")
+        if not sep or name not in COLUMNS or not column:
+            raise ValueError(
+                f"Invalid mapping '{item}', expected <attribute>=<column> with "
+                f"attribute one of {', '.join(COLUMNS)}"
+            )
+        mapping[name] = column
+    return mapping
+
+
+def read_rows(
+    path: str, delimiter: Optional[str] = None
+) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Stream the rows of a TSV or CSV file.
+
+    Args:
+        path: Table file; .tsv and .tab files are tab-separated, others comma-separated
+        delimiter: Optional delimiter overriding the one chosen by extension
+
+    Yields:
+        Tuples of (line number, row keyed by header name)
+    """
+    if delimiter is None:
+        delimiter = "\t" if path.lower().endswith((".tsv", ".tab")) else ","
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        for row in reader:
+            yield reader.line_num, row
+
+
+class NoteIds:
+    """
+    Note_id assignment for the deck files of one import.
+
+    Explicit note_ids are kept and checked against the file's existing ones; rows
+    without one get the number after the largest integer note_id of their file.
+    """
+
+    def __init__(self, writer: DeckWriter):
+        """
+        Start with no deck file read yet.
+
+        Args:
+            writer: Writer whose deck file paths the note_ids belong to
+        """
+        self.writer = writer
+        self._used: Dict[str, Set[Any]] = {}
+        self._next: Dict[str, int] = {}
+
+    def _load(self, path: str) -> None:
+        """Read the note_ids already in a deck file."""
+        if path not in self._used:
+            self._used[path] = read_existing(path)[1]
+            numbers = [i for i in self._used[path] if isinstance(i, int)]
+            self._next[path] = max(numbers, default=0) + 1
+
+    def assign(self, level: str, topic: str, value: str) -> Any:
+        """
+        Choose the note_id of a row.
+
+        Args:
+            level: Level of the target deck file
+            topic: Topic of the target deck file
+            value: note_id cell of the row, possibly empty
+
+        Returns:
+            The note_id
+
+        Raises:
+            ValueError: If the explicit note_id is already used in the deck file, or
+                the deck file cannot be parsed
+        """
+        path = self.writer.path(level, topic)
+        self._load(path)
+        used = self._used[path]
+        if value:
+            note_id: Any = int(value) if value.isdigit() else value
+            if note_id in used:
+                raise ValueError(f"note_id {note_id} is already used in {path}")
+        else:
+            while self._next[path] in used:
+                self._next[path] += 1
+            note_id = self._next[path]
+        used.add(note_id)
+        if isinstance(note_id, int) and note_id >= self._next[path]:
+            self._next[path] = note_id + 1
+        return note_id
+
+
+def row_to_note(
+    row: Dict[str, str], mapping: Dict[str, str], defaults: Dict[str, str]
+) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Build the note of one row.
+
+    Args:
+        row: Row keyed by header name
+        mapping: Column of every note attribute
+        defaults: Values used for empty or missing level, topic and model columns
+
+    Returns:
+        Tuple of (level, topic, note without note_id)
+
+    Raises:
+        ValueError: If the level or topic is missing or invalid
+    """
+
+    def cell(name: str) -> str:
+        return (row.get(mapping[name]) or "").strip() or defaults.get(name, "")
+
+    level, topic, model = cell("level"), cell("topic"), cell("model") or "basic"
+    for name, value in (("level", level), ("topic", topic)):
+        if not value:
+            raise ValueError(
+                f"Missing {name}; add a '{mapping[name]}' column or --{name}"
+            )
+        if not NAME_RE.match(value):
+            raise ValueError(
+                f"Invalid {name} '{value}', use lowercase letters, digits, _"
+            )
+
+    tags = get_schema().tags(level, topic)
+    note: Dict[str, Any] = {"tags": tags, "model": model}
+    if model == "cloze":
+        note["fields"] = [cell("front")]
+        note["back"] = cell("back")
+    else:
+        note["fields"] = [cell("front"), cell("back")]
+    return level, topic, note
+
+
+def check_note(
+    source: str,
+    line: int,
+    level: str,
+    topic: str,
+    note: Dict[str, Any],
+    automaton: Optional[Automaton],
+) -> List[str]:
+    """
+    Check a note with the rules of validate.py before it is written.
+
+    Args:
+        source: Path of the table file
+        line: Line number of the row
+        level: Level of the target deck file
+        topic: Topic of the target deck file
+        note: Note built from the row
+        automaton: Optional compiled orthography rules
+
+    Returns:
+        List of error messages, empty if no errors
+    """
+    label = f"line {line}"
+    model = note["model"]
+    errors = validate_note(source, label, note, model, level, topic, automaton)
+    texts = note["fields"] + ([note["back"]] if "back" in note else [])
+    if not errors and not all(texts):
+        errors.append(f"ERR {source} [{label}]: Empty front or back")
+    return errors
+
+
+def import_table(
+    path: str,
+    writer: DeckWriter,
+    mapping: Dict[str, str],
+    defaults: Dict[str, str],
+    automaton: Optional[Automaton] = None,
+    delimiter: Optional[str] = None,
+) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Import the rows of a table file into deck files.
+
+    Args:
+        path: TSV or CSV file with a header row
+        writer: Writer the notes are queued on
+        mapping: Column of every note attribute
+        defaults: Values used for empty or missing level, topic and model columns
+        automaton: Optional compiled orthography rules the fields are checked against
+        delimiter: Optional delimiter overriding the one chosen by extension
+
+    Returns:
+        Tuple of (counts of 'imported' and 'skipped' rows, error messages)
+
+    Raises:
+        ValueError: If an existing deck file cannot be parsed
+    """
+    note_ids = NoteIds(writer)
+    stats = {"imported": 0, "skipped": 0}
+    errors: List[str] = []
+    for line, row in read_rows(path, delimiter):
+        try:
+            level, topic, note = row_to_note(row, mapping, defaults)
+            row_errors = check_note(path, line, level, topic, note, automaton)
+            if not row_errors:
+                value = (row.get(mapping["note_id"]) or "").strip()
+                note["note_id"] = note_ids.assign(level, topic, value)
+        except ValueError as e:
+            row_errors = [f"ERR {path} [line {line}]: {str(e)}"]
+        if row_errors:
+            errors.extend(row_errors)
+            stats["skipped"] += 1
+            continue
+        writer.add(level, topic, {"note_id": note.pop("note_id"), **note})
+        stats["imported"] += 1
+    writer.close()
+    return stats, errors
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 for success, 1 if any row was skipped or the import failed)
+    """
+    parser = argparse.ArgumentParser(description="Import a TSV or CSV file into decks")
+    parser.add_argument("table", help="TSV or CSV file with a header row")
+    parser.add_argument(
+        "--map",
+        action="append",
+        default=[],
+        metavar="ATTRIBUTE=COLUMN",
+        help=f"column of a note attribute ({', '.join(COLUMNS)})",
+    )
+    parser.add_argument("--level", default="", help="level of rows without one")
+    parser.add_argument("--topic", default="", help="topic of rows without one")
+    parser.add_argument("--model", default="basic", choices=["basic", "cloze"])
+    parser.add_argument("--delimiter", help="field delimiter (default: by extension)")
+    parser.add_argument("--decks-dir", default="decks", help="root of the decks tree")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="notes buffered before they are written",
+    )
+    parser.add_argument(
+        "--no-lint", action="store_true", help="Skip the orthography checks"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Check the rows without writing anything",
+    )
+    args = parser.parse_args()
+
+    try:
+        mapping = parse_mapping(args.map)
+        automaton = None if args.no_lint else get_automaton()
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return 1
+    defaults = {"level": args.level, "topic": args.topic, "model": args.model}
+
+    writer = DeckWriter(args.decks_dir, args.batch_size, args.dry_run)
+    try:
+        stats, errors = import_table(
+            args.table, writer, mapping, defaults, automaton, args.delimiter
+        )
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+    for error in errors:
+        print(error)
+    action = "Would write" if args.dry_run else "Wrote"
+    for path, count in sorted(writer.counts.items()):
+        created = " (new)" if path in writer.created else ""
+        print(f"{action} {count} notes to {path}{created}")
+    print(
+        f"Imported {stats['imported']} rows into {len(writer.counts)} deck files, "
+        f"skipped {stats['skipped']} rows with errors"
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
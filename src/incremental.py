@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+incremental.py.
+
+Incremental builds of aggregate packages (per-level, uber and chunk modes).
+Every aggregate package gets an index under output/index/ recording, for each source
+file, its hash and one entry per note: a hash of the note's TOML source, its GUID and a
+hash of the row it was rendered to. On the next build:
+- unchanged source files are neither read nor rendered; their notes are taken from the
+  previous package's collection database
+- changed source files are parsed, but only notes whose source hash changed are rendered
+- notes of removed source files simply drop out
+
+A cached row is only reused if it still hashes to the recorded row hash, so rows that
+were modified after rendering (for example tags merged by --dedup) are rendered again.
+The package is then written exactly like a clean build, so the result is byte-identical
+to a clean rebuild while the rendering work depends on the size of the change.
+
+Used by generate.py through the --incremental option.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import genanki
+
+from apkg import extract_collection
+
+# Directory, relative to the output directory, holding the package indexes
+INDEX_DIRNAME = "index"
+
+# Bump when the index layout changes so stale indexes force a clean build
+INDEX_VERSION = 1
+
+# Characters not allowed in index file names
+UNSAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def index_path(out_dir: str, key: str) -> str:
+    """
+    Return the index file of a build target.
+
+    Args:
+        out_dir: Output directory
+        key: Build target key
+
+    Returns:
+        Path of the target's index file
+    """
+    return os.path.join(out_dir, INDEX_DIRNAME, f"{UNSAFE_NAME_RE.sub('_', key)}.json")
+
+
+def load_index(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a package index.
+
+    Args:
+        path: Index file
+
+    Returns:
+        The index, or None if it is missing, unreadable or from another index version
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            index = json.load(f)
+    except (ValueError, OSError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def save_index(path: str, index: Dict[str, Any]) -> None:
+    """
+    Write a package index.
+
+    Args:
+        path: Index file
+        index: Index with 'fingerprint', 'package_sha256' and 'sources' keys
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dict(index, version=INDEX_VERSION), f, sort_keys=True)
+
+
+def code_fingerprint(paths: List[str], *extra: str) -> str:
+    """
+    Hash the code and settings that determine how notes are rendered.
+
+    An index written under a different fingerprint is not reused.
+
+    Args:
+        paths: Source files of the rendering code
+        extra: Additional strings, such as library versions or the stylesheet hash
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    for value in extra:
+        digest.update(b"\x1f")
+        digest.update(value.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def card_hash(card: Dict[str, Any]) -> str:
+    """
+    Hash the TOML source of one card.
+
+    Args:
+        card: Card dictionary as loaded from a deck file
+
+    Returns:
+        Hex digest
+    """
+    encoded = json.dumps(card, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def row_hash(model_id: int, flds: str, tags: str) -> str:
+    """
+    Hash the collection row of a note.
+
+    Args:
+        model_id: Model ID of the note
+        flds: Fields as stored in the collection (separated by 0x1f)
+        tags: Tags as stored in the collection (space separated and padded)
+
+    Returns:
+        Hex digest
+    """
+    encoded = f"{model_id}\x1e{flds}\x1e{tags}".encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def note_row_hash(note: genanki.Note) -> str:
+    """
+    Hash the collection row a note is written as.
+
+    Args:
+        note: Rendered note
+
+    Returns:
+        Hex digest
+    """
+    return row_hash(note.model.model_id, note._format_fields(), note._format_tags())
+
+
+class NoteCache:
+    """
+    Rendered notes of a previous package, looked up through its index.
+
+    Args:
+        index: Index of the previous package, or None for an empty cache
+        apkg_path: Previous package, or None for an empty cache
+        models: Known models by model ID
+    """
+
+    def __init__(
+        self,
+        index: Optional[Dict[str, Any]],
+        apkg_path: Optional[str],
+        models: Dict[int, genanki.Model],
+    ):
+        """Load the rows of the previous package's notes into memory."""
+        self.models = models
+        self.rows: Dict[str, Tuple[int, str, str]] = {}
+        self.by_card: Dict[str, Tuple[str, str]] = {}
+        self.reused = 0
+        if index is None or apkg_path is None:
+            return
+
+        for source in index.get("sources", []):
+            for source_hash, guid, expected in source.get("notes", []):
+                self.by_card[source_hash] = (guid, expected)
+
+        fd, db_path = tempfile.mkstemp(suffix=".anki2")
+        os.close(fd)
+        try:
+            extract_collection(apkg_path, db_path)
+            conn = sqlite3.connect(db_path)
+            try:
+                for guid, mid, flds, tags in conn.execute(
+                    "SELECT guid, mid, flds, tags FROM notes"
+                ):
+                    self.rows[guid] = (mid, flds, tags)
+            finally:
+                conn.close()
+        finally:
+            os.remove(db_path)
+
+    def _matches(self, guid: str, expected: str) -> bool:
+        """Check that a cached row exists, has a known model and is unmodified."""
+        row = self.rows.get(guid)
+        return row is not None and row[0] in self.models and row_hash(*row) == expected
+
+    def restore(self, guid: str, expected: str) -> Optional[genanki.Note]:
+        """
+        Rebuild a note from its cached collection row.
+
+        Args:
+            guid: GUID of the note
+            expected: Row hash recorded when the note was rendered
+
+        Returns:
+            The note, or None if the row is missing or no longer matches
+        """
+        if not self._matches(guid, expected):
+            return None
+        mid, flds, tags = self.rows[guid]
+        self.reused += 1
+        return genanki.Note(
+            model=self.models[mid],
+            fields=flds.split("\x1f"),
+            tags=tags.split(),
+            guid=guid,
+        )
+
+    def lookup(self, source_hash: str) -> Optional[genanki.Note]:
+        """
+        Find the rendered note of a card source, wherever it was rendered before.
+
+        Args:
+            source_hash: Hash of the card source, as returned by card_hash
+
+        Returns:
+            The note, or None if the card has to be rendered
+        """
+        entry = self.by_card.get(source_hash)
+        if entry is None:
+            return None
+        return self.restore(*entry)
+
+    def restore_source(self, entries: List[List[str]]) -> Optional[List[genanki.Note]]:
+        """
+        Rebuild all notes of an unchanged source file.
+
+        Args:
+            entries: The source's index entries of [source hash, GUID, row hash]
+
+        Returns:
+            The notes in source order, or None if any of them has to be rendered
+        """
+        if not all(self._matches(guid, expected) for _, guid, expected in entries):
+            return None
+        return [self.restore(guid, expected) for _, guid, expected in entries]
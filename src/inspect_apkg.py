@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+inspect_apkg.py.
+
+Inspects Anki packages (.apkg) and compares them note by note.
+Only the collection database is taken out of a package: it is streamed to a temporary
+file (decompressed for the latest format) and opened read-only, while media files stay
+in the zip. Both the legacy collection schema and the one of Anki 2.1.50+ exports are
+understood.
+
+The diff walks the notes of both packages in GUID order side by side, so it never holds
+more than one note of each package in memory:
+- '+' notes only in the new package
+- '-' notes only in the old package
+- '~' notes whose fields, tags, model or deck changed
+
+Usage:
+  python inspect_apkg.py info italian-a1-v1.3.0.apkg
+  python inspect_apkg.py diff italian-a1-v1.3.0.apkg italian-a1-v1.3.1.apkg
+  python inspect_apkg.py diff old.apkg new.apkg --json    # one JSON object per change
+  python inspect_apkg.py diff old.apkg new.apkg --summary # only the counts
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import textwrap
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from apkg import SCHEMA_TABLES, extract_collection
+
+# Collection databases, by preference
+COLLECTION_NAMES = ("collection.anki21b", "collection.anki21", "collection.anki2")
+
+# Characters of a field shown in text output
+FIELD_WIDTH = 100
+
+
+class NoteRow(NamedTuple):
+    """One note of a package, with its model and deck resolved to names."""
+
+    guid: str
+    model: str
+    deck: str
+    fields: List[str]
+    tags: List[str]
+
+
+class NoteChange(NamedTuple):
+    """One difference between two packages: 'added', 'removed' or 'changed'."""
+
+    change: str
+    guid: str
+    old: Optional[NoteRow]
+    new: Optional[NoteRow]
+
+
+class PackageReader:
+    """
+    Read-only access to the collection database of a package.
+
+    Use as a context manager; the temporary copy of the database is removed on exit.
+
+    Args:
+        apkg_path: Package to read
+    """
+
+    def __init__(self, apkg_path: str):
+        """Extract the collection of a package and open it read-only."""
+        self.apkg_path = apkg_path
+        with zipfile.ZipFile(apkg_path) as zf:
+            names = zf.namelist()
+        found = [name for name in COLLECTION_NAMES if name in names]
+        if not found:
+            raise ValueError(f"{apkg_path} has no collection database")
+        self.collection = found[0]
+        self.media = sum(1 for name in names if name.isdigit())
+
+        fd, self._db_path = tempfile.mkstemp(suffix=".anki2")
+        os.close(fd)
+        try:
+            extract_collection(apkg_path, self._db_path, self.collection)
+            uri = f"{Path(self._db_path).as_uri()}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True)
+            self.schema = self.conn.execute("SELECT ver FROM col").fetchone()[0]
+            self.models = self._names("notetypes", "models")
+            self.decks = self._names("decks", "decks")
+        except sqlite3.Error as e:
+            self.close()
+            raise ValueError(f"{apkg_path} is not a readable Anki collection: {str(e)}")
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self) -> "PackageReader":
+        """Return the reader itself."""
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        """Close the reader."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the database and remove its temporary copy."""
+        if hasattr(self, "conn"):
+            self.conn.close()
+        if os.path.exists(self._db_path):
+            os.remove(self._db_path)
+
+    def _names(self, table: str, column: str) -> Dict[int, str]:
+        """Map the IDs of note types or decks to their names."""
+        if self.schema >= SCHEMA_TABLES:
+            rows = self.conn.execute(f"SELECT id, name FROM {table}")  # nosec B608
+            return {oid: name.replace("\x1f", "::") for oid, name in rows}
+        query = f"SELECT {column} FROM col"  # nosec B608
+        (data,) = self.conn.execute(query).fetchone()
+        return {
+            int(oid): entry.get("name", "") for oid, entry in json.loads(data).items()
+        }
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Summarize the package.
+
+        Returns:
+            Collection name and schema, note, card and media counts, and the note
+            counts per deck and per model
+        """
+        notes, cards = self.conn.execute(
+            "SELECT (SELECT COUNT(*) FROM notes), (SELECT COUNT(*) FROM cards)"
+        ).fetchone()
+        decks: Dict[str, int] = {}
+        for did, count in self.conn.execute(
+            "SELECT did, COUNT(DISTINCT nid) FROM cards GROUP BY did"
+        ):
+            name = self.decks.get(did, str(did))
+            decks[name] = decks.get(name, 0) + count
+        models: Dict[str, int] = {}
+        for mid, count in self.conn.execute(
+            "SELECT mid, COUNT(*) FROM notes GROUP BY mid"
+        ):
+            name = self.models.get(mid, str(mid))
+            models[name] = models.get(name, 0) + count
+        return {
+            "package": self.apkg_path,
+            "collection": self.collection,
+            "schema": self.schema,
+            "notes": notes,
+            "cards": cards,
+            "media": self.media,
+            "decks": dict(sorted(decks.items())),
+            "models": dict(sorted(models.items())),
+        }
+
+    def iter_notes(self) -> Iterator[NoteRow]:
+        """
+        Stream the notes of the package.
+
+        Yields:
+            Notes in GUID order; the deck is the one holding the note's first card
+        """
+        rows = self.conn.execute(
+            "SELECT n.guid, n.mid, n.flds, n.tags, "
+            "(SELECT c.did FROM cards c WHERE c.nid = n.id ORDER BY c.ord LIMIT 1) "
+            "FROM notes n ORDER BY n.guid"
+        )
+        for guid, mid, flds, tags, did in rows:
+            yield NoteRow(
+                guid,
+                self.models.get(mid, str(mid)),
+                self.decks.get(did, str(did)),
+                flds.split("\x1f"),
+                tags.split(),
+            )
+
+
+def diff_notes(old: Iterator[NoteRow], new: Iterator[NoteRow]) -> Iterator[NoteChange]:
+    """
+    Compare two GUID-ordered note streams.
+
+    Args:
+        old: Notes of the old package, in GUID order
+        new: Notes of the new package, in GUID order
+
+    Yields:
+        Changes in GUID order
+    """
+    old_note = next(old, None)
+    new_note = next(new, None)
+    while old_note is not None or new_note is not None:
+        if old_note is not None and (new_note is None or old_note.guid < new_note.guid):
+            yield NoteChange("removed", old_note.guid, old_note, None)
+            old_note = next(old, None)
+        elif new_note is not None and (
+            old_note is None or new_note.guid < old_note.guid
+        ):
+            yield NoteChange("added", new_note.guid, None, new_note)
+            new_note = next(new, None)
+        elif old_note is not None and new_note is not None:
+            if old_note != new_note:
+                yield NoteChange("changed", new_note.guid, old_note, new_note)
+            old_note = next(old, None)
+            new_note = next(new, None)
+
+
+def shorten(text: str) -> str:
+    """Shorten a field for text output."""
+    return repr(textwrap.shorten(text, FIELD_WIDTH, placeholder="..."))
+
+
+def describe_change(change: NoteChange) -> List[str]:
+    """
+    Describe a change for text output.
+
+    Args:
+        change: Change to describe
+
+    Returns:
+        A header line, followed for changed notes by one line per difference
+    """
+    note = change.new or change.old
+    if note is None:
+        raise ValueError(f"Change {change.guid} has neither an old nor a new note")
+    marker = {"added": "+", "removed": "-", "changed": "~"}[change.change]
+    front = note.fields[0] if note.fields else ""
+    lines = [f"{marker} {change.guid} [{note.deck}] {shorten(front)}"]
+    if change.old is None or change.new is None:
+        return lines
+
+    old, new = change.old, change.new
+    for attribute in ("model", "deck"):
+        before, after = getattr(old, attribute), getattr(new, attribute)
+        if before != after:
+            lines.append(f"    {attribute}: {before} -> {after}")
+    for number in range(max(len(old.fields), len(new.fields))):
+        before = old.fields[number] if number < len(old.fields) else ""
+        after = new.fields[number] if number < len(new.fields) else ""
+        if before != after:
+            lines.append(
+                f"    field {number + 1}: {shorten(before)} -> {shorten(after)}"
+            )
+    if old.tags != new.tags:
+        lines.append(f"    tags: {' '.join(old.tags)} -> {' '.join(new.tags)}")
+    return lines
+
+
+def change_to_json(change: NoteChange) -> Dict[str, Any]:
+    """
+    Describe a change for JSON output.
+
+    Args:
+        change: Change to describe
+
+    Returns:
+        Dictionary with the change, the GUID and the old and new note
+    """
+    return {
+        "change": change.change,
+        "guid": change.guid,
+        "old": change.old._asdict() if change.old else None,
+        "new": change.new._asdict() if change.new else None,
+    }
+
+
+def print_info(info: Dict[str, Any]) -> None:
+    """Print the summary of a package."""
+    print(f"{info['package']}: {info['collection']} (schema {info['schema']})")
+    print(
+        f"  {info['notes']} notes, {info['cards']} cards, {info['media']} media files"
+    )
+    for label in ("decks", "models"):
+        print(f"  {label}:")
+        for name, count in info[label].items():
+            print(f"    {count:7}  {name}")
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 for success, non-zero for errors)
+    """
+    parser = argparse.ArgumentParser(description="Inspect and compare Anki packages")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info_parser = commands.add_parser("info", help="summarize packages")
+    info_parser.add_argument("packages", nargs="+", help="packages to summarize")
+    info_parser.add_argument("--json", action="store_true", help="print JSON")
+    diff_parser = commands.add_parser("diff", help="compare two packages note by note")
+    diff_parser.add_argument("old", help="old package")
+    diff_parser.add_argument("new", help="new package")
+    diff_parser.add_argument(
+        "--json", action="store_true", help="print one JSON object per change"
+    )
+    diff_parser.add_argument(
+        "--summary", action="store_true", help="only print the number of changes"
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.command == "info":
+            for path in args.packages:
+                with PackageReader(path) as reader:
+                    info = reader.info()
+                if args.json:
+                    print(json.dumps(info, ensure_ascii=False))
+                else:
+                    print_info(info)
+            return 0
+
+        counts = {"added": 0, "removed": 0, "changed": 0}
+        with PackageReader(args.old) as old, PackageReader(args.new) as new:
+            for change in diff_notes(old.iter_notes(), new.iter_notes()):
+                counts[change.change] += 1
+                if args.summary:
+                    continue
+                if args.json:
+                    print(json.dumps(change_to_json(change), ensure_ascii=False))
+                else:
+                    print("\n".join(describe_change(change)))
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+    if not args.json:
+        print(
+            f"{counts['added']} added, {counts['removed']} removed, "
+            f"{counts['changed']} changed"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
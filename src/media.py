@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+media.py.
+
+Content-addressed media store shared by all package modes.
+Notes attach audio and images with a 'media' list of paths relative to the media/
+directory next to decks/. Every file is copied once into output/media/ under a name
+derived from its content (<sha256 prefix>.<ext>), so a file used by many notes, decks
+or build modes is stored and hashed once per build, and editing a file gives it a new
+name that Anki picks up on import. Packages read their media straight from the store
+when they are zipped; formats that are already compressed are stored in the zip
+without recompression.
+
+Used by generate.py, apkg.py and validate.py.
+"""
+import hashlib
+import os
+import re
+import shutil
+from typing import Dict, Iterable, Tuple
+
+import genanki
+
+# Media files referenced by notes, next to the decks directory
+MEDIA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "media"
+)
+
+# Directory, relative to the output directory, holding the content-addressed media
+MEDIA_DIRNAME = "media"
+
+# Hex digits of the SHA-256 used in stored names
+NAME_LENGTH = 16
+
+# Supported media, by extension
+AUDIO_EXTENSIONS = {".flac", ".m4a", ".mp3", ".oga", ".ogg", ".opus", ".wav"}
+IMAGE_EXTENSIONS = {".gif", ".jpeg", ".jpg", ".png", ".svg", ".webp"}
+
+# Formats that are already compressed and gain nothing from deflate
+COMPRESSED_EXTENSIONS = {
+    ".flac",
+    ".gif",
+    ".jpeg",
+    ".jpg",
+    ".m4a",
+    ".mp3",
+    ".oga",
+    ".ogg",
+    ".opus",
+    ".png",
+    ".webp",
+}
+
+# Matches references to stored media in rendered fields
+REFERENCE_RE = re.compile(
+    r'\[sound:([0-9a-f]{%d}\.[a-z0-9]+)\]|<img src="([0-9a-f]{%d}\.[a-z0-9]+)">'
+    % (NAME_LENGTH, NAME_LENGTH)
+)
+
+
+def resolve_media(rel: str, media_dir: str = MEDIA_DIR) -> str:
+    """
+    Resolve a media path of a note.
+
+    Args:
+        rel: Path relative to the media directory, as written in the deck file
+        media_dir: Media directory
+
+    Returns:
+        Absolute path of the media file
+
+    Raises:
+        ValueError: If the path leaves the media directory, has an unsupported
+            extension or does not exist
+    """
+    root = os.path.abspath(media_dir)
+    path = os.path.normpath(os.path.join(root, rel))
+    if os.path.isabs(rel) or not path.startswith(root + os.sep):
+        raise ValueError(f"Media path '{rel}' must be relative to {media_dir}")
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in AUDIO_EXTENSIONS | IMAGE_EXTENSIONS:
+        raise ValueError(f"Unsupported media type '{extension}' of '{rel}'")
+    if not os.path.isfile(path):
+        raise ValueError(f"Media file not found: {path}")
+    return path
+
+
+def media_markup(name: str) -> str:
+    """
+    Build the markup that references a stored media file from a field.
+
+    Args:
+        name: Stored name
+
+    Returns:
+        An Anki sound tag for audio, an image tag otherwise
+    """
+    if os.path.splitext(name)[1] in AUDIO_EXTENSIONS:
+        return f"[sound:{name}]"
+    return f'<img src="{name}">'
+
+
+def is_compressed(name: str) -> bool:
+    """
+    Tell whether a media file is already compressed.
+
+    Args:
+        name: File name
+
+    Returns:
+        True if deflating the file would not make it smaller
+    """
+    return os.path.splitext(name)[1].lower() in COMPRESSED_EXTENSIONS
+
+
+def media_fingerprint(media_dir: str = MEDIA_DIR) -> str:
+    """
+    Fingerprint the media directory from file names, sizes and modification times.
+
+    Args:
+        media_dir: Media directory
+
+    Returns:
+        Hex digest, which changes whenever a media file is added, removed or edited
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(media_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            rel = os.path.relpath(path, media_dir).replace(os.sep, "/")
+            digest.update(f"{rel}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+class MediaStore:
+    """
+    Content-addressed copies of the media files referenced by notes.
+
+    Args:
+        out_dir: Output directory; media is stored in its media/ subdirectory
+        media_dir: Directory the media paths of notes are relative to
+    """
+
+    def __init__(self, out_dir: str, media_dir: str = MEDIA_DIR):
+        """Point the store at its directory; files are copied as notes use them."""
+        self.store_dir = os.path.join(out_dir, MEDIA_DIRNAME)
+        self.media_dir = media_dir
+        self.added = 0
+        self._names: Dict[Tuple[str, int, int], str] = {}
+
+    def path(self, name: str) -> str:
+        """
+        Locate a stored media file.
+
+        Args:
+            name: Stored name
+
+        Returns:
+            Path of the store entry
+        """
+        return os.path.join(self.store_dir, name)
+
+    def add(self, rel: str) -> str:
+        """
+        Store a media file, unless a file with the same content is stored already.
+
+        Files are hashed once per build; unchanged files are recognized by their size
+        and modification time.
+
+        Args:
+            rel: Path relative to the media directory
+
+        Returns:
+            Stored name
+
+        Raises:
+            ValueError: If the path is invalid (see resolve_media)
+        """
+        path = resolve_media(rel, self.media_dir)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        name = self._names.get(key)
+        if name is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 16), b""):
+                    digest.update(block)
+            extension = os.path.splitext(path)[1].lower()
+            name = f"{digest.hexdigest()[:NAME_LENGTH]}{extension}"
+            stored = self.path(name)
+            if not os.path.exists(stored):
+                os.makedirs(self.store_dir, exist_ok=True)
+                shutil.copyfile(path, f"{stored}.tmp")
+                os.replace(f"{stored}.tmp", stored)
+                self.added += 1
+            self._names[key] = name
+        return name
+
+    def referenced(self, decks: Iterable[genanki.Deck]) -> Dict[str, str]:
+        """
+        Collect the store entries referenced by the notes of decks.
+
+        Notes restored from a previous package are covered as well, since their
+        fields carry the same references.
+
+        Args:
+            decks: Decks of a package
+
+        Returns:
+            Dictionary mapping stored names to store paths, sorted by name
+
+        Raises:
+            ValueError: If a referenced file is missing from the store
+        """
+        media: Dict[str, str] = {}
+        for deck in decks:
+            for note in deck.notes:
+                for field in note.fields:
+                    for match in REFERENCE_RE.finditer(field):
+                        name = match.group(1) or match.group(2)
+                        if name in media:
+                            continue
+                        stored = self.path(name)
+                        if not os.path.isfile(stored):
+                            raise ValueError(
+                                f"Media file {name} is missing from {self.store_dir}"
+                            )
+                        media[name] = stored
+        return dict(sorted(media.items()))
+
+
+def install_media(media: Dict[str, str], target_dir: str) -> int:
+    """
+    Copy stored media into a collection's media folder.
+
+    Args:
+        media: Dictionary mapping stored names to store paths
+        target_dir: Media folder (collection.media next to collection.anki2)
+
+    Returns:
+        Number of files copied; files already present are skipped
+    """
+    copied = 0
+    for name, stored in media.items():
+        target = os.path.join(target_dir, name)
+        if not os.path.exists(target):
+            os.makedirs(target_dir, exist_ok=True)
+            shutil.copyfile(stored, target)
+            copied += 1
+    return copied
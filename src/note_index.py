@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+note_index.py.
+
+Inverted index over the notes of all deck files, queried by generate.py --select.
+For every note the index records its level, topic, model and tags. The per-file data is
+persisted next to the decks and keyed by the content hash from the deck catalog, so only
+deck files that changed since the last run are parsed again. Posting lists are built in
+memory once per run and every query is answered from them.
+
+Query syntax:
+  tag:verbi_*          notes with a tag matching the glob
+  level:a2             notes of a level
+  topic:verbi_*        notes of the deck files whose topic matches the glob
+  model:cloze          notes of a model
+  AND, OR, NOT, (...)  combine terms; adjacent terms are combined with AND
+
+Usage:
+  python note_index.py "tag:verbi_* AND level:a2"          # list matching deck files
+  python note_index.py "topic:verbi_* AND NOT model:cloze" --json
+"""
+import argparse
+import fnmatch
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from conjugations import iter_deck_notes
+from deck_catalog import get_catalog
+from deck_schema import get_schema
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# Name of the persisted index file, stored in the root of the decks directory
+INDEX_FILENAME = ".note_index.json"
+
+# Bump when the persisted layout changes so stale indexes are rebuilt
+INDEX_VERSION = 1
+
+# Note attributes that can be queried
+FIELDS = ("tag", "level", "topic", "model")
+
+# Splits a query into parentheses and words
+TOKEN_RE = re.compile(r"\s*(\(|\)|[^\s()]+)")
+
+# Parsed query: ("term", field, pattern), ("not", query), ("and"|"or", left, right)
+Query = Tuple[Any, ...]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a query into tokens.
+
+    Args:
+        text: Query text
+
+    Returns:
+        List of tokens
+    """
+    return TOKEN_RE.findall(text)
+
+
+def parse_query(text: str) -> Query:
+    """
+    Parse a select query.
+
+    NOT binds tighter than AND, which binds tighter than OR.
+
+    Args:
+        text: Query text, for example 'tag:verbi_* AND level:a2'
+
+    Returns:
+        Parsed query
+
+    Raises:
+        ValueError: If the query is malformed
+    """
+    tokens = tokenize(text)
+    pos = 0
+
+    def peek() -> Optional[str]:
+        return tokens[pos] if pos < len(tokens) else None
+
+    def keyword(token: Optional[str]) -> str:
+        return token.upper() if token and token.upper() in ("AND", "OR", "NOT") else ""
+
+    def parse_or() -> Query:
+        nonlocal pos
+        left = parse_and()
+        while keyword(peek()) == "OR":
+            pos += 1
+            left = ("or", left, parse_and())
+        return left
+
+    def parse_and() -> Query:
+        nonlocal pos
+        left = parse_not()
+        while True:
+            token = peek()
+            if keyword(token) == "AND":
+                pos += 1
+            elif token is None or token == ")" or keyword(token) == "OR":
+                return left
+            left = ("and", left, parse_not())
+
+    def parse_not() -> Query:
+        nonlocal pos
+        if keyword(peek()) == "NOT":
+            pos += 1
+            return ("not", parse_not())
+        return parse_atom()
+
+    def parse_atom() -> Query:
+        nonlocal pos
+        token = peek()
+        if token is None:
+            raise ValueError(f"Unexpected end of query: '{text}'")
+        pos += 1
+        if token == "(":
+            inner = parse_or()
+            if peek() != ")":
+                raise ValueError(f"Missing ')' in query: '{text}'")
+            pos += 1
+            return inner
+        field, sep, pattern = token.partition(":")
+        if not sep or not pattern or field not in FIELDS:
+            raise ValueError(
+                f"Invalid term '{token}', expected one of "
+                f"{', '.join(f + ':<glob>' for f in FIELDS)}"
+            )
+        return ("term", field, pattern)
+
+    if not tokens:
+        raise ValueError("Empty query")
+    query = parse_or()
+    if peek() is not None:
+        raise ValueError(f"Unexpected '{peek()}' in query: '{text}'")
+    return query
+
+
+def read_note_attributes(path: str) -> List[List[Any]]:
+    """
+    Read the model and tags of every note in a deck file.
+
+    Args:
+        path: Path to the deck file
+
+    Returns:
+        One [model, tags] pair per note, in the order generate.iter_cards yields
+        the cards of the file's DeckSource
+
+    Raises:
+        ValueError: If the file cannot be read or parsed
+    """
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        raise ValueError(f"Failed to parse file {path}: {str(e)}")
+    default_model = data.get("model", get_schema().default_model)
+    level = os.path.basename(os.path.dirname(path))
+    topic = os.path.splitext(os.path.basename(path))[0]
+    return [
+        [note.get("model", default_model), list(note.get("tags", []))]
+        for note in iter_deck_notes(data, level, topic)
+    ]
+
+
+class NoteIndex:
+    """
+    Inverted index from note attributes to the notes of a decks directory.
+
+    Notes are numbered in catalog order; each number maps back to a deck file and the
+    position of the note in that file.
+    """
+
+    def __init__(self, decks_dir: str, cache_path: Optional[str] = None):
+        """
+        Open the index for a decks directory.
+
+        Args:
+            decks_dir: Root directory containing one subdirectory per level
+            cache_path: Optional location of the persisted index
+                (defaults to <decks_dir>/.note_index.json)
+        """
+        self.catalog = get_catalog(decks_dir)
+        self.cache_path = cache_path or os.path.join(
+            self.catalog.decks_dir, INDEX_FILENAME
+        )
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._load()
+
+        self.paths: List[str] = []
+        self.notes: List[Tuple[int, int]] = []
+        self.postings: Dict[str, Dict[str, Set[int]]] = {f: {} for f in FIELDS}
+        self._build()
+
+    def _load(self) -> None:
+        """Load the persisted index, ignoring it if it is missing or unreadable."""
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError, OSError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        self._files = data.get("files", {})
+
+    def save(self) -> None:
+        """Persist the per-file note attributes if any file was parsed again."""
+        self.catalog.save()
+        if not self._dirty:
+            return
+        data = {"version": INDEX_VERSION, "files": self._files}
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+            self._dirty = False
+        except OSError as e:
+            print(f"Warning: Could not write note index {self.cache_path}: {str(e)}")
+
+    def _build(self) -> None:
+        """Refresh changed deck files and build the posting lists."""
+        seen = set()
+        for entry in self.catalog.entries():
+            rel = os.path.relpath(entry.path, self.catalog.decks_dir).replace(
+                os.sep, "/"
+            )
+            seen.add(rel)
+            cached = self._files.get(rel)
+            if cached is None or cached["sha256"] != entry.sha256:
+                try:
+                    notes = read_note_attributes(entry.path)
+                except ValueError as e:
+                    print(f"Warning: {str(e)}")
+                    continue
+                cached = {"sha256": entry.sha256, "notes": notes}
+                self._files[rel] = cached
+                self._dirty = True
+
+            file_id = len(self.paths)
+            self.paths.append(entry.path)
+            for position, (model, tags) in enumerate(cached["notes"]):
+                note = len(self.notes)
+                self.notes.append((file_id, position))
+                self._post("level", entry.level, note)
+                self._post("topic", entry.topic, note)
+                self._post("model", model, note)
+                for tag in tags:
+                    self._post("tag", tag, note)
+
+        for rel in set(self._files) - seen:
+            del self._files[rel]
+            self._dirty = True
+
+    def _post(self, field: str, value: str, note: int) -> None:
+        """Add a note to the posting list of a field value."""
+        self.postings[field].setdefault(value, set()).add(note)
+
+    def evaluate(self, query: Query) -> Set[int]:
+        """
+        Evaluate a parsed query.
+
+        Args:
+            query: Query returned by parse_query
+
+        Returns:
+            Numbers of the matching notes
+        """
+        kind = query[0]
+        if kind == "term":
+            _, field, pattern = query
+            matched: Set[int] = set()
+            for value, notes in self.postings[field].items():
+                if fnmatch.fnmatchcase(value, pattern):
+                    matched |= notes
+            return matched
+        if kind == "not":
+            return set(range(len(self.notes))) - self.evaluate(query[1])
+        left, right = self.evaluate(query[1]), self.evaluate(query[2])
+        return left & right if kind == "and" else left | right
+
+    def select(self, text: str) -> Dict[str, List[int]]:
+        """
+        Find the notes matching a query.
+
+        Args:
+            text: Query text
+
+        Returns:
+            Dictionary mapping deck file paths to the positions of their matching
+            notes, both in catalog order
+
+        Raises:
+            ValueError: If the query is malformed
+        """
+        result: Dict[str, List[int]] = {}
+        for note in sorted(self.evaluate(parse_query(text))):
+            file_id, position = self.notes[note]
+            result.setdefault(self.paths[file_id], []).append(position)
+        return result
+
+
+_INDEXES: Dict[str, NoteIndex] = {}
+
+
+def get_note_index(decks_dir: str) -> NoteIndex:
+    """
+    Return the shared note index for a decks directory, building it on first use.
+
+    Args:
+        decks_dir: Root directory containing one subdirectory per level
+
+    Returns:
+        The note index for that directory
+    """
+    key = os.path.abspath(decks_dir)
+    if key not in _INDEXES:
+        _INDEXES[key] = NoteIndex(key)
+        _INDEXES[key].save()
+    return _INDEXES[key]
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 for success, non-zero for errors)
+    """
+    parser = argparse.ArgumentParser(description="Query the notes of the deck files")
+    parser.add_argument("query", help="select query, for example 'tag:verbi_*'")
+    parser.add_argument("--decks-dir", default="decks", help="root of the decks tree")
+    parser.add_argument(
+        "--json", action="store_true", help="print matches as JSON lines"
+    )
+    args = parser.parse_args()
+
+    index = get_note_index(args.decks_dir)
+    try:
+        selection = index.select(args.query)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+    for path, positions in selection.items():
+        rel = os.path.relpath(path, index.catalog.decks_dir)
+        if args.json:
+            print(json.dumps({"path": rel, "notes": positions}))
+        else:
+            print(f"{len(positions):5} notes  {rel}")
+    if not args.json:
+        total = sum(len(positions) for positions in selection.values())
+        print(f"{total} notes in {len(selection)} deck files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
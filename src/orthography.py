@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+orthography.py.
+
+Italian orthography linter for the content of deck files.
+The rules in config/orthography.toml (missing accents such as "perche" for "perché",
+wrong accents, wrong apostrophe forms) are compiled into a single Aho-Corasick
+automaton, so every field is scanned in one pass regardless of the number of rules.
+Words match case-insensitively and only as whole words; a typographic apostrophe (’)
+matches a plain one.
+
+Used by validate.py.
+"""
+import os
+import sys
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# The rules live in the config directory of the repository root
+RULES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    "config",
+    "orthography.toml",
+)
+
+# Characters folded before matching, besides lowercasing
+FOLD = {"’": "'"}
+
+
+class Rule(NamedTuple):
+    """One misspelling and its correction."""
+
+    pattern: str
+    suggestion: str
+    message: str
+
+
+class Finding(NamedTuple):
+    """One misspelling found in a text."""
+
+    start: int
+    end: int
+    text: str
+    suggestion: str
+    message: str
+
+
+def fold(ch: str) -> str:
+    """
+    Normalize one character for matching.
+
+    Args:
+        ch: Character
+
+    Returns:
+        The lowercased character with typographic apostrophes folded; characters
+        whose lowercase form is longer than one character are kept as they are
+    """
+    ch = FOLD.get(ch, ch)
+    lower = ch.lower()
+    return lower if len(lower) == 1 else ch
+
+
+def fold_text(text: str) -> str:
+    """
+    Normalize a text for matching, keeping every character at its offset.
+
+    Args:
+        text: Text
+
+    Returns:
+        The folded text, as long as the original
+    """
+    folded = text.lower()
+    for original, replacement in FOLD.items():
+        folded = folded.replace(original, replacement)
+    if len(folded) != len(text):
+        folded = "".join(fold(ch) for ch in text)
+    return folded
+
+
+def load_rules(path: str = RULES_PATH) -> List[Rule]:
+    """
+    Load orthography rules.
+
+    Args:
+        path: Rules file with [[rules]] entries of 'message' and a 'replace' table
+
+    Returns:
+        List of rules
+
+    Raises:
+        ValueError: If the file cannot be read or a rule is malformed
+    """
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        raise ValueError(f"Failed to load orthography rules {path}: {str(e)}")
+
+    rules = []
+    seen: Dict[str, str] = {}
+    for idx, entry in enumerate(data.get("rules", []), start=1):
+        message = entry.get("message")
+        replace = entry.get("replace")
+        if not message or not isinstance(replace, dict):
+            raise ValueError(f"{path}: rule {idx} needs 'message' and 'replace'")
+        for pattern, suggestion in replace.items():
+            key = fold_text(pattern)
+            if key in seen:
+                raise ValueError(f"{path}: '{pattern}' is listed twice")
+            seen[key] = pattern
+            rules.append(Rule(key, suggestion, message))
+    return rules
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over a set of rules.
+
+    The failure links are resolved while compiling, so scanning takes one dictionary
+    lookup per character.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        """
+        Compile rules into an automaton.
+
+        Args:
+            rules: Rules to match; patterns must already be folded
+        """
+        self.rules = rules
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for rule_id, rule in enumerate(rules):
+            state = 0
+            for ch in rule.pattern:
+                if ch not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            outputs[state].append(rule_id)
+
+        # Breadth-first pass: complete every state's transitions with those of its
+        # failure state and inherit its outputs
+        self.delta: List[Dict[str, int]] = [dict(goto[0])]
+        self.delta.extend({} for _ in range(len(goto) - 1))
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state].extend(outputs[fail[state]])
+            self.delta[state] = dict(self.delta[fail[state]])
+            for ch, child in goto[state].items():
+                fail[child] = self.delta[fail[state]].get(ch, 0)
+                self.delta[state][ch] = child
+                queue.append(child)
+        self.outputs: List[Tuple[int, ...]] = [tuple(out) for out in outputs]
+
+    def scan(self, text: str) -> Iterator[Finding]:
+        """
+        Find all misspellings in a text.
+
+        Args:
+            text: Text to scan
+
+        Yields:
+            Findings in order of their end position
+        """
+        delta = self.delta
+        outputs = self.outputs
+        state = 0
+        for end, ch in enumerate(fold_text(text), start=1):
+            state = delta[state].get(ch, 0)
+            if not outputs[state]:
+                continue
+            for rule_id in outputs[state]:
+                rule = self.rules[rule_id]
+                start = end - len(rule.pattern)
+                before = text[start - 1] if start > 0 else " "
+                after = text[end] if end < len(text) else " "
+                if rule.pattern[0].isalnum() and before.isalnum():
+                    continue
+                if rule.pattern[-1].isalnum() and after.isalnum():
+                    continue
+                found = text[start:end]
+                suggestion = rule.suggestion
+                if found[0].isupper():
+                    suggestion = suggestion[0].upper() + suggestion[1:]
+                yield Finding(start, end, found, suggestion, rule.message)
+
+
+_AUTOMATA: Dict[str, Automaton] = {}
+
+
+def get_automaton(path: str = RULES_PATH) -> Optional[Automaton]:
+    """
+    Return the compiled automaton for a rules file, compiling it on first use.
+
+    Args:
+        path: Rules file
+
+    Returns:
+        The automaton, or None if the rules file does not exist
+
+    Raises:
+        ValueError: If the rules file is malformed
+    """
+    key = os.path.abspath(path)
+    if key not in _AUTOMATA:
+        if not os.path.exists(key):
+            return None
+        _AUTOMATA[key] = Automaton(load_rules(key))
+    return _AUTOMATA[key]
+
+
+def position(text: str, offset: int) -> Tuple[int, int]:
+    """
+    Convert an offset into a text to a line and column.
+
+    Args:
+        text: Text
+        offset: Character offset
+
+    Returns:
+        Tuple of (line, column), both starting at 1
+    """
+    line = text.count("\n", 0, offset) + 1
+    return line, offset - (text.rfind("\n", 0, offset) + 1) + 1
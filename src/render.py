@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+render.py.
+
+Renders card fields from Markdown to the HTML stored in Anki notes.
+Markdown is converted with the nl2br extension, then the HTML is post-processed:
+- the <p> wrapper around a single-paragraph field is removed
+- <br /> is shortened to <br>
+- newlines between block-level tags are dropped
+
+Fields containing <pre> blocks are left as rendered, since whitespace is significant there.
+
+Rendering goes through a chain of backends. Python-Markdown is the reference backend and
+renders every field; faster backends come first in the chain and render the fields they
+support with exactly the reference output, passing all other fields on. The chain is
+assembled from the backends whose dependencies are installed, and tests/test_render.py
+checks every backend against the reference on the deck files and on a fuzzed corpus.
+
+Also loads the shared card stylesheet (styles.css) that is attached to the note models.
+"""
+import hashlib
+import importlib.util
+import os
+import re
+from typing import Dict, List, Optional, Tuple, Type
+
+import markdown  # type: ignore
+
+# Identifies the Markdown renderer, so caches of rendered fields can be invalidated
+RENDERER_VERSION = f"markdown {markdown.__version__}"
+
+# Matches a field that is exactly one paragraph, with no nested paragraph tags
+SINGLE_PARAGRAPH_RE = re.compile(r"\A<p>((?:(?!</?p[\s>]).)*)</p>\Z", re.DOTALL)
+
+# Matches line break tags, including the newline nl2br leaves after them
+BR_RE = re.compile(r"<br\s*/?>\n?")
+
+# Matches whitespace containing a newline between two tags
+INTER_TAG_WHITESPACE_RE = re.compile(r">\s*\n\s*<")
+
+# Characters of plain text that no Markdown syntax is made of: no whitespace other
+# than spaces, no control characters and no emphasis, code, escape, HTML, link or
+# heading markers
+_PLAIN = r"(?:[^\s\x00-\x1f\x7f*\\`_<>&\[\]#]| )"
+
+# Emphasis spans whose content does not start or end with a space
+_SPAN = r"\*\*(?! ){0}+?(?<! )\*\*|\*(?! ){0}+?(?<! )\*".format(_PLAIN)
+
+# A line that cannot start a list, heading, rule, quote or code block and does not end
+# with a hard break; spans are never directly followed by another asterisk
+_LINE = r"(?![-+= ]|\d+\.)(?:{0}|(?:{1})(?!\*))+(?<! )".format(_PLAIN, _SPAN)
+
+# Matches the fields the inline backend renders: one paragraph of such lines
+INLINE_FIELD_RE = re.compile(r"{0}(?:\n{0})*".format(_LINE))
+
+# Matches strong and emphasized spans of inline fields
+STRONG_RE = re.compile(r"\*\*(.+?)\*\*")
+EM_RE = re.compile(r"\*(.+?)\*")
+
+
+def postprocess_html(html: str) -> str:
+    """
+    Remove redundant wrappers and whitespace from rendered HTML.
+
+    Args:
+        html: HTML produced by the Markdown renderer
+
+    Returns:
+        Equivalent, more compact HTML
+    """
+    html = html.strip()
+    if "<pre" in html:
+        return html
+
+    html = BR_RE.sub("<br>", html)
+    html = INTER_TAG_WHITESPACE_RE.sub("><", html)
+
+    match = SINGLE_PARAGRAPH_RE.match(html)
+    if match:
+        html = match.group(1)
+    return html
+
+
+class MarkdownBackend:
+    """
+    Interface of the Markdown rendering backends.
+
+    A backend renders a field to compact HTML, or declines fields using syntax it does
+    not support, which are then passed to the next backend of the chain.
+    """
+
+    # Name used to select the backend
+    name = ""
+
+    # Modules the backend needs; it is only used when they are installed
+    requires: Tuple[str, ...] = ()
+
+    @classmethod
+    def available(cls) -> bool:
+        """Tell whether the modules the backend needs are installed."""
+        return all(importlib.util.find_spec(module) for module in cls.requires)
+
+    def render(self, text: str) -> Optional[str]:
+        """
+        Render one card field.
+
+        Args:
+            text: Markdown source of the field
+
+        Returns:
+            Post-processed HTML, or None if the backend does not support the field
+        """
+        raise NotImplementedError
+
+
+class PythonMarkdownBackend(MarkdownBackend):
+    """Reference backend: Python-Markdown with the nl2br extension."""
+
+    name = "python-markdown"
+    requires = ("markdown",)
+
+    def __init__(self) -> None:
+        """Create the Markdown converter shared by all fields."""
+        # Use nl2br extension to convert newlines to HTML break tags
+        # This ensures that line breaks in the text (e.g., "Meaning: one\nExample:
+        # Ho uno libro") are properly rendered as visual line breaks in the HTML output.
+        # The converter is reused; reset() clears its state between fields
+        self._md = markdown.Markdown(extensions=["nl2br"])
+
+    def render(self, text: str) -> str:
+        """Render any field (see MarkdownBackend.render)."""
+        self._md.reset()
+        return postprocess_html(self._md.convert(text))
+
+
+class InlineBackend(MarkdownBackend):
+    """
+    Fast backend for the fields most notes consist of.
+
+    Renders a single paragraph of plain text with **strong** and *emphasized* spans
+    and line breaks, which covers almost every field of the decks, with a pair of
+    regular expressions. Fields with any other syntax are declined.
+    """
+
+    name = "inline"
+
+    def render(self, text: str) -> Optional[str]:
+        """Render an inline field (see MarkdownBackend.render)."""
+        if not INLINE_FIELD_RE.fullmatch(text):
+            return None
+        html = STRONG_RE.sub(r"<strong>\1</strong>", text)
+        html = EM_RE.sub(r"<em>\1</em>", html)
+        return html.replace("\n", "<br>")
+
+
+# Rendering backends by name, fastest first; the reference backend comes last
+BACKENDS: Dict[str, Type[MarkdownBackend]] = {
+    backend.name: backend for backend in (InlineBackend, PythonMarkdownBackend)
+}
+
+# Name of the backend whose output every other backend must reproduce
+REFERENCE_BACKEND = PythonMarkdownBackend.name
+
+
+def available_backends() -> List[str]:
+    """
+    List the backends whose dependencies are installed.
+
+    Returns:
+        Backend names, fastest first
+    """
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def select_backends(name: str = "auto") -> List[str]:
+    """
+    Choose the backends render_markdown uses.
+
+    Args:
+        name: 'auto' for every available backend, or the name of one backend, which
+            is then followed by the reference backend
+
+    Returns:
+        Names of the backends in the chain, in order
+
+    Raises:
+        ValueError: If the backend is unknown or its dependencies are not installed
+    """
+    global _CHAIN
+    if name == "auto":
+        names = available_backends()
+    elif name not in BACKENDS:
+        raise ValueError(
+            f"Unknown Markdown backend '{name}' (choose from {', '.join(BACKENDS)})"
+        )
+    elif not BACKENDS[name].available():
+        requires = ", ".join(BACKENDS[name].requires)
+        raise ValueError(f"The '{name}' Markdown backend requires {requires}")
+    else:
+        names = [name]
+    if REFERENCE_BACKEND not in names:
+        names.append(REFERENCE_BACKEND)
+    _CHAIN = [BACKENDS[backend]() for backend in names]
+    return names
+
+
+def render_markdown(text: str) -> str:
+    """
+    Render one card field from Markdown to compact HTML.
+
+    Args:
+        text: Markdown source of the field
+
+    Returns:
+        Post-processed HTML
+    """
+    for backend in _CHAIN:
+        html = backend.render(text)
+        if html is not None:
+            return html
+    raise ValueError(f"No Markdown backend rendered the field: {text!r}")
+
+
+def load_stylesheet(path: str) -> Tuple[str, str]:
+    """
+    Load the card stylesheet shared by all note models.
+
+    Args:
+        path: Path to the CSS file
+
+    Returns:
+        Tuple of (CSS text, first 8 hex digits of its SHA-256), or ("", "") if the
+        file does not exist
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            css = f.read().strip()
+    except FileNotFoundError:
+        return "", ""
+    if not css:
+        return "", ""
+    return css, hashlib.sha256(css.encode("utf-8")).hexdigest()[:8]
+
+
+# The stylesheet lives in the repository root, next to the src directory
+STYLESHEET_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "styles.css"
+)
+
+# Backends used by render_markdown (see select_backends)
+_CHAIN: List[MarkdownBackend] = []
+select_backends()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+search_index.py.
+
+Builds the static card search index of the documentation site.
+Every note of the deck files is reduced to plain text and tokenized, and the index is
+written as small JSON files under docs/card-index/, which mkdocs copies to the site:
+- index.json        manifest: note count, shard parameters and a stamp of the build
+- terms/<pp>.json   posting lists of all terms starting with the prefix <pp>, as
+                    delta-encoded note numbers
+- docs/<n>.json     plain-text front, back and deck of a block of notes
+
+The browser loader (docs/javascripts/card-search.js) fetches the manifest, one term
+shard per query word and the document blocks of the results it displays, so a query
+downloads a few kilobytes regardless of the size of the corpus.
+
+The plain text of every deck file is persisted next to the decks and keyed by the
+content hash from the deck catalog, so only deck files that changed since the last run
+are parsed again, and only shards whose content changed are rewritten.
+
+Usage:
+  python search_index.py                      # build or update docs/card-index/
+  python search_index.py --output-dir site/card-index
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from conjugations import iter_deck_notes
+from deck_catalog import get_catalog
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# Name of the persisted plain text of the notes, stored in the root of the decks tree
+CACHE_FILENAME = ".search_index.json"
+
+# Bump when the persisted or published layout changes so stale files are rebuilt
+INDEX_VERSION = 1
+
+# Terms are sharded by their first PREFIX_LENGTH characters; shorter terms are dropped
+PREFIX_LENGTH = 2
+
+# Notes per document block
+DOC_BLOCK_SIZE = 10
+
+# Characters of the front and back kept for displaying a result
+SNIPPET_LENGTH = 120
+
+# Matches combining accents left by NFKD normalization
+ACCENT_RE = re.compile("[\u0300-\u036f]")
+
+# Matches the words of folded text
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Markdown and HTML markup removed from fields, in order
+MARKUP = [
+    (re.compile(r"\{\{c\d+::(.*?)(?:::[^}]*)?\}\}", re.DOTALL), r"\1"),
+    (re.compile(r"!?\[([^\]]*)\]\([^)]*\)"), r"\1"),
+    (re.compile(r"<[^>]+>"), " "),
+    (re.compile(r"[*_`#>|~]+"), " "),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fold(text: str) -> str:
+    """
+    Fold text for matching: lowercase and without accents.
+
+    The browser loader folds queries the same way.
+
+    Args:
+        text: Text to fold
+
+    Returns:
+        Folded text
+    """
+    return ACCENT_RE.sub("", unicodedata.normalize("NFKD", text)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Args:
+        text: Plain text
+
+    Returns:
+        Folded words of at least PREFIX_LENGTH characters, in order
+    """
+    return [word for word in WORD_RE.findall(fold(text)) if len(word) >= PREFIX_LENGTH]
+
+
+def plain_text(markdown: str) -> str:
+    """
+    Reduce a field to plain text.
+
+    Args:
+        markdown: Markdown source of a field
+
+    Returns:
+        The text without markup, cloze deletions filled in
+    """
+    for pattern, replacement in MARKUP:
+        markdown = pattern.sub(replacement, markdown)
+    return markdown.strip()
+
+
+def read_note_texts(path: str) -> List[List[str]]:
+    """
+    Read the plain-text front and back of every note in a deck file.
+
+    Args:
+        path: Path to the deck file
+
+    Returns:
+        One [front, back] pair per note, in the order generate.iter_cards yields
+        the cards of the file's DeckSource
+
+    Raises:
+        ValueError: If the file cannot be read or parsed
+    """
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        raise ValueError(f"Failed to parse file {path}: {str(e)}")
+    level = os.path.basename(os.path.dirname(path))
+    topic = os.path.splitext(os.path.basename(path))[0]
+    texts = []
+    for note in iter_deck_notes(data, level, topic):
+        fields = note.get("fields", [])
+        front = fields[0] if fields else ""
+        back = fields[1] if len(fields) > 1 else note.get("back", "")
+        texts.append([plain_text(front), plain_text(back)])
+    return texts
+
+
+def snippet(text: str) -> str:
+    """
+    Shorten text for display.
+
+    Args:
+        text: Plain text
+
+    Returns:
+        The text, cut at SNIPPET_LENGTH characters
+    """
+    if len(text) <= SNIPPET_LENGTH:
+        return text
+    return text[: SNIPPET_LENGTH - 1].rstrip() + "…"
+
+
+def encode(data: Any) -> str:
+    """Serialize published data as compact JSON."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """
+    Write a file unless it already has the given content.
+
+    Args:
+        path: File to write
+        content: New content
+
+    Returns:
+        True if the file was written
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == content:
+                return False
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return True
+
+
+class SearchIndexBuilder:
+    """
+    Builds the card search index of a decks directory.
+
+    Notes are numbered in catalog order; the number of a note is its position in the
+    document blocks.
+    """
+
+    def __init__(self, decks_dir: str, cache_path: Optional[str] = None):
+        """
+        Open the builder for a decks directory.
+
+        Args:
+            decks_dir: Root directory containing one subdirectory per level
+            cache_path: Optional location of the persisted note texts
+                (defaults to <decks_dir>/.search_index.json)
+        """
+        self.catalog = get_catalog(decks_dir)
+        self.cache_path = cache_path or os.path.join(
+            self.catalog.decks_dir, CACHE_FILENAME
+        )
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self.parsed = 0
+        self._load()
+
+    def _load(self) -> None:
+        """Load the persisted note texts, ignoring them if missing or unreadable."""
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError, OSError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        self._files = data.get("files", {})
+
+    def save(self) -> None:
+        """Persist the note texts if any file was parsed again."""
+        self.catalog.save()
+        if not self._dirty:
+            return
+        data = {"version": INDEX_VERSION, "files": self._files}
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+            self._dirty = False
+        except OSError as e:
+            print(f"Warning: Could not write search cache {self.cache_path}: {str(e)}")
+
+    def documents(self) -> List[List[str]]:
+        """
+        Collect the notes of all deck files, parsing only changed files.
+
+        Returns:
+            One [front, back, deck] entry per note, in catalog order
+        """
+        documents: List[List[str]] = []
+        seen = set()
+        for entry in self.catalog.entries():
+            rel = os.path.relpath(entry.path, self.catalog.decks_dir).replace(
+                os.sep, "/"
+            )
+            seen.add(rel)
+            cached = self._files.get(rel)
+            if cached is None or cached["sha256"] != entry.sha256:
+                try:
+                    texts = read_note_texts(entry.path)
+                except ValueError as e:
+                    print(f"Warning: {str(e)}")
+                    continue
+                cached = {"sha256": entry.sha256, "notes": texts}
+                self._files[rel] = cached
+                self._dirty = True
+                self.parsed += 1
+            deck = f"{entry.level}/{entry.topic}"
+            documents.extend([front, back, deck] for front, back in cached["notes"])
+
+        for rel in set(self._files) - seen:
+            del self._files[rel]
+            self._dirty = True
+        return documents
+
+    def build(self, out_dir: str) -> Dict[str, int]:
+        """
+        Write the index files, leaving unchanged shards untouched.
+
+        Args:
+            out_dir: Directory the index is published in
+
+        Returns:
+            Counts of 'notes', 'terms', deck files 'parsed', shard files 'written'
+            and stale shard files 'removed'
+        """
+        documents = self.documents()
+        postings: Dict[str, List[int]] = {}
+        for number, (front, back, _) in enumerate(documents):
+            for term in set(tokenize(front) + tokenize(back)):
+                postings.setdefault(term, []).append(number)
+
+        files: Dict[str, str] = {}
+        shards: Dict[str, Dict[str, List[int]]] = {}
+        for term, numbers in postings.items():
+            deltas = [numbers[0]] + [b - a for a, b in zip(numbers, numbers[1:])]
+            shards.setdefault(term[:PREFIX_LENGTH], {})[term] = deltas
+        for prefix, terms in shards.items():
+            files[f"terms/{prefix}.json"] = encode(terms)
+        for start in range(0, len(documents), DOC_BLOCK_SIZE):
+            block = [
+                [snippet(front), snippet(back), deck]
+                for front, back, deck in documents[start : start + DOC_BLOCK_SIZE]
+            ]
+            files[f"docs/{start // DOC_BLOCK_SIZE}.json"] = encode(block)
+
+        stamp = hashlib.sha256()
+        for name in sorted(files):
+            stamp.update(f"{name}\0{files[name]}\0".encode("utf-8"))
+        manifest = {
+            "version": INDEX_VERSION,
+            "notes": len(documents),
+            "prefix": PREFIX_LENGTH,
+            "block": DOC_BLOCK_SIZE,
+            "stamp": stamp.hexdigest()[:12],
+        }
+        files["index.json"] = encode(manifest)
+
+        stats = {
+            "notes": len(documents),
+            "terms": len(postings),
+            "parsed": self.parsed,
+            "written": 0,
+            "removed": 0,
+        }
+        for subdir in ("terms", "docs"):
+            directory = os.path.join(out_dir, subdir)
+            os.makedirs(directory, exist_ok=True)
+            for name in os.listdir(directory):
+                if name.endswith(".json") and f"{subdir}/{name}" not in files:
+                    os.remove(os.path.join(directory, name))
+                    stats["removed"] += 1
+        for name, content in files.items():
+            if write_if_changed(os.path.join(out_dir, name), content):
+                stats["written"] += 1
+        self.save()
+        return stats
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 for success, non-zero for errors)
+    """
+    parser = argparse.ArgumentParser(description="Build the card search index")
+    parser.add_argument("--decks-dir", default="decks", help="root of the decks tree")
+    parser.add_argument(
+        "--output-dir",
+        default=os.path.join("docs", "card-index"),
+        help="directory the index is written to",
+    )
+    args = parser.parse_args()
+
+    builder = SearchIndexBuilder(args.decks_dir)
+    try:
+        stats = builder.build(args.output_dir)
+    except OSError as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+    print(
+        f"Indexed {stats['notes']} notes ({stats['terms']} terms), "
+        f"parsed {stats['parsed']} deck files, wrote {stats['written']} files, "
+        f"removed {stats['removed']} stale files in {args.output_dir}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
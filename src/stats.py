@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+stats.py.
+
+Corpus statistics for the deck files: notes per level and topic, field-length
+distribution, cloze share, largest notes and the chunk counts a --chunk-notes target
+would produce.
+
+The corpus is loaded column by column into compact arrays instead of one dictionary per
+note: level, topic and model codes, and offsets into one string buffer holding every
+field. Aggregates are computed over whole columns with C-level builtins (map, zip,
+Counter, itertools.compress, sorted), so a synthetic corpus of a million notes is
+summarized in about a second.
+
+Usage:
+  python stats.py                          # summary tables for all levels
+  python stats.py --level a1 --json        # one level, as JSON
+  python stats.py --chunk-notes 200        # include a chunk plan for 200 notes per deck
+  python stats.py --synthetic 1000000      # summarize a generated million-note corpus
+"""
+import argparse
+import bisect
+import heapq
+import itertools
+import json
+import operator
+import random
+import sys
+import time
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from conjugations import iter_deck_notes
+from deck_catalog import get_catalog
+from deck_schema import get_schema
+from render import render_markdown
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+# Percentiles reported for the field-length distribution
+PERCENTILES = (50, 90, 99)
+
+
+class Corpus:
+    """
+    Notes of a corpus stored as columns.
+
+    Note i has the codes level_code[i], topic_code[i] and model_code[i], which index
+    the levels, topics and models tables. Its front and back fields are the slices
+    offsets[2i]:offsets[2i+1] and offsets[2i+1]:offsets[2i+2] of the shared buffer.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty corpus."""
+        self.levels: List[str] = []
+        self.topics: List[str] = []
+        self.models: List[str] = []
+        self._codes: Dict[int, Dict[str, int]] = {}
+        self.level_code = array("H")
+        self.topic_code = array("I")
+        self.model_code = array("B")
+        self.offsets = array("Q", [0])
+        self._parts: List[str] = []
+        self._buffer = ""
+        self._lengths: Optional[Tuple[array, array, array]] = None
+
+    def __len__(self) -> int:
+        """Return the number of notes."""
+        return len(self.level_code)
+
+    def _code(self, table: List[str], value: str) -> int:
+        """Return the code of a value in a string table, adding it if needed."""
+        codes = self._codes.setdefault(id(table), {})
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(table)
+            table.append(value)
+        return code
+
+    def add_note(
+        self, level: str, topic: str, model: str, front: str, back: str
+    ) -> None:
+        """
+        Append one note.
+
+        Args:
+            level: Level of the note
+            topic: Topic of the note's deck file
+            model: Model name (basic or cloze)
+            front: Front field source
+            back: Back field source
+        """
+        self.level_code.append(self._code(self.levels, level))
+        self.topic_code.append(self._code(self.topics, topic))
+        self.model_code.append(self._code(self.models, model))
+        end = self.offsets[-1]
+        self.offsets.append(end + len(front))
+        self.offsets.append(end + len(front) + len(back))
+        self._parts.append(front)
+        self._parts.append(back)
+
+    @property
+    def buffer(self) -> str:
+        """Return the string buffer holding every field, joining new parts first."""
+        if self._parts:
+            self._buffer += "".join(self._parts)
+            self._parts = []
+        return self._buffer
+
+    def field(self, note: int, index: int) -> str:
+        """
+        Return one field of a note.
+
+        Args:
+            note: Note number
+            index: 0 for the front, 1 for the back field
+
+        Returns:
+            Field source text
+        """
+        start = 2 * note + index
+        return self.buffer[self.offsets[start] : self.offsets[start + 1]]
+
+    def field_lengths(self) -> Tuple[array, array, array]:
+        """
+        Compute the field lengths of every note from the offsets.
+
+        Returns:
+            Tuple of (front lengths, back lengths, total lengths)
+        """
+        if self._lengths is None or len(self._lengths[0]) != len(self):
+            offsets = self.offsets
+            lengths = array("I", map(operator.sub, offsets[1:], offsets[:-1]))
+            front, back = lengths[0::2], lengths[1::2]
+            self._lengths = (front, back, array("I", map(operator.add, front, back)))
+        return self._lengths
+
+
+def load_corpus(decks_dir: str, levels: Optional[List[str]] = None) -> Corpus:
+    """
+    Load the notes of the deck files into a columnar corpus.
+
+    Args:
+        decks_dir: Root of the decks tree
+        levels: Optional list of levels to load; all levels if omitted
+
+    Returns:
+        The loaded corpus
+    """
+    catalog = get_catalog(decks_dir)
+    schema_model = get_schema().default_model
+    corpus = Corpus()
+    for level, entries in catalog.by_level(levels).items():
+        for entry in entries:
+            try:
+                with open(entry.path, "rb") as f:
+                    data = tomllib.load(f)
+            except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+                print(f"Warning: Failed to parse file {entry.path}: {str(e)}")
+                continue
+            default_model = data.get("model", schema_model)
+            try:
+                notes = list(iter_deck_notes(data, level, entry.topic))
+            except ValueError as e:
+                print(f"Warning: {entry.path}: {str(e)}")
+                continue
+            for note in notes:
+                model = note.get("model", default_model)
+                fields = note.get("fields", [])
+                front = fields[0] if fields else ""
+                if model == "cloze":
+                    back = note.get("back", "")
+                else:
+                    back = fields[1] if len(fields) > 1 else ""
+                corpus.add_note(level, entry.topic, model, front, back)
+    catalog.save()
+    return corpus
+
+
+def synthetic_corpus(
+    size: int, seed: int = 0, levels: int = 4, topics: int = 200
+) -> Corpus:
+    """
+    Generate a corpus with random metadata and field lengths, for capacity planning.
+
+    Args:
+        size: Number of notes
+        seed: Random seed
+        levels: Number of levels
+        topics: Number of topics per level
+
+    Returns:
+        The generated corpus, with notes grouped by level
+    """
+    rng = random.Random(seed)
+    corpus = Corpus()
+    corpus.levels = [f"l{i}" for i in range(levels)]
+    corpus.topics = [f"topic_{i}" for i in range(topics)]
+    corpus.models = ["basic", "cloze"]
+    corpus.level_code = array("H", sorted(rng.choices(range(levels), k=size)))
+    corpus.topic_code = array("I", rng.choices(range(topics), k=size))
+    corpus.model_code = array("B", rng.choices((0, 1), weights=(3, 1), k=size))
+
+    # Field lengths are drawn from a log-normal pool, like the short fields of real decks
+    pool = [int(rng.lognormvariate(3.0, 0.6)) + 1 for _ in range(4096)]
+    lengths = rng.choices(pool, k=2 * size)
+    corpus.offsets = array("Q", itertools.accumulate(lengths, initial=0))
+    corpus._buffer = "x" * corpus.offsets[-1]
+    return corpus
+
+
+def counts_by_level_topic(corpus: Corpus) -> List[Dict[str, Any]]:
+    """
+    Count notes per level and topic.
+
+    Args:
+        corpus: Loaded corpus
+
+    Returns:
+        Rows with 'level', 'topic' and 'notes' keys, sorted by level and topic
+    """
+    counts = Counter(zip(corpus.level_code, corpus.topic_code))
+    rows = [
+        {"level": corpus.levels[lvl], "topic": corpus.topics[top], "notes": count}
+        for (lvl, top), count in counts.items()
+    ]
+    rows.sort(key=lambda row: (row["level"], row["topic"]))
+    return rows
+
+
+def describe_counts(counts: Counter) -> Dict[str, Any]:
+    """
+    Summarize a distribution given as value counts.
+
+    Field lengths take few distinct values, so percentiles are read from the
+    cumulative counts instead of sorting the whole column.
+
+    Args:
+        counts: Number of notes per length
+
+    Returns:
+        Dictionary with 'mean', 'max' and one 'p<N>' entry per percentile
+    """
+    total = sum(counts.values())
+    if not total:
+        return {"mean": 0, "max": 0, **{f"p{pct}": 0 for pct in PERCENTILES}}
+    values = sorted(counts)
+    summary: Dict[str, Any] = {
+        "mean": round(sum(v * counts[v] for v in values) / total, 1),
+        "max": values[-1],
+    }
+    cumulative = list(itertools.accumulate(counts[v] for v in values))
+    for pct in PERCENTILES:
+        rank = min(total - 1, total * pct // 100)
+        summary[f"p{pct}"] = values[bisect.bisect_right(cumulative, rank)]
+    return summary
+
+
+def length_summary(corpus: Corpus) -> Dict[str, Any]:
+    """
+    Summarize the distribution of field lengths.
+
+    Args:
+        corpus: Loaded corpus
+
+    Returns:
+        Dictionary with per-field means and percentiles, and a histogram of total
+        note lengths in power-of-two buckets
+    """
+    front, back, totals = corpus.field_lengths()
+    total_counts = Counter(totals)
+    result: Dict[str, Any] = {
+        "front": describe_counts(Counter(front)),
+        "back": describe_counts(Counter(back)),
+        "total": describe_counts(total_counts),
+    }
+
+    buckets: Counter = Counter()
+    for length, count in total_counts.items():
+        buckets[length.bit_length()] += count
+    result["histogram"] = [
+        {"from": (1 << bits) >> 1, "to": (1 << bits) - 1, "notes": buckets[bits]}
+        for bits in sorted(buckets)
+    ]
+    return result
+
+
+def cloze_share(corpus: Corpus) -> List[Dict[str, Any]]:
+    """
+    Compute the share of cloze notes per level and overall.
+
+    Args:
+        corpus: Loaded corpus
+
+    Returns:
+        Rows with 'level', 'notes', 'cloze' and 'share' keys; the last row covers
+        the whole corpus under the level 'all'
+    """
+    cloze = corpus.models.index("cloze") if "cloze" in corpus.models else -1
+    totals = Counter(corpus.level_code)
+    clozes = Counter(
+        itertools.compress(corpus.level_code, map(cloze.__eq__, corpus.model_code))
+    )
+    rows = []
+    for code in sorted(totals, key=lambda c: corpus.levels[c]):
+        rows.append((corpus.levels[code], totals[code], clozes[code]))
+    rows.append(("all", len(corpus), sum(clozes.values())))
+    return [
+        {
+            "level": level,
+            "notes": notes,
+            "cloze": count,
+            "share": round(count / notes, 4) if notes else 0.0,
+        }
+        for level, notes, count in rows
+    ]
+
+
+def largest_notes(corpus: Corpus, top: int = 10) -> List[Dict[str, Any]]:
+    """
+    Find the notes with the longest fields and measure their rendered HTML.
+
+    Candidates are selected on source length over the whole corpus; only the
+    selected notes are rendered.
+
+    Args:
+        corpus: Loaded corpus
+        top: Number of notes to report
+
+    Returns:
+        Rows with 'level', 'topic', 'source' and 'rendered' lengths and a 'preview'
+        of the front field, longest first
+    """
+    if top <= 0 or not len(corpus):
+        return []
+    totals = corpus.field_lengths()[2]
+    threshold = heapq.nlargest(top, totals)[-1]
+    candidates = itertools.compress(range(len(totals)), map(threshold.__le__, totals))
+    chosen = sorted(candidates, key=lambda i: (-totals[i], i))[:top]
+
+    rows = []
+    for note in chosen:
+        front_text, back_text = corpus.field(note, 0), corpus.field(note, 1)
+        rendered = len(render_markdown(front_text)) + len(render_markdown(back_text))
+        rows.append(
+            {
+                "level": corpus.levels[corpus.level_code[note]],
+                "topic": corpus.topics[corpus.topic_code[note]],
+                "source": totals[note],
+                "rendered": rendered,
+                "preview": front_text[:40].replace("\n", " "),
+            }
+        )
+    return rows
+
+
+def chunk_plan(corpus: Corpus, chunk_notes: int) -> List[Dict[str, Any]]:
+    """
+    Estimate the chunks generate.py --mode chunk --chunk-notes would build per level.
+
+    Args:
+        corpus: Loaded corpus
+        chunk_notes: Target number of notes per chunk
+
+    Returns:
+        Rows with 'level', 'notes', 'field_bytes', 'chunks' and 'notes_per_chunk' keys
+    """
+    totals = corpus.field_lengths()[2]
+    counts = Counter(corpus.level_code)
+    field_bytes: Counter = Counter()
+    for (code, length), count in Counter(zip(corpus.level_code, totals)).items():
+        field_bytes[code] += length * count
+    rows = []
+    for code in sorted(counts, key=lambda c: corpus.levels[c]):
+        notes = counts[code]
+        chunks = -(-notes // chunk_notes)
+        rows.append(
+            {
+                "level": corpus.levels[code],
+                "notes": notes,
+                "field_bytes": field_bytes[code],
+                "chunks": chunks,
+                "notes_per_chunk": round(notes / chunks, 1),
+            }
+        )
+    return rows
+
+
+def summarize(corpus: Corpus, top: int = 10, chunk_notes: int = 0) -> Dict[str, Any]:
+    """
+    Compute every statistic of a corpus.
+
+    Args:
+        corpus: Loaded corpus
+        top: Number of largest notes to report
+        chunk_notes: Target notes per chunk for the chunk plan (0 to skip it)
+
+    Returns:
+        JSON-serializable dictionary of statistics
+    """
+    summary = {
+        "notes": len(corpus),
+        "by_level_topic": counts_by_level_topic(corpus),
+        "lengths": length_summary(corpus),
+        "cloze": cloze_share(corpus),
+        "largest": largest_notes(corpus, top),
+    }
+    if chunk_notes > 0:
+        summary["chunks"] = chunk_plan(corpus, chunk_notes)
+    return summary
+
+
+def format_table(rows: List[Dict[str, Any]], columns: List[str]) -> List[str]:
+    """
+    Format rows as an aligned text table.
+
+    Args:
+        rows: Rows to format
+        columns: Keys to print, in order
+
+    Returns:
+        Lines of the table, including a header
+    """
+    cells = [columns] + [[str(row[col]) for col in columns] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    return [
+        "  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip()
+        for line in cells
+    ]
+
+
+def format_summary(summary: Dict[str, Any], max_topics: int = 50) -> str:
+    """
+    Render a summary as text tables.
+
+    Args:
+        summary: Statistics returned by summarize
+        max_topics: Maximum number of level/topic rows to print
+
+    Returns:
+        Printable text
+    """
+    lines = [f"{summary['notes']} notes", "", "Notes per level and topic:"]
+    topics = summary["by_level_topic"]
+    lines += format_table(topics[:max_topics], ["level", "topic", "notes"])
+    if len(topics) > max_topics:
+        lines.append(f"... {len(topics) - max_topics} more")
+
+    lengths = summary["lengths"]
+    lines += ["", "Field lengths (characters):"]
+    columns = ["mean"] + [f"p{pct}" for pct in PERCENTILES] + ["max"]
+    lines += format_table(
+        [dict(lengths[name], field=name) for name in ("front", "back", "total")],
+        ["field"] + columns,
+    )
+    lines += ["", "Note length histogram:"]
+    lines += format_table(lengths["histogram"], ["from", "to", "notes"])
+
+    lines += ["", "Cloze share:"]
+    lines += format_table(summary["cloze"], ["level", "notes", "cloze", "share"])
+
+    if summary["largest"]:
+        lines += ["", "Largest notes:"]
+        lines += format_table(
+            summary["largest"], ["level", "topic", "source", "rendered", "preview"]
+        )
+    if "chunks" in summary:
+        lines += ["", "Chunk plan:"]
+        lines += format_table(
+            summary["chunks"],
+            ["level", "notes", "field_bytes", "chunks", "notes_per_chunk"],
+        )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    """
+    Execute the main script functionality.
+
+    Returns:
+        Exit code (0 for success, non-zero for errors)
+    """
+    parser = argparse.ArgumentParser(description="Print corpus statistics")
+    parser.add_argument("--decks-dir", default="decks", help="root of the decks tree")
+    parser.add_argument(
+        "--level", action="append", help="only include this level (repeatable)"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON output")
+    parser.add_argument(
+        "--top", type=int, default=10, help="number of largest notes to report"
+    )
+    parser.add_argument(
+        "--chunk-notes",
+        type=int,
+        default=0,
+        help="also plan chunks of about this many notes per level",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        metavar="N",
+        help="summarize a generated corpus of N notes instead of the deck files",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="random seed for --synthetic"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.synthetic:
+        corpus = synthetic_corpus(args.synthetic, args.seed)
+    else:
+        corpus = load_corpus(args.decks_dir, args.level)
+    loaded = time.perf_counter()
+    summary = summarize(corpus, args.top, args.chunk_notes)
+    done = time.perf_counter()
+
+    if args.json:
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+    else:
+        print(format_summary(summary))
+        print(f"\nLoaded in {loaded - start:.2f}s, summarized in {done - loaded:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,22 +2,36 @@
 """
 validate.py.
 
-Validates deck files (TOML) to ensure they follow the project's schema requirements.
-Specifically, checks that each note has the correct tag structure:
-- Tags must be a list with exactly 2 elements
+Validates deck files (TOML) against the deck schema in config/deck_schema.toml
+(see deck_schema.py). With the shipped schema:
+- The deck name must start with the level directory name (a1::, a2::, etc.)
+- Tags must be a list of at least 2 elements
 - First tag must match the level directory name (a1, a2, etc.)
 - Second tag must match the filename (without extension)
+- Notes must be basic notes with 2 fields or cloze notes whose text field holds
+  well-formed cloze deletions (see cloze.py)
+
+Notes expanded from conjugation tables are checked against the same rules.
+Media paths must point to existing audio or image files under media/.
+Every field is also checked for misspellings listed in config/orthography.toml
+(missing accents, wrong accents and wrong apostrophe forms).
 
 Usage:
   python validate.py # Validate all deck files
   python validate.py <path> # Validate a specific file or directory
   python validate.py <path1> <path2> # Validate multiple files or directories
+  python validate.py --no-lint # Skip the orthography checks
 """
 import argparse
-import glob
 import os
 import sys
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+import deck_catalog
+from conjugations import expand_conjugations
+from deck_schema import DeckSchema, get_schema
+from media import resolve_media
+from orthography import Automaton, get_automaton, position
 
 # Import appropriate TOML library based on Python version
 if sys.version_info >= (3, 11):
@@ -26,16 +40,157 @@ else:
     import tomli as tomllib
 
 
-def validate_file(path: str) -> List[str]:
+def note_texts(note: Dict[str, Any]) -> List[Tuple[str, int, str]]:
+    """
+    List the texts of a note that are checked for misspellings.
+
+    Args:
+        note: Note as a [[notes]] entry
+
+    Returns:
+        List of (key, index, text) tuples: the fields, with their index in 'fields',
+        then the back with index 0
+    """
+    texts = []
+    fields = note.get("fields")
+    if isinstance(fields, list):
+        texts = [
+            ("fields", idx, text)
+            for idx, text in enumerate(fields)
+            if isinstance(text, str)
+        ]
+    if isinstance(note.get("back"), str):
+        texts.append(("back", 0, note["back"]))
+    return texts
+
+
+def lint_note(
+    path: str, label: str, note: Dict[str, Any], automaton: Automaton
+) -> List[str]:
+    """
+    Check the fields of one note for misspellings.
+
+    Args:
+        path: Path to the deck file
+        label: Note description used in error messages, such as 'note 3'
+        note: Note as a [[notes]] entry
+        automaton: Compiled orthography rules
+
+    Returns:
+        List of error messages, empty if no errors
+    """
+    errors = []
+    for key, idx, text in note_texts(note):
+        where = "back" if key == "back" else f"field {idx + 1}"
+        for finding in automaton.scan(text):
+            line, column = position(text, finding.start)
+            errors.append(
+                f"ERR {path} [{label}]: {where} line {line} col {column}: "
+                f"'{finding.text}' should be '{finding.suggestion}' ({finding.message})"
+            )
+    return errors
+
+
+def validate_note(
+    path: str,
+    label: str,
+    note: Dict[str, Any],
+    default_model: str,
+    level: str,
+    topic: str,
+    automaton: Optional[Automaton] = None,
+    schema: Optional[DeckSchema] = None,
+) -> List[str]:
+    """
+    Validate one note of a deck file.
+
+    Hand-written notes and notes expanded from conjugation tables are checked
+    against the same rules.
+
+    Args:
+        path: Path to the deck file
+        label: Note description used in error messages, such as 'note 3'
+        note: Note as a [[notes]] entry
+        default_model: Model of notes that do not set one
+        level: Level directory of the deck file
+        topic: Topic of the deck file
+        automaton: Optional compiled orthography rules to check the fields against
+        schema: Deck schema (defaults to config/deck_schema.toml)
+
+    Returns:
+        List of error messages, empty if no errors
+
+    Raises:
+        ValueError: If the default deck schema is malformed
+    """
+    errors = (schema or get_schema()).validator(level, topic)(note, default_model)
+    if errors:
+        errors = [f"ERR {path} [{label}]: {message}" for message in errors]
+
+    # Validate media
+    if "media" in note:
+        media = note["media"]
+        if not isinstance(media, list) or not all(isinstance(m, str) for m in media):
+            errors.append(f"ERR {path} [{label}]: 'media' should be a list of paths")
+        else:
+            for rel in media:
+                try:
+                    resolve_media(rel)
+                except ValueError as e:
+                    errors.append(f"ERR {path} [{label}]: {str(e)}")
+
+    # Check spelling
+    if automaton is not None:
+        errors.extend(lint_note(path, label, note, automaton))
+
+    return errors
+
+
+def validate_header(
+    path: str, data: Dict[str, Any], level: str, schema: Optional[DeckSchema] = None
+) -> List[str]:
+    """
+    Validate the deck-level keys of a deck file.
+
+    Args:
+        path: Path to the deck file
+        data: Parsed deck file
+        level: Level directory of the deck file
+        schema: Deck schema (defaults to config/deck_schema.toml)
+
+    Returns:
+        List of error messages, empty if no errors
+
+    Raises:
+        ValueError: If the default deck schema is malformed
+    """
+    schema = schema or get_schema()
+    topic = os.path.splitext(os.path.basename(path))[0]
+    return [
+        f"ERR {path}: {message}" for message in schema.check_header(data, level, topic)
+    ]
+
+
+def validate_file(
+    path: str,
+    automaton: Optional[Automaton] = None,
+    schema: Optional[DeckSchema] = None,
+) -> List[str]:
     """
     Validate all notes in a deck file.
 
     Args:
         path: Path to the deck file (TOML)
+        automaton: Optional compiled orthography rules to check the fields against
+        schema: Deck schema (defaults to config/deck_schema.toml)
 
     Returns:
         List of error messages, empty if no errors
+
+    Raises:
+        ValueError: If the default deck schema is malformed
     """
+    schema = schema or get_schema()
     errors = []
     level = os.path.basename(os.path.dirname(path))
     topic = os.path.splitext(os.path.basename(path))[0]
@@ -47,50 +202,42 @@ def validate_file(path: str) -> List[str]:
                 data = tomllib.load(f)
 
             # Validate deck and model
-            if "deck" not in data:
-                errors.append(f"ERR {path}: Missing 'deck' field")
-            elif not data["deck"].startswith(f"{level}::"):
-                errors.append(f"ERR {path}: Deck name should start with '{level}::'")
+            errors.extend(validate_header(path, data, level, schema))
 
-            # Validate notes
+            # Validate hand-written notes
+            default_model = data.get("model", schema.default_model)
             for idx, note in enumerate(data.get("notes", []), start=1):
-                if "tags" not in note:
-                    errors.append(f"ERR {path} [note {idx}]: Missing 'tags' field")
-                elif not isinstance(note["tags"], list):
-                    errors.append(f"ERR {path} [note {idx}]: 'tags' should be a list")
-                elif len(note["tags"]) < 2:
-                    errors.append(
-                        f"ERR {path} [note {idx}]: 'tags' should have at least 2 elements"
-                    )
-                elif note["tags"][0] != level:
-                    first_tag = note["tags"][0]
-                    errors.append(
-                        f"ERR {path} [note {idx}]: First tag must be '{level}', got '{first_tag}'"
-                    )
-                elif note["tags"][1] != topic:
-                    second_tag = note["tags"][1]
-                    errors.append(
-                        f"ERR {path} [note {idx}]: Second tag must be '{topic}', got '{second_tag}'"
-                    )
-
-                # Validate fields
-                if "fields" not in note:
-                    errors.append(f"ERR {path} [note {idx}]: Missing 'fields' field")
-                elif not isinstance(note["fields"], list):
-                    errors.append(f"ERR {path} [note {idx}]: 'fields' should be a list")
-                elif len(note["fields"]) < 1:
-                    errors.append(
-                        f"ERR {path} [note {idx}]: 'fields' should have at least 1 element"
+                errors.extend(
+                    validate_note(
+                        path,
+                        f"note {idx}",
+                        note,
+                        default_model,
+                        level,
+                        topic,
+                        automaton,
+                        schema,
                     )
+                )
 
-                # Validate model
-                model = note.get("model", data.get("model", "basic"))
-                if model not in ["basic", "cloze"]:
-                    errors.append(f"ERR {path} [note {idx}]: Unknown model '{model}'")
-                elif model == "basic" and len(note.get("fields", [])) < 2:
-                    errors.append(
-                        f"ERR {path} [note {idx}]: Basic model requires at least 2 fields"
+            # Validate notes expanded from conjugation tables
+            try:
+                for note in expand_conjugations(data, level, topic):
+                    label = f"note {note['note_id']}"
+                    errors.extend(
+                        validate_note(
+                            path,
+                            label,
+                            note,
+                            default_model,
+                            level,
+                            topic,
+                            automaton,
+                            schema,
+                        )
                     )
+            except ValueError as e:
+                errors.append(f"ERR {path}: {str(e)}")
         else:
             return [f"ERR {path}: Unsupported file format"]
     except UnicodeDecodeError as e:
@@ -113,15 +260,7 @@ def find_deck_files(path: Optional[str] = None) -> List[str]:
     Returns:
         List of file paths to validate
     """
-    if path:
-        if os.path.isfile(path) and path.endswith(".toml"):
-            return [path]
-        elif os.path.isdir(path):
-            return glob.glob(os.path.join(path, "*.toml"))
-        else:
-            return glob.glob(os.path.join(path, "**/*.toml"), recursive=True)
-    else:
-        return glob.glob("decks/*/*.toml")
+    return deck_catalog.find_deck_files(path)
 
 
 def main() -> int:
@@ -135,8 +274,20 @@ def main() -> int:
     parser.add_argument(
         "path", nargs="*", help="Path to a specific file or directory to validate"
     )
+    parser.add_argument(
+        "--no-lint", action="store_true", help="Skip the orthography checks"
+    )
     args = parser.parse_args()
 
+    automaton = None
+    try:
+        schema = get_schema()
+        if not args.no_lint:
+            automaton = get_automaton()
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return 1
+
     files = []
     if args.path:
         for path in args.path:
@@ -152,7 +303,7 @@ def main() -> int:
     all_errors = []
 
     for path in files:
-        errors = validate_file(path)
+        errors = validate_file(path, automaton, schema)
         all_errors.extend(errors)
 
     for error in all_errors:
@@ -0,0 +1,25 @@
+"""Tests for the timestamps of reproducible packages."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import apkg  # noqa: E402
+
+
+def test_uncommitted_sources_get_a_content_timestamp(tmp_path, monkeypatch):
+    """Outside git the timestamp follows the content, not the modification time."""
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    deck = tmp_path / "saluti.toml"
+    deck.write_text('deck = "a1::saluti"\n', encoding="utf-8")
+
+    first = apkg.source_timestamp([str(deck)])
+    assert apkg.CONTENT_EPOCH <= first < apkg.CONTENT_EPOCH + apkg.CONTENT_SPAN
+    os.utime(deck, (2000000000, 2000000000))
+    assert apkg.source_timestamp([str(deck)]) == first
+
+    deck.write_text('deck = "a1::saluti"\nmodel = "basic"\n', encoding="utf-8")
+    assert apkg.source_timestamp([str(deck)]) != first
+
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    assert apkg.source_timestamp([str(deck)]) == 1700000000
@@ -0,0 +1,94 @@
+"""Tests for the cloze lexer and its use in the deck catalog and validate.py."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import cloze  # noqa: E402
+import deck_catalog  # noqa: E402
+import validate  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "text, ordinals",
+    [
+        ("{{c1::della}} casa", {1}),
+        ("{{c1::Ne}} {{c2::ho}} comprati {{c1::due}}", {1, 2}),
+        ("{{c3::al::a + il}} mare", {3}),
+        ("**{{c1::sul}}** tavolo", {1}),
+        ("{{c1::**sul**}} tavolo", {1}),
+        (r"2 \* 3 = {{c1::sei}}", {1}),
+        ("no clozes here", set()),
+    ],
+)
+def test_well_formed_clozes(text, ordinals):
+    """Well-formed deletions are counted and report no errors."""
+    scan = cloze.scan_cloze(text)
+    assert scan.errors == []
+    assert scan.ordinals == ordinals
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("{{c1::della casa", "Cloze opener without a closing '}}'"),
+        ("della}} casa", "'}}' without an opening '{{c<number>::'"),
+        ("{{c0::della}}", "Malformed cloze opener '{{c0::'"),
+        ("{{C1::della}}", "Malformed cloze opener '{{C1::'"),
+        ("{{c1:della}}", "Malformed cloze opener '{{c1:'"),
+        ("{{c1::}} casa", "Empty answer in cloze c1"),
+        ("{{c1::della::}} casa", "Empty hint in cloze c1"),
+        ("{{c1::della::di::la}} casa", "Hint of cloze c1 contains '::'"),
+        ("{{c1::*della}} casa*", "Emphasis '*' opened inside a cloze"),
+        ("**della {{c1::casa**}}", "Emphasis '**' opened before a cloze"),
+    ],
+)
+def test_malformed_clozes(text, message):
+    """Every kind of problem is reported with its message."""
+    (error,) = cloze.scan_cloze(text).errors
+    assert error.message.startswith(message)
+
+
+def test_card_count():
+    """Basic notes produce one card, cloze notes one per cloze number."""
+    assert cloze.card_count({"fields": ["{{c1::a}}", "b"]}) == 1
+    note = {"model": "cloze", "fields": ["{{c1::a}} {{c2::b}} {{c1::c}}"]}
+    assert cloze.card_count(note) == 2
+    assert cloze.card_count({"fields": ["{{c1::a}} {{c2::b}}"]}, "cloze") == 2
+
+
+def test_catalog_counts_cards_without_building(tmp_path):
+    """The catalog records card counts, also for selected notes."""
+    lvl_dir = tmp_path / "decks" / "a1"
+    lvl_dir.mkdir(parents=True)
+    (lvl_dir / "ne.toml").write_text(
+        'deck = "A1::ne"\nmodel = "cloze"\n\n'
+        '[[notes]]\ntags = ["a1", "ne"]\nfields = ["{{c1::Ne}} {{c2::ho}} due"]\n\n'
+        '[[notes]]\ntags = ["a1", "ne"]\nfields = ["{{c1::Ne}} voglio"]\n',
+        encoding="utf-8",
+    )
+    catalog = deck_catalog.DeckCatalog(str(tmp_path / "decks"))
+    (source,) = catalog.sources()["a1"]
+    assert (source.note_count, source.card_count) == (2, 3)
+    assert source.select([1]).card_count == 1
+
+    catalog.save()
+    (entry,) = deck_catalog.DeckCatalog(str(tmp_path / "decks")).entries()
+    assert (entry.card_count, entry.card_counts) == (3, {"0": 2})
+
+
+def test_validate_reports_cloze_positions():
+    """validate.py reports malformed deletions with their line and column."""
+    note = {"model": "cloze", "tags": ["a1", "ne"], "fields": ["Io\n{{c1::ne}"]}
+    errors = validate.validate_note("ne.toml", "note 1", note, "basic", "a1", "ne")
+    assert errors == [
+        "ERR ne.toml [note 1]: field 1 line 2 col 1: "
+        "Cloze opener without a closing '}}'"
+    ]
+    note["fields"] = ["Io ne voglio"]
+    errors = validate.validate_note("ne.toml", "note 1", note, "basic", "a1", "ne")
+    assert errors == [
+        "ERR ne.toml [note 1]: field 1: Cloze note has no cloze deletions"
+    ]
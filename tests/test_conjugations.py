@@ -0,0 +1,140 @@
+"""Tests for the expansion of conjugation tables into notes."""
+import os
+import sys
+
+import pytest
+import tomli_w
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import conjugations  # noqa: E402
+import deck_catalog  # noqa: E402
+import validate  # noqa: E402
+
+
+def make_deck(**overrides):
+    """Return a parsed deck file with two verbs, one tense and two card templates."""
+    data = {
+        "deck": "a2::futuro",
+        "model": "basic",
+        "notes": [{"note_id": 1, "tags": ["a2", "futuro"], "fields": ["x", "y"]}],
+        "conjugations": {
+            "meanings": {"andare": "to go"},
+            "tenses": [
+                {
+                    "name": "futuro",
+                    "forms": {
+                        "andare": [
+                            "andrò",
+                            "andrai",
+                            "andrà",
+                            "andremo",
+                            "andrete",
+                            "andranno",
+                        ],
+                        "piovere": ["", "", "pioverà", "", "", "pioveranno"],
+                    },
+                }
+            ],
+            "cards": [
+                {
+                    "id": "cloze",
+                    "model": "cloze",
+                    "fields": ["{person} {{c1::{form}}} ({infinitive})"],
+                    "back": "{meaning}",
+                    "tags": ["verbi"],
+                },
+                {"id": "tabella", "per": "verb", "fields": ["{infinitive}", "{forms}"]},
+            ],
+        },
+    }
+    data["conjugations"].update(overrides)
+    return data
+
+
+def test_expand_conjugations():
+    """Every non-empty form yields a per-form note and every verb a per-verb note."""
+    notes = list(conjugations.expand_conjugations(make_deck(), "a2", "futuro"))
+
+    assert len(notes) == 6 + 1 + 2 + 1
+    assert conjugations.count_expanded_notes(make_deck()) == len(notes)
+
+    first = notes[0]
+    assert first["note_id"] == "futuro/andare/io/cloze"
+    assert first["model"] == "cloze"
+    assert first["tags"] == ["a2", "futuro", "verbi"]
+    assert first["fields"] == ["io {{c1::andrò}} (andare)"]
+    assert first["back"] == "to go"
+
+    table = notes[6]
+    assert table["note_id"] == "futuro/andare/tabella"
+    assert table["model"] == "basic"
+    assert table["fields"][1].splitlines()[0] == "io andrò"
+
+    rain = [note["note_id"] for note in notes if "piovere" in note["note_id"]]
+    assert rain == [
+        "futuro/piovere/lui/lei/cloze",
+        "futuro/piovere/loro/cloze",
+        "futuro/piovere/tabella",
+    ]
+    assert notes[-1]["fields"][1] == "lui/lei pioverà\nloro pioveranno"
+
+
+def test_iter_deck_notes_puts_hand_written_notes_first():
+    """Hand-written notes keep their positions ahead of the expanded ones."""
+    notes = list(conjugations.iter_deck_notes(make_deck(), "a2", "futuro"))
+
+    assert notes[0]["note_id"] == 1
+    assert len(notes) == 11
+
+
+def test_malformed_tables_raise():
+    """Unknown placeholders and tenses of the wrong length are reported."""
+    unknown = make_deck(cards=[{"id": "x", "fields": ["{infinito}"]}])
+    with pytest.raises(ValueError, match="unknown placeholder"):
+        list(conjugations.expand_conjugations(unknown, "a2", "futuro"))
+
+    short = make_deck(tenses=[{"name": "futuro", "forms": {"andare": ["andrò"]}}])
+    with pytest.raises(ValueError, match="expected 6 forms"):
+        list(conjugations.expand_conjugations(short, "a2", "futuro"))
+    assert conjugations.count_expanded_notes(short) == 0
+
+
+MALFORMED = [
+    ({"tenses": ["futuro"]}, "conjugations tense 1: should be a table"),
+    ({"tenses": {"name": "futuro"}}, "'conjugations.tenses' should be an array"),
+    ({"tenses": [{"name": 1}]}, "'name' should be a string"),
+    ({"tenses": [{"name": "futuro", "forms": []}]}, "'forms' should be a table"),
+    (
+        {"tenses": [{"name": "futuro", "forms": {"andare": [1, 2, 3, 4, 5, 6]}}]},
+        "futuro/andare: forms should be strings",
+    ),
+    ({"cards": ["forma"]}, "conjugations card 1: should be a table"),
+    ({"cards": {"id": "x"}}, "'conjugations.cards' should be an array"),
+    ({"cards": [{"fields": [1]}]}, "'fields' should be a list of strings"),
+    ({"cards": [{"fields": ["x"], "tags": "verbi"}]}, "'tags' should be a list"),
+    ({"cards": [{"fields": ["x"], "back": 1}]}, "'back' should be a string"),
+    ({"persons": ["io", 2]}, "'conjugations.persons' should be a non-empty list"),
+    ({"meanings": ["to go"]}, "'conjugations.meanings' should be a table"),
+]
+
+
+@pytest.mark.parametrize("overrides,message", MALFORMED)
+def test_malformed_shapes_raise_value_errors(overrides, message):
+    """Entries of the wrong type are reported as ValueError, not a crash."""
+    data = make_deck(**overrides)
+    with pytest.raises(ValueError, match=message):
+        list(conjugations.expand_conjugations(data, "a2", "futuro"))
+    assert conjugations.count_expanded_notes(data) == 0
+
+
+def test_malformed_table_is_reported_by_validate_and_catalog(tmp_path):
+    """validate.py reports the file and the catalog still counts its cards."""
+    path = tmp_path / "a2" / "futuro.toml"
+    path.parent.mkdir()
+    data = make_deck(tenses=["futuro"])
+    path.write_text(tomli_w.dumps(data), encoding="utf-8")
+
+    errors = validate.validate_file(str(path))
+    assert errors == [f"ERR {path}: conjugations tense 1: should be a table"]
+    assert deck_catalog.count_cards(path.read_bytes(), 1, "a2", "futuro") == (1, {})
@@ -0,0 +1,121 @@
+"""Tests for the shared deck catalog."""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import deck_catalog  # noqa: E402
+
+DECK = """deck = "{level}::{topic}"
+model = "basic"
+
+[[notes]]
+note_id = 10001
+tags = ["{level}", "{topic}"]
+fields = ["uno", "one"]
+
+[[notes]]
+note_id = 10002
+tags = ["{level}", "{topic}"]
+fields = ["due", "two"]
+"""
+
+
+def write_deck(decks_dir, level, topic):
+    """Write a two-note deck file and return its path."""
+    lvl_dir = decks_dir / level
+    lvl_dir.mkdir(parents=True, exist_ok=True)
+    path = lvl_dir / f"{topic}.toml"
+    path.write_text(DECK.format(level=level, topic=topic), encoding="utf-8")
+    return path
+
+
+def test_catalog_lists_levels_and_entries(tmp_path):
+    """Entries carry level, topic, size, hash and note count."""
+    decks_dir = tmp_path / "decks"
+    write_deck(decks_dir, "a1", "numeri")
+    write_deck(decks_dir, "a1", "colori")
+    write_deck(decks_dir, "a2", "viaggi")
+
+    catalog = deck_catalog.DeckCatalog(str(decks_dir))
+    assert catalog.levels() == ["a1", "a2"]
+
+    entries = catalog.entries("a1")
+    assert [e.topic for e in entries] == ["colori", "numeri"]
+    assert all(e.level == "a1" and e.note_count == 2 for e in entries)
+    assert all(len(e.sha256) == 64 and e.size > 0 for e in entries)
+
+
+def test_catalog_persists_and_revalidates(tmp_path):
+    """A persisted catalog picks up edited, added and removed files."""
+    decks_dir = tmp_path / "decks"
+    path = write_deck(decks_dir, "a1", "numeri")
+    catalog = deck_catalog.DeckCatalog(str(decks_dir))
+    old_hash = catalog.entries("a1")[0].sha256
+    catalog.save()
+
+    with open(decks_dir / deck_catalog.CATALOG_FILENAME, encoding="utf-8") as f:
+        assert "a1/numeri.toml" in json.load(f)["files"]
+
+    path.write_text(
+        DECK.format(level="a1", topic="numeri") + "\n# edited\n", encoding="utf-8"
+    )
+    os.utime(path, ns=(0, 1))
+    write_deck(decks_dir, "a1", "colori")
+
+    reloaded = deck_catalog.DeckCatalog(str(decks_dir))
+    entries = {e.topic: e for e in reloaded.entries("a1")}
+    assert set(entries) == {"colori", "numeri"}
+    assert entries["numeri"].sha256 != old_hash
+
+
+def test_find_deck_files_by_path_and_level(tmp_path, monkeypatch):
+    """The shared lookup resolves files, directories and level selections."""
+    decks_dir = tmp_path / "decks"
+    write_deck(decks_dir, "a1", "numeri")
+    write_deck(decks_dir, "a2", "viaggi")
+    nested = decks_dir / "a1" / "extra"
+    nested.mkdir()
+    (nested / "nested.toml").write_text(DECK.format(level="a1", topic="nested"))
+    monkeypatch.chdir(tmp_path)
+
+    assert deck_catalog.find_deck_files("decks/a1/numeri.toml") == [
+        "decks/a1/numeri.toml"
+    ]
+    assert deck_catalog.find_deck_files("decks/a1") == [
+        os.path.join("decks/a1", "numeri.toml")
+    ]
+    assert deck_catalog.find_deck_files(levels=["a2"]) == [
+        os.path.join("decks", "a2", "viaggi.toml")
+    ]
+    recursive = deck_catalog.find_deck_files(recursive=True)
+    assert os.path.join("decks", "a1", "extra", "nested.toml") in recursive
+    assert len(recursive) == 3
+
+
+def test_deck_sources_parse_notes_on_demand(tmp_path):
+    """Sources expose catalog metadata without parsing; notes are read lazily."""
+    decks_dir = tmp_path / "decks"
+    path = write_deck(decks_dir, "a1", "numeri")
+    catalog = deck_catalog.DeckCatalog(str(decks_dir))
+    (source,) = catalog.sources()["a1"]
+    assert (source.level, source.topic, source.note_count) == ("a1", "numeri", 2)
+
+    notes = source.notes()
+    assert [note["fields"][0] for note in notes] == ["uno", "due"]
+    assert all(note["model"] == "basic" for note in notes)
+
+    # Kept notes are reused until released, then the file is parsed again
+    path.write_text("not = [valid", encoding="utf-8")
+    assert list(source.iter_notes()) == notes
+    source.release()
+    with pytest.raises(ValueError, match="Failed to parse file"):
+        list(source.iter_notes())
+
+    path.write_text(DECK.format(level="a1", topic="numeri"), encoding="utf-8")
+    selected = source.select([1])
+    assert selected.note_count == 1
+    assert [note["note_id"] for note in selected.iter_notes()] == [10002]
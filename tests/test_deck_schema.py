@@ -0,0 +1,155 @@
+"""Tests for the declarative deck schema and the validators compiled from it."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import cloze  # noqa: E402
+import deck_schema  # noqa: E402
+import validate  # noqa: E402
+
+SCHEMA = """
+default_model = "basic"
+
+[deck]
+name = "{level}::{topic}"
+prefix = "{level}::"
+
+[tags]
+min = 3
+
+[[tags.leading]]
+value = "{level}"
+message = "First tag must be '{expected}', got '{actual}'"
+
+[[tags.leading]]
+value = "{topic}"
+message = "Second tag must be '{expected}', got '{actual}'"
+
+[[tags.leading]]
+value = "italiano"
+message = "Third tag must be '{expected}' in {level}::{topic}, got '{actual}'"
+
+[fields]
+min = 1
+
+[models.basic]
+min_fields = 2
+
+[models.reverse]
+min_fields = 3
+"""
+
+
+@pytest.fixture
+def schema(tmp_path):
+    """Load a schema with a third leading tag and an extra model."""
+    path = tmp_path / "deck_schema.toml"
+    path.write_text(SCHEMA, encoding="utf-8")
+    return deck_schema.load_schema(str(path))
+
+
+def test_shipped_schema_keeps_the_rules():
+    """The shipped schema reports the same problems as the rules it replaced."""
+    check = deck_schema.get_schema().validator("a1", "saluti")
+    cases = [
+        ({"tags": ["a1", "saluti"], "fields": ["ciao", "hi"]}, []),
+        ({"tags": ["a1", "saluti", "extra"], "fields": ["ciao", "hi"]}, []),
+        ({"fields": ["ciao", "hi"]}, ["Missing 'tags' field"]),
+        ({"tags": "a1", "fields": ["a", "b"]}, ["'tags' should be a list"]),
+        (
+            {"tags": ["a1"], "fields": ["a", "b"]},
+            ["'tags' should have at least 2 elements"],
+        ),
+        (
+            {"tags": ["a2", "x"], "fields": ["a", "b"]},
+            ["First tag must be 'a1', got 'a2'"],
+        ),
+        (
+            {"tags": ["a1", "saluto"], "fields": ["a", "b"]},
+            ["Second tag must be 'saluti', got 'saluto'"],
+        ),
+        ({"tags": ["a1", "saluti"]}, ["Missing 'fields' field"]),
+        (
+            {"tags": ["a1", "saluti"], "fields": []},
+            ["'fields' should have at least 1 element"],
+        ),
+        (
+            {"tags": ["a1", "saluti"], "fields": ["ciao"]},
+            ["Basic model requires at least 2 fields"],
+        ),
+        (
+            {"tags": ["a1", "saluti"], "fields": ["a"], "model": "image"},
+            ["Unknown model 'image'"],
+        ),
+        (
+            {"tags": ["a1", "saluti"], "fields": ["{{c1::ciao"], "model": "cloze"},
+            ["field 1 line 1 col 1: Cloze opener without a closing '}}'"],
+        ),
+    ]
+    for note, expected in cases:
+        assert check(note, "basic") == expected, note
+    assert validate.validate_header(
+        "decks/a1/saluti.toml", {"deck": "a2::x"}, "a1"
+    ) == ["ERR decks/a1/saluti.toml: Deck name should start with 'a1::'"]
+
+
+def test_rule_changes_are_schema_edits(schema):
+    """Leading tags and models come from the schema file."""
+    assert schema.tags("b1", "lessico") == ["b1", "lessico", "italiano"]
+    assert schema.deck_name("b1", "lessico") == "b1::lessico"
+
+    check = schema.validator("b1", "lessico")
+    assert check is schema.validator("b1", "lessico")
+    note = {"tags": ["b1", "lessico", "inglese"], "fields": ["a", "b", "c"]}
+    assert check(note, "reverse") == [
+        "Third tag must be 'italiano' in b1::lessico, got 'inglese'"
+    ]
+    note["tags"][2] = "italiano"
+    assert check(note, "reverse") == []
+    note["fields"] = ["a", "b"]
+    assert check(note, "reverse") == ["Reverse model requires at least 3 fields"]
+    assert check(dict(note, model="cloze"), "basic") == ["Unknown model 'cloze'"]
+
+    # validate.py uses the shipped schema unless it is given another one
+    note = {"tags": ["b1", "lessico"], "fields": ["a", "b"]}
+    errors = validate.validate_note("x.toml", "note 1", note, "basic", "b1", "lessico")
+    assert errors == []
+    errors = validate.validate_note(
+        "x.toml", "note 1", note, "basic", "b1", "lessico", schema=schema
+    )
+    assert errors == ["ERR x.toml [note 1]: 'tags' should have at least 3 elements"]
+
+
+@pytest.mark.parametrize(
+    "edit, message",
+    [
+        (("min = 3", 'min = "three"'), "malformed schema"),
+        (("[models.basic]", "[models.other]"), "default model 'basic'"),
+        (("min = 3", "min = 1"), "tags.min"),
+        (('value = "italiano"', 'value = "{language}"'), "'language'"),
+    ],
+)
+def test_malformed_schema_is_rejected(tmp_path, edit, message):
+    """Schema errors are reported when the schema is loaded."""
+    path = tmp_path / "deck_schema.toml"
+    path.write_text(SCHEMA.replace(*edit, 1), encoding="utf-8")
+    with pytest.raises(ValueError, match=message):
+        deck_schema.load_schema(str(path))
+
+
+def test_card_count_follows_the_schema_models(tmp_path, monkeypatch):
+    """Cards are counted with the default and cloze models of the schema."""
+    path = tmp_path / "deck_schema.toml"
+    text = SCHEMA.replace('default_model = "basic"', 'default_model = "lacune"')
+    text += "\n[models.lacune]\nmin_fields = 1\ncloze = true\n"
+    path.write_text(text, encoding="utf-8")
+    schema = deck_schema.load_schema(str(path))
+    monkeypatch.setitem(deck_schema._SCHEMAS, deck_schema.SCHEMA_PATH, schema)
+
+    fields = ["{{c1::a}} {{c2::b}}"]
+    assert cloze.card_count({"fields": fields}) == 2
+    assert cloze.card_count({"fields": fields}, "basic") == 1
+    assert cloze.card_count({"model": "cloze", "fields": fields}) == 1
@@ -0,0 +1,200 @@
+"""Tests for the deck file language server."""
+import io
+import json
+import os
+import subprocess  # nosec B404 - Used for testing deck_server.py
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import deck_server  # noqa: E402
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+DECK = """deck = "a1::saluti"
+model = "basic"
+
+[[notes]]
+tags = ["a1", "saluti"]
+fields = ["**Ciao**", "hello"]
+
+[[notes]]
+tags = ["a1", "saluto"]
+fields = ["Perche?", "why?"]
+"""
+
+
+def test_document_revalidates_changed_blocks_only():
+    """An edit inside one note parses that block again and nothing else."""
+    document = deck_server.DeckDocument("file:///decks/a1/saluti.toml", DECK)
+    automaton = deck_server.get_automaton()
+
+    diagnostics = document.diagnose(automaton)
+    assert document.parsed == 3
+    assert [(d["range"]["start"]["line"], d["message"]) for d in diagnostics] == [
+        (8, "Second tag must be 'saluti', got 'saluto'"),
+        (9, "'Perche' should be 'Perché' (missing accent)"),
+    ]
+    # Validation errors span the line of their key
+    assert diagnostics[0]["range"]["start"]["character"] == 0
+    assert diagnostics[0]["range"]["end"]["character"] == 23
+    assert diagnostics[1]["range"]["start"]["character"] == 11
+    assert diagnostics[1]["range"]["end"]["character"] == 17
+
+    # Fix the tag of the second note: only its block is parsed again
+    document.apply_change(
+        {
+            "range": {
+                "start": {"line": 8, "character": 15},
+                "end": {"line": 8, "character": 21},
+            },
+            "text": "saluti",
+        }
+    )
+    diagnostics = document.diagnose(automaton)
+    assert document.parsed == 4
+    assert [d["range"]["start"]["line"] for d in diagnostics] == [9]
+
+
+def test_lint_reports_parsed_strings_at_their_source():
+    """Misspellings are found after escapes are decoded and point into the source."""
+    text = (
+        'deck = "a1::saluti"\n\n[[notes]]\ntags = ["a1", "saluti"]\n'
+        "fields = [\"ciao\\nperche\", 'gia']\n"
+        'back = """\nsi, \\\n    cosi"""\n'
+    )
+    document = deck_server.DeckDocument("file:///decks/a1/saluti.toml", text)
+
+    diagnostics = document.diagnose(deck_server.get_automaton())
+    ranges = [
+        (
+            d["range"]["start"]["line"],
+            d["range"]["start"]["character"],
+            d["range"]["end"]["character"],
+        )
+        for d in diagnostics
+    ]
+    assert ranges == [(4, 17, 23), (4, 27, 30), (7, 4, 8)]
+    assert diagnostics[0]["message"] == "'perche' should be 'perché' (missing accent)"
+
+
+def test_string_literals_decode_like_toml():
+    """Decoded strings match the parser, with one source span per character."""
+    value = 'fields = ["a\\tb\\u00e9", \'c\\d\', """\ne""f""", \'\'\'g\'\'\'\'] # "h"'
+    literals = deck_server.string_literals(value, 9, len(value))
+    assert [lit[0] for lit in literals] == tomllib.loads(value)["fields"]
+    assert [len(lit[1]) for lit in literals] == [4, 3, 4, 2]
+    assert literals[0][1][-1] == (15, 21)
+
+
+def test_completion_and_hover():
+    """Tags complete to the level and topic; hover renders the note."""
+    document = deck_server.DeckDocument("file:///decks/a1/saluti.toml", DECK)
+    document.diagnose(None)
+
+    items = document.completions({"line": 4, "character": 9})
+    assert [(i["label"], i["insertText"]) for i in items] == [
+        ("a1", "a1"),
+        ("saluti", "saluti"),
+    ]
+    assert document.completions({"line": 5, "character": 11}) == []
+
+    hover = document.hover({"line": 5, "character": 0})
+    assert "<strong>Ciao</strong>" in hover["contents"]["value"]
+    assert document.hover({"line": 0, "character": 0}) is None
+
+
+def frame(message):
+    """Encode a JSON-RPC message with its LSP header."""
+    body = json.dumps(dict(message, jsonrpc="2.0")).encode("utf-8")
+    return f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+
+
+def read_messages(output):
+    """Decode all LSP messages in the server's output."""
+    messages = []
+    while output:
+        header, _, rest = output.partition(b"\r\n\r\n")
+        length = int(header.split(b":")[1])
+        messages.append(json.loads(rest[:length]))
+        output = rest[length:]
+    return messages
+
+
+def test_server_over_stdio(tmp_path):
+    """A session of initialize, didOpen, shutdown and exit over stdio."""
+    uri = (tmp_path / "a1" / "saluti.toml").as_uri()
+    session = b"".join(
+        frame(message)
+        for message in [
+            {"id": 1, "method": "initialize", "params": {}},
+            {"method": "initialized", "params": {}},
+            {
+                "method": "textDocument/didOpen",
+                "params": {"textDocument": {"uri": uri, "text": DECK}},
+            },
+            {"method": "textDocument/didOpen", "params": {"textDocument": {}}},
+            {"id": 2, "method": "textDocument/definition", "params": {}},
+            {"id": 3, "method": "shutdown"},
+            {"method": "exit"},
+        ]
+    )
+
+    # nosec B603 - Using sys.executable and a fixed script path
+    result = subprocess.run(
+        [sys.executable, os.path.join(SRC_DIR, "deck_server.py")],
+        input=session,
+        capture_output=True,
+        check=False,
+    )
+
+    assert result.returncode == 0
+    assert b"Error: textDocument/didOpen: KeyError: 'uri'" in result.stderr
+    messages = read_messages(result.stdout)
+    assert messages[0]["result"]["capabilities"]["hoverProvider"] is True
+    assert messages[1]["method"] == "textDocument/publishDiagnostics"
+    assert len(messages[1]["params"]["diagnostics"]) == 2
+    assert messages[2]["error"]["code"] == deck_server.METHOD_NOT_FOUND
+    assert messages[3] == {"id": 3, "result": None, "jsonrpc": "2.0"}
+
+
+def test_server_survives_failing_handlers(monkeypatch, capsys):
+    """A malformed table is reported, and handler crashes do not end the server."""
+    server = deck_server.DeckServer(io.BytesIO(), io.BytesIO())
+    uri = "file:///decks/a2/futuro.toml"
+    text = (
+        'deck = "a2::futuro"\n\n[conjugations]\ntenses = ["futuro"]\n\n'
+        '[[conjugations.cards]]\nfields = ["{form}"]\n'
+    )
+    server.handle(
+        {
+            "method": "textDocument/didOpen",
+            "params": {"textDocument": {"uri": uri, "text": text}},
+        }
+    )
+    (published,) = read_messages(server.writer.getvalue())
+    assert [d["message"] for d in published["params"]["diagnostics"]] == [
+        "conjugations tense 1: should be a table"
+    ]
+
+    def crash(self, automaton):
+        raise AttributeError("'str' object has no attribute 'get'")
+
+    monkeypatch.setattr(deck_server.DeckDocument, "diagnose", crash)
+    change = {"textDocument": {"uri": uri}, "contentChanges": [{"text": text}]}
+    assert server.handle({"method": "textDocument/didChange", "params": change}) is None
+    assert "AttributeError" in capsys.readouterr().err
+
+    server.writer = io.BytesIO()
+    server.on_textDocument_hover = lambda params: crash(None, None)
+    server.handle({"id": 7, "method": "textDocument/hover", "params": {}})
+    server.handle({"id": 8, "method": "shutdown"})
+    failed, shutdown = read_messages(server.writer.getvalue())
+    assert failed["error"]["code"] == deck_server.INTERNAL_ERROR
+    assert shutdown == {"id": 8, "result": None, "jsonrpc": "2.0"}
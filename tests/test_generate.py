@@ -1,12 +1,23 @@
 """Tests for the generate.py script."""
-
+import glob
+import hashlib
+import json
 import os
 import shutil
+import sqlite3
 import subprocess
+import sys
+import zipfile
 
 import pytest
 import tomli_w
 
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
 # generate.py is in the src directory
 SCRIPT = "src/generate.py"
 
@@ -26,8 +37,13 @@ def setup_project(tmp_path, monkeypatch):
     # Create output directory inside src directory
     output_dir = src_dir / "output"
     output_dir.mkdir()
-    # Copy the generate script into the project directory
-    shutil.copy(os.path.join(os.getcwd(), SCRIPT), proj / SCRIPT)
+    # Copy the generate script and the modules it imports into the project directory
+    for module in glob.glob(os.path.join(os.getcwd(), "src", "*.py")):
+        shutil.copy(module, src_dir / os.path.basename(module))
+    # Copy the deck schema the notes are checked against
+    config_dir = proj / "config"
+    config_dir.mkdir()
+    shutil.copy(os.path.join(os.getcwd(), "config", "deck_schema.toml"), config_dir)
     # Ensure any working-dir calls happen inside proj
     monkeypatch.chdir(proj)
     return proj
@@ -287,3 +303,752 @@ def test_auto_discover_mode(setup_project):
     filenames = [f.name for f in out_files]
     assert any("italian" in f and "a1" in f and "auto1" in f for f in filenames)
     assert any("italian" in f and "a2" in f and "auto2" in f for f in filenames)
+
+
+def test_chunk_mode_balances_by_note_count(setup_project):
+    """Test chunk mode with a note target.
+
+    Verifies that --chunk-notes packs whole files into balanced decks
+    instead of grouping them by file count.
+    """
+    proj = setup_project
+    level = "a1"
+    sizes = {"big": 6, "mid": 3, "small1": 2, "small2": 1}
+    for name, count in sizes.items():
+        create_deck_file(
+            proj,
+            level,
+            name,
+            [
+                {
+                    "model": "basic",
+                    "front": f"{name} {i}",
+                    "back": name,
+                    "tags": [level, name],
+                }
+                for i in range(count)
+            ],
+        )
+    result = subprocess.run(
+        ["python3", SCRIPT, "--mode", "chunk", "--chunk-notes", "6", "--level", level],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    names = sorted(f.name for f in (proj / "src" / "output").glob("*.apkg"))
+    # 12 notes at 6 per deck: the big file alone, the rest together
+    assert len(names) == 2
+    assert any("-big-" in n for n in names)
+    assert any("mid_small1_small2" in n for n in names)
+
+
+def test_chunk_mode_balances_by_card_count(setup_project):
+    """Test chunk mode with a card target.
+
+    Verifies that --chunk-cards weighs cloze notes by their cloze numbers,
+    and that malformed clozes are reported while loading.
+    """
+    proj = setup_project
+    level = "a1"
+    fronts = [f"{{{{c1::Ne}}}} {{{{c2::ho}}}} {{{{c3::{i}}}}}" for i in range(2)]
+    fronts.append("{{c1::Ne voglio")
+    create_deck_file(
+        proj,
+        level,
+        "ne",
+        [
+            {"model": "cloze", "front": front, "back": "ne", "tags": [level, "ne"]}
+            for front in fronts
+        ],
+    )
+    for name in ("mid", "small"):
+        create_deck_file(
+            proj,
+            level,
+            name,
+            [
+                {"front": f"{name} {i}", "back": name, "tags": [level, name]}
+                for i in range(3)
+            ],
+        )
+    result = subprocess.run(
+        ["python3", SCRIPT, "--mode", "chunk", "--chunk-cards", "7", "--level", level],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "note 3: field 1 line 1 col 1: Cloze opener without a closing '}}'" in (
+        result.stdout
+    )
+    assert "Built 2 of 2 packages: 9 notes, 13 cards" in result.stdout
+    names = sorted(f.name for f in (proj / "src" / "output").glob("*.apkg"))
+    # 13 cards at 7 per deck: the cloze file alone, the basic files together
+    assert len(names) == 2
+    assert any("-ne-" in n for n in names)
+    assert any("mid_small" in n for n in names)
+
+
+def test_chunk_mode_splits_packages_over_the_byte_budget(setup_project):
+    """Test chunk mode with a package that outgrows its byte budget.
+
+    Verifies that a chunk whose sources fit the budget, but whose package does
+    not once its media is added, is split and rebuilt so that no package is
+    larger than the budget.
+    """
+    proj = setup_project
+    (proj / "media" / "audio").mkdir(parents=True)
+    (proj / "decks" / "a1").mkdir()
+    for topic in ("uno", "due"):
+        (proj / "media" / "audio" / f"{topic}.mp3").write_bytes(os.urandom(20000))
+        deck = {
+            "deck": f"a1::{topic}",
+            "model": "basic",
+            "notes": [
+                {
+                    "note_id": 1,
+                    "tags": ["a1", topic],
+                    "fields": [topic, "one"],
+                    "media": [f"audio/{topic}.mp3"],
+                }
+            ],
+        }
+        with open(proj / "decks" / "a1" / f"{topic}.toml", "wb") as f:
+            tomli_w.dump(deck, f)
+
+    budget = 32000
+    result = subprocess.run(
+        ["python3", SCRIPT, "--mode", "chunk", "--chunk-bytes", str(budget)],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "over the chunk byte budget" in result.stdout
+    assert "Built 2 of 2 packages: 2 notes, 2 cards" in result.stdout
+    packages = list((proj / "src" / "output").glob("*.apkg"))
+    assert len(packages) == 2
+    assert all(package.stat().st_size <= budget for package in packages)
+
+
+def test_multi_mode_writes_subdecks(setup_project):
+    """Test multi mode with deck files from two levels.
+
+    Verifies that running generate.py in multi mode writes a single
+    package that keeps every topic as its own Italiano::<level>::<topic> deck.
+    """
+    proj = setup_project
+    for level, topic in [("a1", "uno"), ("a1", "due"), ("a2", "tre")]:
+        create_deck_file(
+            proj,
+            level,
+            topic,
+            [{"model": "basic", "front": topic, "back": topic, "tags": [level, topic]}],
+        )
+    result = subprocess.run(
+        ["python3", SCRIPT, "--mode", "multi"], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    out_files = list((proj / "src" / "output").glob("*.apkg"))
+    assert len(out_files) == 1
+    assert "multi" in out_files[0].name
+
+    with zipfile.ZipFile(out_files[0]) as zf:
+        db_path = proj / "collection.anki2"
+        db_path.write_bytes(zf.read("collection.anki2"))
+    conn = sqlite3.connect(db_path)
+    decks = json.loads(conn.execute("SELECT decks FROM col").fetchone()[0])
+    conn.close()
+    names = {deck["name"] for deck in decks.values()}
+    assert {"Italiano::a1::uno", "Italiano::a1::due", "Italiano::a2::tre"} <= names
+
+
+def test_uber_mode_dedup_merges_duplicates(setup_project):
+    """Test uber mode with --dedup and an overlapping topic.
+
+    Verifies that notes with the same rendered fields in two levels are
+    written once, carrying the tags of both copies.
+    """
+    proj = setup_project
+    for level in ["basic", "a1"]:
+        create_deck_file(
+            proj,
+            level,
+            "colori",
+            [
+                {
+                    "model": "basic",
+                    "front": "rosso",
+                    "back": "red",
+                    "tags": [level, "colori"],
+                },
+                {
+                    "model": "basic",
+                    "front": level,
+                    "back": level,
+                    "tags": [level, "colori"],
+                },
+            ],
+        )
+    result = subprocess.run(
+        ["python3", SCRIPT, "--mode", "uber", "--dedup"], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Removed 1 duplicate notes" in result.stdout
+
+    out_files = list((proj / "src" / "output").glob("*.apkg"))
+    assert len(out_files) == 1
+    with zipfile.ZipFile(out_files[0]) as zf:
+        db_path = proj / "collection.anki2"
+        db_path.write_bytes(zf.read("collection.anki2"))
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT flds, tags FROM notes").fetchall()
+    conn.close()
+    assert len(rows) == 3
+    tags = [sorted(tags.split()) for flds, tags in rows if flds.startswith("rosso")]
+    assert tags == [["a1", "basic", "colori"]]
+
+
+def test_sharded_build_and_manifest_merge(setup_project):
+    """Test --shard with two shards and the manifest merge step.
+
+    Verifies that the shards split the targets between them and that merging
+    the partial manifests yields one release with every package.
+    """
+    proj = setup_project
+    level = "a1"
+    for name, count in {"uno": 3, "due": 2, "tre": 1}.items():
+        create_deck_file(
+            proj,
+            level,
+            name,
+            [
+                {
+                    "model": "basic",
+                    "front": f"{name} {i}",
+                    "back": name,
+                    "tags": [level, name],
+                }
+                for i in range(count)
+            ],
+        )
+    built = []
+    for shard in ["1/2", "2/2"]:
+        result = subprocess.run(
+            ["python3", SCRIPT, "--level", level, "--shard", shard],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        built.append(result.stdout.count(".apkg"))
+    assert sorted(built) == [1, 2]
+
+    output_dir = proj / "src" / "output"
+    partials = sorted(str(p) for p in output_dir.glob("manifest-shard-*.json"))
+    assert len(partials) == 2
+    result = subprocess.run(
+        ["python3", "src/build_manifest.py", *partials, "--output-dir", "release"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    with open(proj / "release" / "manifest.json", encoding="utf-8") as f:
+        release = json.load(f)
+    assert [t["topic"] for t in release["targets"]] == ["due", "tre", "uno"]
+    for target in release["targets"]:
+        assert (proj / "release" / target["package"]).exists()
+
+    # A missing shard is rejected
+    result = subprocess.run(
+        ["python3", "src/build_manifest.py", partials[0], "--output-dir", "partial"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 1
+    assert "Missing shards" in result.stdout
+
+
+def test_rebuild_is_byte_identical(setup_project):
+    """Test that rebuilding unchanged sources reproduces the same package.
+
+    Verifies that the versioned package is linked to a single
+    content-addressed entry in the output store.
+    """
+    proj = setup_project
+    create_deck_file(
+        proj,
+        "a1",
+        "stabile",
+        [{"model": "basic", "front": "uno", "back": "one", "tags": ["a1", "stabile"]}],
+    )
+    output_dir = proj / "src" / "output"
+    contents = []
+    for _ in range(2):
+        result = subprocess.run(
+            ["python3", SCRIPT, "--level", "a1"], capture_output=True, text=True
+        )
+        assert result.returncode == 0, result.stderr
+        out_files = list(output_dir.glob("*.apkg"))
+        assert len(out_files) == 1
+        contents.append(out_files[0].read_bytes())
+    assert contents[0] == contents[1]
+
+    stored = list((output_dir / "store").glob("*.apkg"))
+    assert len(stored) == 1
+    assert stored[0].read_bytes() == contents[0]
+
+
+def test_incremental_build_matches_clean_rebuild(setup_project):
+    """Test --incremental after editing one of several deck files.
+
+    Verifies that only the changed notes are rendered, that the patched
+    package is byte-identical to a clean rebuild, and that a build without
+    changes reuses the stored package.
+    """
+    proj = setup_project
+    level = "a1"
+    cards = [
+        {"model": "basic", "front": "uno", "back": "one", "tags": [level, "numeri"]},
+        {"model": "basic", "front": "due", "back": "two", "tags": [level, "numeri"]},
+    ]
+    create_deck_file(proj, level, "numeri", cards)
+    create_deck_file(
+        proj,
+        level,
+        "colori",
+        [{"model": "basic", "front": "rosso", "back": "red", "tags": [level]}],
+    )
+    command = ["python3", SCRIPT, "--mode", "per-level", "--incremental"]
+    result = subprocess.run(command, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Rendered 3 of 3 notes" in result.stdout
+
+    cards[1]["back"] = "two (2)"
+    cards.append(
+        {"model": "basic", "front": "tre", "back": "three", "tags": [level, "numeri"]}
+    )
+    create_deck_file(proj, level, "numeri", cards)
+    result = subprocess.run(command, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Rendered 2 of 4 notes (1 of 2 deck files changed)" in result.stdout
+
+    package = proj / "src" / "output" / "italian-a1-v0.0.0.apkg"
+    incremental = package.read_bytes()
+    result = subprocess.run(
+        ["python3", SCRIPT, "--mode", "per-level"], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert package.read_bytes() == incremental
+
+    result = subprocess.run(command, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Unchanged" in result.stdout
+    assert package.read_bytes() == incremental
+
+    # A new timestamp for the same sources must not reuse the stored package
+    env = dict(os.environ, SOURCE_DATE_EPOCH="1700000000")
+    result = subprocess.run(command, capture_output=True, text=True, env=env)
+    assert result.returncode == 0, result.stderr
+    assert "Unchanged" not in result.stdout
+    incremental = package.read_bytes()
+    result = subprocess.run(
+        ["python3", SCRIPT, "--mode", "per-level"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+    assert package.read_bytes() == incremental
+
+
+def test_select_builds_custom_deck(setup_project):
+    """Test --select with a query across levels.
+
+    Verifies that only the matching notes of the matching deck files end up
+    in one custom package named after --name.
+    """
+    proj = setup_project
+    for level in ["a1", "a2"]:
+        create_deck_file(
+            proj,
+            level,
+            "verbi_essere",
+            [
+                {
+                    "model": "basic",
+                    "front": f"sono {level}",
+                    "back": "I am",
+                    "tags": [level, "verbi_essere"],
+                },
+                {
+                    "model": "basic",
+                    "front": f"era {level}",
+                    "back": "was",
+                    "tags": [level, "verbi_imperfetto"],
+                },
+            ],
+        )
+    create_deck_file(
+        proj,
+        "a2",
+        "colori",
+        [{"model": "basic", "front": "rosso", "back": "red", "tags": ["a2"]}],
+    )
+    result = subprocess.run(
+        [
+            "python3",
+            SCRIPT,
+            "--select",
+            "tag:verbi_* AND NOT tag:verbi_imperfetto",
+            "--name",
+            "verbi",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+    out_files = list((proj / "src" / "output").glob("*.apkg"))
+    assert [f.name for f in out_files] == ["italian-custom-verbi-v0.0.0.apkg"]
+    with zipfile.ZipFile(out_files[0]) as zf:
+        db_path = proj / "collection.anki2"
+        db_path.write_bytes(zf.read("collection.anki2"))
+    conn = sqlite3.connect(db_path)
+    fronts = sorted(
+        flds.split("\x1f")[0] for (flds,) in conn.execute("SELECT flds FROM notes")
+    )
+    conn.close()
+    assert fronts == ["sono a1", "sono a2"]
+
+
+def test_collection_upsert_keeps_review_history(setup_project):
+    """Test --collection against a collection built from an earlier package.
+
+    Verifies that edited notes are updated in place by GUID, new notes are
+    added, and the scheduling of existing cards is left untouched.
+    """
+    proj = setup_project
+    level = "a1"
+    create_deck_file(
+        proj,
+        level,
+        "qa",
+        [{"model": "basic", "front": "uno", "back": "one", "tags": [level, "qa"]}],
+    )
+    result = subprocess.run(
+        ["python3", SCRIPT, "--level", level], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    package = next((proj / "src" / "output").glob("*.apkg"))
+    collection = proj / "collection.anki2"
+    with zipfile.ZipFile(package) as zf:
+        collection.write_bytes(zf.read("collection.anki2"))
+    conn = sqlite3.connect(collection)
+    conn.execute("UPDATE cards SET ivl = 7, reps = 3, type = 2, queue = 2")
+    conn.commit()
+    conn.close()
+
+    create_deck_file(
+        proj,
+        level,
+        "qa",
+        [
+            {
+                "model": "basic",
+                "front": "uno",
+                "back": "one (1)",
+                "tags": [level, "qa"],
+            },
+            {"model": "basic", "front": "due", "back": "two", "tags": [level, "qa"]},
+        ],
+    )
+    for expected in [
+        "1 added, 1 updated, 0 unchanged",
+        "0 added, 0 updated, 2 unchanged",
+    ]:
+        result = subprocess.run(
+            ["python3", SCRIPT, "--level", level, "--collection", str(collection)],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        assert expected in result.stdout
+
+    conn = sqlite3.connect(collection)
+    notes = conn.execute("SELECT flds, csum FROM notes ORDER BY id").fetchall()
+    reviewed = conn.execute("SELECT ivl, reps FROM cards ORDER BY id").fetchall()
+    conn.close()
+    assert [flds.split("\x1f")[1] for flds, _ in notes] == ["one (1)", "two"]
+    assert reviewed == [(7, 3), (0, 0)]
+    # Anki's checksum of the first field: 8 hex digits of its SHA-1
+    assert [csum for _, csum in notes] == [
+        int(hashlib.sha1(front.encode()).hexdigest()[:8], 16)
+        for front in ("uno", "due")
+    ]
+
+
+def test_collection_with_newer_schema_is_refused(setup_project):
+    """Test --collection against a collection of a current Anki version.
+
+    Verifies that the newer schema is detected and reported, and that the
+    collection is left as it was.
+    """
+    proj = setup_project
+    create_deck_file(
+        proj,
+        "a1",
+        "qa",
+        [{"model": "basic", "front": "uno", "back": "one", "tags": ["a1", "qa"]}],
+    )
+    result = subprocess.run(
+        ["python3", SCRIPT, "--level", "a1"], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    package = next((proj / "src" / "output").glob("*.apkg"))
+    collection = proj / "collection.anki2"
+    with zipfile.ZipFile(package) as zf:
+        collection.write_bytes(zf.read("collection.anki2"))
+    conn = sqlite3.connect(collection)
+    conn.execute("UPDATE col SET ver = 18")
+    conn.commit()
+    conn.close()
+    before = collection.read_bytes()
+
+    result = subprocess.run(
+        ["python3", SCRIPT, "--level", "a1", "--collection", str(collection)],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode != 0
+    assert "uses collection schema 18" in result.stdout + result.stderr
+    assert "Downgrade & Quit" in result.stdout + result.stderr
+    assert collection.read_bytes() == before
+
+
+def test_collection_must_exist(setup_project):
+    """Test --collection with a path that does not exist.
+
+    Verifies that the build fails without creating an empty collection file.
+    """
+    proj = setup_project
+    create_deck_file(
+        proj,
+        "a1",
+        "qa",
+        [{"model": "basic", "front": "uno", "back": "one", "tags": ["a1", "qa"]}],
+    )
+    collection = proj / "colection.anki2"
+    result = subprocess.run(
+        ["python3", SCRIPT, "--level", "a1", "--collection", str(collection)],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode != 0
+    assert "does not exist" in result.stdout + result.stderr
+    assert not collection.exists()
+
+
+def test_export_writes_all_formats_in_one_pass(setup_project):
+    """Test --export with every format.
+
+    Verifies that one run writes an Anki text file, CSV, JSONL and HTML page
+    holding the same notes, with the GUIDs and decks of the packages.
+    """
+    proj = setup_project
+    create_deck_file(
+        proj,
+        "a1",
+        "qa",
+        [
+            {"model": "basic", "front": "**uno**", "back": "one", "tags": ["a1", "qa"]},
+            {
+                "model": "cloze",
+                "front": "Io {{c1::sono}} qui",
+                "back": "I am here",
+                "tags": ["a1", "qa"],
+            },
+        ],
+    )
+    result = subprocess.run(
+        ["python3", SCRIPT, "--mode", "multi", "--export", "anki-text,csv,jsonl,html"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    out_dir = proj / "src" / "output"
+    assert not list(out_dir.glob("*.apkg"))
+    exports = sorted(path.name for path in (out_dir / "export").iterdir())
+    assert [os.path.splitext(name)[1] for name in exports] == [
+        ".csv",
+        ".html",
+        ".jsonl",
+        ".txt",
+    ]
+
+    (jsonl,) = (out_dir / "export").glob("*.jsonl")
+    entries = [
+        json.loads(line) for line in jsonl.read_text(encoding="utf-8").splitlines()
+    ]
+    assert [entry["model"] for entry in entries] == ["basic", "cloze"]
+    assert entries[0]["deck"] == "Italiano::a1::qa"
+    assert entries[0]["fields"]["front"] == "**uno**"
+    assert entries[0]["rendered"] == ["<strong>uno</strong>", "one"]
+
+    (text,) = (out_dir / "export").glob("*.txt")
+    lines = text.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "#separator:tab"
+    rows = [line.split("\t") for line in lines if not line.startswith("#")]
+    assert [row[0] for row in rows] == [entry["guid"] for entry in entries]
+    assert rows[1][1:4] == ["Cloze Model", "Italiano::a1::qa", "Io {{c1::sono}} qui"]
+
+    (page,) = (out_dir / "export").glob("*.html")
+    assert '<span class="cloze">sono</span>' in page.read_text(encoding="utf-8")
+
+
+def test_media_is_stored_once_across_modes(setup_project):
+    """Test notes with media in per-file and per-level builds.
+
+    Verifies that a media file used by several decks and modes is stored once
+    under its content hash, referenced from the notes, and zipped into every
+    package without recompression.
+    """
+    proj = setup_project
+    audio = os.urandom(4096)
+    (proj / "media" / "audio").mkdir(parents=True)
+    (proj / "media" / "audio" / "ciao.mp3").write_bytes(audio)
+    (proj / "decks" / "a1").mkdir()
+    for topic in ("saluti", "parole"):
+        deck = {
+            "deck": f"a1::{topic}",
+            "model": "basic",
+            "notes": [
+                {
+                    "note_id": 1,
+                    "tags": ["a1", topic],
+                    "fields": ["ciao", "hello"],
+                    "media": ["audio/ciao.mp3"],
+                }
+            ],
+        }
+        with open(proj / "decks" / "a1" / f"{topic}.toml", "wb") as f:
+            tomli_w.dump(deck, f)
+
+    for args in (["--level", "a1"], ["--mode", "per-level"]):
+        result = subprocess.run(
+            ["python3", SCRIPT, *args], capture_output=True, text=True
+        )
+        assert result.returncode == 0, result.stderr + result.stdout
+
+    output = proj / "src" / "output"
+    (stored,) = (output / "media").iterdir()
+    assert stored.suffix == ".mp3"
+    assert stored.read_bytes() == audio
+
+    packages = sorted(output.glob("*.apkg"))
+    assert len(packages) == 3
+    for package in packages:
+        with zipfile.ZipFile(package) as zf:
+            assert json.loads(zf.read("media")) == {"0": stored.name}
+            assert zf.getinfo("0").compress_type == zipfile.ZIP_STORED
+            assert zf.read("0") == audio
+            db_path = proj / "collection.anki2"
+            db_path.write_bytes(zf.read("collection.anki2"))
+        conn = sqlite3.connect(db_path)
+        backs = [
+            flds.split("\x1f")[1] for (flds,) in conn.execute("SELECT flds FROM notes")
+        ]
+        conn.close()
+        assert backs and all(
+            back == f"hello<br>[sound:{stored.name}]" for back in backs
+        )
+
+
+def test_latest_package_format(setup_project):
+    """Test --package-format latest.
+
+    Verifies that the package holds a zstd-compressed collection.anki21b with
+    the same notes as the legacy package, a media list and a meta entry.
+    """
+    zstandard = pytest.importorskip("zstandard")
+    proj = setup_project
+    create_deck_file(
+        proj,
+        "a1",
+        "qa",
+        [{"model": "basic", "front": "uno", "back": "one", "tags": ["a1", "qa"]}],
+    )
+    collections = {}
+    for package_format in ("legacy", "latest"):
+        result = subprocess.run(
+            ["python3", SCRIPT, "--level", "a1", "--package-format", package_format],
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr + result.stdout
+        package = next((proj / "src" / "output").glob("*.apkg"))
+        with zipfile.ZipFile(package) as zf:
+            names = zf.namelist()
+            if package_format == "latest":
+                assert names == ["collection.anki21b", "media", "meta"]
+                assert zf.read("meta") == b"\x08\x03"
+                data = (
+                    zstandard.ZstdDecompressor()
+                    .decompressobj()
+                    .decompress(zf.read("collection.anki21b"))
+                )
+            else:
+                assert names == ["collection.anki2", "media"]
+                data = zf.read("collection.anki2")
+        db_path = proj / f"{package_format}.anki2"
+        db_path.write_bytes(data)
+        conn = sqlite3.connect(db_path)
+        collections[package_format] = conn.execute(
+            "SELECT guid, flds FROM notes"
+        ).fetchall()
+        conn.close()
+    assert collections["latest"] == collections["legacy"]
+    assert collections["latest"][0][1] == "uno\x1fone"
+
+
+def test_latest_package_round_trips_through_import(setup_project):
+    """Test importing a package built with --package-format latest.
+
+    Verifies that import_apkg.py reads the compressed collection.anki21b and
+    writes the notes back into a deck file.
+    """
+    pytest.importorskip("zstandard")
+    proj = setup_project
+    create_deck_file(
+        proj,
+        "a1",
+        "qa",
+        [
+            {"model": "basic", "front": "uno", "back": "one", "tags": ["a1", "qa"]},
+            {
+                "model": "cloze",
+                "front": "{{c1::due}} e tre",
+                "back": "due",
+                "tags": ["a1", "qa"],
+            },
+        ],
+    )
+    result = subprocess.run(
+        ["python3", SCRIPT, "--level", "a1", "--package-format", "latest"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr + result.stdout
+    package = next((proj / "src" / "output").glob("*.apkg"))
+
+    result = subprocess.run(
+        ["python3", "src/import_apkg.py", str(package), "--level", "b1"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr + result.stdout
+    with open(proj / "decks" / "b1" / "a1_qa.toml", "rb") as f:
+        deck = tomllib.load(f)
+    # The Anki deck a1::qa becomes the topic a1_qa
+    assert deck["deck"] == "b1::a1_qa"
+    basic, cloze = deck["notes"]
+    assert basic["fields"] == ["uno", "one"]
+    assert (cloze["model"], cloze["fields"]) == ("cloze", ["{{c1::due}} e tre"])
@@ -0,0 +1,172 @@
+"""Tests for importing Anki packages into deck files."""
+import os
+import sqlite3
+import sys
+import zipfile
+
+import genanki
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import import_apkg  # noqa: E402
+import validate  # noqa: E402
+from deck_writer import DeckWriter  # noqa: E402
+from orthography import get_automaton  # noqa: E402
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+BASIC = genanki.Model(
+    1607392319,
+    "Basic (three fields)",
+    fields=[{"name": "Front"}, {"name": "Back"}, {"name": "Note"}],
+    templates=[{"name": "Card 1", "qfmt": "{{Front}}", "afmt": "{{Back}}"}],
+)
+
+
+def write_package(path):
+    """Write a package with two decks, HTML fields and a cloze note."""
+    lessico = genanki.Deck(2059400110, "Corso::Lessico Città")
+    lessico.add_note(
+        genanki.Note(
+            model=BASIC,
+            fields=["<div><b>la città</b></div>", "the city", "<i>femminile</i>"],
+        )
+    )
+    lessico.add_note(genanki.Note(model=BASIC, fields=["solo fronte", "", ""]))
+    grammatica = genanki.Deck(2059400111, "Corso::Grammatica")
+    grammatica.add_note(
+        genanki.Note(
+            model=genanki.CLOZE_MODEL,
+            fields=["Io {{c1::vado}}&nbsp;a casa<br>domani", ""],
+        )
+    )
+    genanki.Package([lessico, grammatica]).write_to_file(str(path))
+
+
+def load(path):
+    """Parse a deck file."""
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def test_import_package_writes_valid_decks(tmp_path):
+    """Notes are converted, tagged and grouped into one deck file per Anki deck."""
+    apkg = tmp_path / "corso.apkg"
+    write_package(apkg)
+    decks_dir = tmp_path / "decks"
+
+    writer = DeckWriter(str(decks_dir), batch_size=1)
+    stats, errors = import_apkg.import_package(str(apkg), "b1", writer)
+
+    assert stats == {
+        "imported": 2,
+        "skipped": 1,
+        "invalid": 0,
+        "existing": 0,
+        "media": 0,
+    }
+    assert errors == []
+    lessico = decks_dir / "b1" / "lessico_citta.toml"
+    grammatica = decks_dir / "b1" / "grammatica.toml"
+    assert sorted(writer.created) == sorted([str(grammatica), str(lessico)])
+
+    (basic,) = load(lessico)["notes"]
+    assert basic["tags"] == ["b1", "lessico_citta"]
+    assert basic["fields"] == ["**la città**", "the city\n\n*femminile*"]
+
+    data = load(grammatica)
+    assert data["deck"] == "b1::grammatica"
+    (cloze,) = data["notes"]
+    assert cloze["model"] == "cloze"
+    assert cloze["fields"] == ["Io {{c1::vado}} a casa\ndomani"]
+    assert cloze["back"] == "Io vado a casa\ndomani"
+
+    for path in (lessico, grammatica):
+        assert validate.validate_file(str(path)) == []
+
+
+def test_import_again_skips_existing_notes(tmp_path):
+    """Importing a package a second time adds no duplicate note_ids."""
+    apkg = tmp_path / "corso.apkg"
+    write_package(apkg)
+    decks_dir = tmp_path / "decks"
+
+    writer = DeckWriter(str(decks_dir), batch_size=2)
+    stats, _ = import_apkg.import_package(str(apkg), "b1", writer, topic="corso")
+    assert (stats["imported"], stats["existing"]) == (2, 0)
+    writer = DeckWriter(str(decks_dir), batch_size=2)
+    stats, _ = import_apkg.import_package(str(apkg), "b1", writer, topic="corso")
+    assert (stats["imported"], stats["existing"]) == (0, 2)
+    assert writer.counts == {}
+
+    notes = load(decks_dir / "b1" / "corso.toml")["notes"]
+    assert len(notes) == 2
+    assert len({note["note_id"] for note in notes}) == 2
+    assert validate.validate_file(str(decks_dir / "b1" / "corso.toml")) == []
+
+
+def test_import_skips_invalid_notes(tmp_path):
+    """Notes failing the orthography rules are reported and not written."""
+    apkg = tmp_path / "lint.apkg"
+    deck = genanki.Deck(2059400112, "Lint")
+    deck.add_note(genanki.Note(model=BASIC, fields=["perche?", "why?", ""]))
+    deck.add_note(genanki.Note(model=BASIC, fields=["perché?", "why?", ""]))
+    genanki.Package(deck).write_to_file(str(apkg))
+    decks_dir = tmp_path / "decks"
+
+    writer = DeckWriter(str(decks_dir))
+    stats, errors = import_apkg.import_package(
+        str(apkg), "b1", writer, automaton=get_automaton()
+    )
+
+    assert (stats["imported"], stats["invalid"]) == (1, 1)
+    (error,) = errors
+    assert "perche" in error and "perché" in error
+    (note,) = load(decks_dir / "b1" / "lint.toml")["notes"]
+    assert note["fields"][0] == "perché?"
+
+
+def test_import_reads_collections_with_notetype_tables(tmp_path):
+    """A compressed collection.anki21b with deck and note type tables is imported."""
+    zstandard = pytest.importorskip("zstandard")
+    db_path = tmp_path / "collection.anki21b"
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        "CREATE TABLE col (ver INTEGER);"
+        "CREATE TABLE notetypes (id INTEGER, name TEXT, config BLOB);"
+        "CREATE TABLE decks (id INTEGER, name TEXT);"
+        "CREATE TABLE notes (id INTEGER, mid INTEGER, flds TEXT);"
+        "CREATE TABLE cards (nid INTEGER, did INTEGER, ord INTEGER);"
+        "INSERT INTO col VALUES (18);"
+        "INSERT INTO notetypes VALUES (1, 'Basic', x'1a0a'), (2, 'Cloze', x'08011a0a');"
+        "INSERT INTO decks VALUES (1, 'Corso\x1fLessico');"
+    )
+    conn.executemany(
+        "INSERT INTO notes VALUES (?, ?, ?)",
+        [(10, 1, "la casa\x1fthe house"), (11, 2, "Io {{c1::vado}}\x1f")],
+    )
+    conn.executemany("INSERT INTO cards VALUES (?, 1, 0)", [(10,), (11,)])
+    conn.commit()
+    conn.close()
+    apkg = tmp_path / "latest.apkg"
+    with zipfile.ZipFile(apkg, "w") as zf:
+        zf.writestr("collection.anki2", b"placeholder")
+        compressor = zstandard.ZstdCompressor()
+        zf.writestr("collection.anki21b", compressor.compress(db_path.read_bytes()))
+
+    decks_dir = tmp_path / "decks"
+    stats, errors = import_apkg.import_package(
+        str(apkg), "b1", DeckWriter(str(decks_dir))
+    )
+
+    assert (stats["imported"], errors) == (2, [])
+    data = load(decks_dir / "b1" / "lessico.toml")
+    assert data["deck"] == "b1::lessico"
+    basic, cloze = data["notes"]
+    assert basic["fields"] == ["la casa", "the house"]
+    assert (cloze["model"], cloze["fields"]) == ("cloze", ["Io {{c1::vado}}"])
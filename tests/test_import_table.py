@@ -0,0 +1,101 @@
+"""Tests for importing TSV and CSV files into deck files."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import import_table  # noqa: E402
+import validate  # noqa: E402
+from deck_writer import DeckWriter  # noqa: E402
+
+# Import appropriate TOML library based on Python version
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+EXISTING = """deck = "a2::vocab_casa"
+model = "cloze"
+
+[[notes]]
+note_id = 7
+tags = ["a2", "vocab_casa"]
+fields = ["La {{c1::cucina}} è grande"]
+back = "the kitchen"
+"""
+
+
+def load(path):
+    """Parse a deck file."""
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def test_import_tsv_assigns_free_note_ids(tmp_path):
+    """Rows are appended after the existing notes and failing rows are skipped."""
+    decks_dir = tmp_path / "decks"
+    (decks_dir / "a2").mkdir(parents=True)
+    existing = decks_dir / "a2" / "vocab_casa.toml"
+    existing.write_text(EXISTING, encoding="utf-8")
+
+    table = tmp_path / "casa.tsv"
+    table.write_text(
+        "front\tback\tmodel\ttopic\tnote_id\n"
+        "il tavolo\tthe table\t\t\t\n"
+        "Il {{c1::letto}} è comodo\tthe bed\tcloze\t\t\n"
+        "la sedia\t\t\t\t\n"
+        "la porta\tthe door\t\t\t7\n"
+        "la lampada\tthe lamp\tphoto\t\t\n"
+        "il treno\tthe train\t\tvocab_viaggi\t\n",
+        encoding="utf-8",
+    )
+
+    writer = DeckWriter(str(decks_dir), batch_size=2)
+    mapping = import_table.parse_mapping([])
+    defaults = {"level": "a2", "topic": "vocab_casa", "model": "basic"}
+    stats, errors = import_table.import_table(str(table), writer, mapping, defaults)
+
+    assert stats == {"imported": 3, "skipped": 3}
+    assert [error.split("]")[0].split("[")[1] for error in errors] == [
+        "line 4",
+        "line 5",
+        "line 6",
+    ]
+    assert "already used" in errors[1]
+
+    notes = load(existing)["notes"]
+    assert [note["note_id"] for note in notes] == [7, 8, 9]
+    assert notes[1] == {
+        "note_id": 8,
+        "tags": ["a2", "vocab_casa"],
+        "model": "basic",
+        "fields": ["il tavolo", "the table"],
+    }
+    assert "model" not in notes[2]
+
+    viaggi = decks_dir / "a2" / "vocab_viaggi.toml"
+    assert load(viaggi)["notes"][0]["note_id"] == 1
+    for path in (existing, viaggi):
+        assert validate.validate_file(str(path)) == []
+
+
+def test_import_csv_with_column_mapping(tmp_path):
+    """Columns are mapped by --map and quoted cells may span lines."""
+    table = tmp_path / "parole.csv"
+    table.write_text(
+        'italiano,inglese,livello,argomento\n"ciao","hello\nhi",a1,saluti\n',
+        encoding="utf-8",
+    )
+    mapping = import_table.parse_mapping(
+        ["front=italiano", "back=inglese", "level=livello", "topic=argomento"]
+    )
+
+    writer = DeckWriter(str(tmp_path / "decks"))
+    stats, errors = import_table.import_table(
+        str(table), writer, mapping, {"model": "basic"}
+    )
+
+    assert (stats, errors) == ({"imported": 1, "skipped": 0}, [])
+    deck = tmp_path / "decks" / "a1" / "saluti.toml"
+    assert load(deck)["notes"][0]["fields"] == ["ciao", "hello\nhi"]
+    assert validate.validate_file(str(deck)) == []
@@ -0,0 +1,96 @@
+"""Tests for inspecting and comparing Anki packages."""
+import json
+import os
+import sys
+
+import genanki
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import inspect_apkg  # noqa: E402
+from apkg import write_reproducible_package  # noqa: E402
+
+MODEL = genanki.Model(
+    1607392319,
+    "Basic",
+    fields=[{"name": "Front"}, {"name": "Back"}],
+    templates=[{"name": "Card 1", "qfmt": "{{Front}}", "afmt": "{{Back}}"}],
+)
+
+
+def write_package(path, notes, package_format="legacy"):
+    """Write a package from (deck, guid, front, back, tags) tuples."""
+    decks = {}
+    for deck_name, guid, front, back, tags in notes:
+        if deck_name not in decks:
+            decks[deck_name] = genanki.Deck(2059400110 + len(decks), deck_name)
+        decks[deck_name].add_note(
+            genanki.Note(model=MODEL, fields=[front, back], guid=guid, tags=tags)
+        )
+    package = genanki.Package(list(decks.values()))
+    write_reproducible_package(package, str(path), 1700000000, None, package_format)
+
+
+OLD = [
+    ("Italiano::A1", "keep", "la casa", "the house", ["a1"]),
+    ("Italiano::A1", "edit", "il cane", "the dog", ["a1"]),
+    ("Italiano::A1", "drop", "il gatto", "the cat", ["a1"]),
+]
+NEW = [
+    ("Italiano::A1", "keep", "la casa", "the house", ["a1"]),
+    ("Italiano::A2", "edit", "il cane", "the dogs", ["a1", "plural"]),
+    ("Italiano::A2", "plus", "la città", "the city", ["a2"]),
+]
+
+
+@pytest.mark.parametrize("package_format", ["legacy", "latest"])
+def test_info_counts_notes_per_deck(tmp_path, package_format):
+    """The summary reports notes per deck and model for both package formats."""
+    if package_format == "latest":
+        pytest.importorskip("zstandard")
+    path = tmp_path / "new.apkg"
+    write_package(path, NEW, package_format)
+
+    with inspect_apkg.PackageReader(str(path)) as reader:
+        info = reader.info()
+        notes = list(reader.iter_notes())
+
+    assert info["notes"] == 3
+    assert info["cards"] == 3
+    assert info["decks"] == {"Italiano::A1": 1, "Italiano::A2": 2}
+    assert info["models"] == {"Basic": 3}
+    assert [note.guid for note in notes] == ["edit", "keep", "plus"]
+    assert notes[2].fields == ["la città", "the city"]
+
+
+def test_diff_reports_added_removed_and_changed_notes(tmp_path, capsys, monkeypatch):
+    """Notes are matched by GUID; unchanged notes are not reported."""
+    old, new = tmp_path / "old.apkg", tmp_path / "new.apkg"
+    write_package(old, OLD)
+    write_package(new, NEW)
+
+    with inspect_apkg.PackageReader(str(old)) as a, inspect_apkg.PackageReader(
+        str(new)
+    ) as b:
+        changes = list(inspect_apkg.diff_notes(a.iter_notes(), b.iter_notes()))
+
+    assert [(c.change, c.guid) for c in changes] == [
+        ("removed", "drop"),
+        ("changed", "edit"),
+        ("added", "plus"),
+    ]
+    lines = inspect_apkg.describe_change(changes[1])
+    assert lines[1:] == [
+        "    deck: Italiano::A1 -> Italiano::A2",
+        "    field 2: 'the dog' -> 'the dogs'",
+        "    tags: a1 -> a1 plural",
+    ]
+
+    monkeypatch.setattr(
+        sys, "argv", ["inspect_apkg.py", "diff", str(old), str(new), "--json"]
+    )
+    assert inspect_apkg.main() == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r["change"] for r in records] == ["removed", "changed", "added"]
+    assert records[2]["new"]["fields"] == ["la città", "the city"]
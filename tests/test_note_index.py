@@ -0,0 +1,92 @@
+"""Tests for the note index and the --select query language."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import note_index  # noqa: E402
+
+DECK = """deck = "{level}::{topic}"
+model = "basic"
+
+[[notes]]
+note_id = 10001
+tags = ["{level}", "{topic}"]
+fields = ["uno", "one"]
+
+[[notes]]
+note_id = 10002
+model = "cloze"
+tags = ["{level}", "{topic}", "cloze"]
+fields = ["{{{{c1::due}}}}"]
+back = "two"
+"""
+
+
+def write_deck(decks_dir, level, topic):
+    """Write a deck file with one basic and one cloze note and return its path."""
+    lvl_dir = decks_dir / level
+    lvl_dir.mkdir(parents=True, exist_ok=True)
+    path = lvl_dir / f"{topic}.toml"
+    path.write_text(DECK.format(level=level, topic=topic), encoding="utf-8")
+    return path
+
+
+def test_parse_query_precedence():
+    """NOT binds tighter than AND, AND tighter than OR, and AND is implicit."""
+    assert note_index.parse_query("tag:a OR tag:b level:a2") == (
+        "or",
+        ("term", "tag", "a"),
+        ("and", ("term", "tag", "b"), ("term", "level", "a2")),
+    )
+    assert note_index.parse_query("NOT (model:cloze or topic:x*)") == (
+        "not",
+        ("or", ("term", "model", "cloze"), ("term", "topic", "x*")),
+    )
+    for bad in ["", "tag:", "color:red", "(tag:a", "tag:a )", "tag:a AND"]:
+        with pytest.raises(ValueError):
+            note_index.parse_query(bad)
+
+
+def test_select_matches_notes_by_position(tmp_path):
+    """Queries combine tags, levels, topic globs and models."""
+    decks_dir = tmp_path / "decks"
+    verbi_a1 = write_deck(decks_dir, "a1", "verbi_essere")
+    write_deck(decks_dir, "a1", "colori")
+    verbi_a2 = write_deck(decks_dir, "a2", "verbi_futuro")
+
+    index = note_index.NoteIndex(str(decks_dir))
+    assert index.select("tag:verbi_* AND level:a2") == {str(verbi_a2): [0, 1]}
+    assert index.select("topic:verbi_* model:cloze") == {
+        str(verbi_a1): [1],
+        str(verbi_a2): [1],
+    }
+    assert index.select("level:a1 AND NOT topic:verbi_* AND NOT model:cloze") == {
+        str(decks_dir / "a1" / "colori.toml"): [0]
+    }
+    assert index.select("tag:nessuno") == {}
+
+
+def test_index_reparses_only_changed_files(tmp_path, monkeypatch):
+    """A persisted index only parses deck files whose content changed."""
+    decks_dir = tmp_path / "decks"
+    write_deck(decks_dir, "a1", "numeri")
+    changed = write_deck(decks_dir, "a1", "colori")
+    note_index.NoteIndex(str(decks_dir)).save()
+
+    changed.write_text(
+        DECK.format(level="a1", topic="colori").replace('"cloze"]', '"extra"]'),
+        encoding="utf-8",
+    )
+    parsed = []
+    original = note_index.read_note_attributes
+    monkeypatch.setattr(
+        note_index,
+        "read_note_attributes",
+        lambda path: parsed.append(path) or original(path),
+    )
+    index = note_index.NoteIndex(str(decks_dir))
+    assert parsed == [str(changed)]
+    assert index.select("tag:extra") == {str(changed): [1]}
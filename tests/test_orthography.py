@@ -0,0 +1,88 @@
+"""Tests for the orthography automaton and its use in validate.py."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import orthography  # noqa: E402
+import validate  # noqa: E402
+
+RULES = """
+[[rules]]
+message = "missing accent"
+
+[rules.replace]
+perche = "perché"
+citta = "città"
+che = "ché"
+
+[[rules]]
+message = "wrong apostrophe"
+
+[rules.replace]
+"qual'è" = "qual è"
+"""
+
+
+@pytest.fixture
+def automaton(tmp_path):
+    """Compile a small rule set."""
+    path = tmp_path / "orthography.toml"
+    path.write_text(RULES, encoding="utf-8")
+    return orthography.Automaton(orthography.load_rules(str(path)))
+
+
+def test_scan_matches_whole_words(automaton):
+    """Overlapping patterns, case, typographic apostrophes and word boundaries."""
+    text = "Perche in città? La cittadinanza, la citta. Qual’è?"
+    found = [(f.text, f.suggestion, f.message) for f in automaton.scan(text)]
+
+    assert found == [
+        ("Perche", "Perché", "missing accent"),
+        ("citta", "città", "missing accent"),
+        ("Qual’è", "Qual è", "wrong apostrophe"),
+    ]
+    assert [f.start for f in automaton.scan("x perche")] == [2]
+
+
+def test_shipped_rules_skip_words_correct_without_accent():
+    """Words that are also correct unaccented, like 'giacche' (jackets), pass."""
+    automaton = orthography.get_automaton()
+    assert automaton is not None
+    assert list(automaton.scan("Le giacche sono in saldo.")) == []
+    assert [f.suggestion for f in automaton.scan("giacchè")] == ["giacché"]
+
+
+def test_load_rules_rejects_duplicates(tmp_path):
+    """A misspelling listed twice is an error."""
+    path = tmp_path / "orthography.toml"
+    path.write_text(
+        RULES.replace('citta = "città"', 'citta = "città"\nCitta = "città"'),
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError, match="listed twice"):
+        orthography.load_rules(str(path))
+
+
+def test_validate_file_reports_positions(tmp_path, automaton):
+    """Findings name the note, field, line and column."""
+    level_dir = tmp_path / "a1"
+    level_dir.mkdir()
+    deck = level_dir / "saluti.toml"
+    deck.write_text(
+        'deck = "a1::saluti"\n\n'
+        "[[notes]]\n"
+        'tags = ["a1", "saluti"]\n'
+        'fields = ["Ciao", "Ciao!\\nPerche no?"]\n',
+        encoding="utf-8",
+    )
+
+    errors = validate.validate_file(str(deck), automaton)
+
+    assert errors == [
+        f"ERR {deck} [note 1]: field 2 line 2 col 1: "
+        "'Perche' should be 'Perché' (missing accent)"
+    ]
+    assert validate.validate_file(str(deck)) == []
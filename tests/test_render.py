@@ -0,0 +1,108 @@
+"""Tests for the Markdown rendering pipeline."""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import render  # noqa: E402
+from deck_catalog import DeckCatalog  # noqa: E402
+
+DECKS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "decks")
+
+# Pieces of the fuzzed corpus: text, emphasis, lists, links, line breaks, cloze markers,
+# HTML and other syntax the fast backends must decline
+FUZZ_ATOMS = [
+    "ciao", "città", "Vado", "42", "1.", "1. ", "- ", "* ", "+ ", "*", "**", "***",
+    "_", "__", "`", "# ", ">", "&", "&amp;", "<br>", "<b>", "[a](b)", "![x](y)",
+    "<http://x.it>", "{{c1::al}}", "{{c2::va::verb}}", "::", " ", "  ", "\n",
+    "\n\n", "\t", "=", "---", "\\", '"', "'", "!", ":", "(", ")", "é", "\u00a0",
+    "a_b", "2*3*4",
+]  # fmt: skip
+
+
+def deck_fields():
+    """Collect the Markdown source of every field in decks/."""
+    fields = []
+    for sources in DeckCatalog(DECKS_DIR).sources().values():
+        for source in sources:
+            for note in source.iter_notes():
+                fields.extend(note.get("fields", []))
+                fields.append(note.get("back", ""))
+    return sorted(set(field for field in fields if field))
+
+
+def fuzz_fields(count, seed=0):
+    """Generate random fields from FUZZ_ATOMS."""
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(FUZZ_ATOMS) for _ in range(rng.randint(1, 10)))
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("name", render.available_backends())
+def test_backends_match_the_reference(name):
+    """Every backend renders decks/ and a fuzzed corpus exactly like the reference."""
+    reference = render.BACKENDS[render.REFERENCE_BACKEND]()
+    backend = render.BACKENDS[name]()
+    fields = deck_fields()
+    assert len(fields) > 1000
+    rendered = 0
+    for field in fields + fuzz_fields(5000):
+        html = backend.render(field)
+        if html is not None:
+            assert html == reference.render(field), field
+            rendered += 1
+    assert rendered > len(fields) // 2
+
+
+def test_backend_selection_keeps_the_reference_last():
+    """Fields a fast backend declines are rendered by the reference backend."""
+    try:
+        assert render.select_backends("inline") == ["inline", "python-markdown"]
+        assert render.BACKENDS["inline"]().render("- Item 1\n- Item 2") is None
+        rendered = render.render_markdown("- Item 1\n- Item 2")
+        assert rendered == "<ul><li>Item 1</li><li>Item 2</li></ul>"
+        assert render.select_backends("python-markdown") == ["python-markdown"]
+        with pytest.raises(ValueError, match="Unknown Markdown backend"):
+            render.select_backends("commonmark")
+    finally:
+        render.select_backends()
+
+
+def test_single_paragraph_wrapper_is_removed():
+    """A one-paragraph field is stored without its <p> wrapper."""
+    assert render.render_markdown("ciao") == "ciao"
+    assert render.render_markdown("**Bold text**") == "<strong>Bold text</strong>"
+    assert (
+        render.render_markdown("Vado {{c1::al}} cinema.") == "Vado {{c1::al}} cinema."
+    )
+
+
+def test_line_breaks_and_block_whitespace_are_collapsed():
+    """Line breaks are shortened and newlines between blocks dropped."""
+    rendered = render.render_markdown("Meaning: one\nExample: Ho uno libro")
+    assert rendered == "Meaning: one<br>Example: Ho uno libro"
+    assert render.render_markdown("a\n\nb") == "<p>a</p><p>b</p>"
+    rendered = render.render_markdown("- Item 1\n- Item 2")
+    assert rendered == "<ul><li>Item 1</li><li>Item 2</li></ul>"
+
+
+def test_preformatted_blocks_are_left_alone():
+    """Fields with <pre> blocks keep their whitespace."""
+    html = render.render_markdown("    code\n    more")
+    assert html.startswith("<pre>")
+    assert "\n" in html
+
+
+def test_load_stylesheet_hash(tmp_path):
+    """The stylesheet is loaded with a short content hash."""
+    css_path = tmp_path / "styles.css"
+    css_path.write_text(".card { color: #333; }\n", encoding="utf-8")
+    css, css_hash = render.load_stylesheet(str(css_path))
+    assert css == ".card { color: #333; }"
+    assert len(css_hash) == 8
+    assert render.load_stylesheet(str(tmp_path / "missing.css")) == ("", "")
@@ -0,0 +1,95 @@
+"""Tests for the static card search index of the documentation site."""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import search_index  # noqa: E402
+
+DECK = """deck = "{level}::{topic}"
+model = "basic"
+
+[[notes]]
+note_id = 1
+tags = ["{level}", "{topic}"]
+fields = ["**la città**", "the city"]
+
+[[notes]]
+note_id = 2
+model = "cloze"
+tags = ["{level}", "{topic}"]
+fields = ["Vado in {{{{c1::città}}}} domani"]
+back = "I go to town tomorrow"
+"""
+
+
+def write_deck(decks_dir, level, topic, text=DECK):
+    """Write a deck file and return its path."""
+    lvl_dir = decks_dir / level
+    lvl_dir.mkdir(parents=True, exist_ok=True)
+    path = lvl_dir / f"{topic}.toml"
+    path.write_text(text.format(level=level, topic=topic), encoding="utf-8")
+    return path
+
+
+def lookup(out_dir, word):
+    """Resolve a word like the browser loader: prefix match in its term shard."""
+    manifest = json.loads((out_dir / "index.json").read_text(encoding="utf-8"))
+    shard = out_dir / "terms" / f"{word[: manifest['prefix']]}.json"
+    notes = set()
+    for term, deltas in json.loads(shard.read_text(encoding="utf-8")).items():
+        if term.startswith(word):
+            note = 0
+            for delta in deltas:
+                note += delta
+                notes.add(note)
+    documents = []
+    for note in sorted(notes):
+        block = out_dir / "docs" / f"{note // manifest['block']}.json"
+        documents.append(
+            json.loads(block.read_text(encoding="utf-8"))[note % manifest["block"]]
+        )
+    return documents
+
+
+def test_tokenize_folds_accents_and_markup():
+    """Fields are reduced to plain text and terms are folded like queries."""
+    text = search_index.plain_text("**Città** di {{c1::Perù::paese}} <br> [qui](x)")
+    assert text == "Città di Perù qui"
+    assert search_index.tokenize(text) == ["citta", "di", "peru", "qui"]
+
+
+def test_build_is_sharded_and_incremental(tmp_path):
+    """Terms are found by prefix and a rebuild only touches changed files."""
+    decks_dir = tmp_path / "decks"
+    out_dir = tmp_path / "card-index"
+    write_deck(decks_dir, "a1", "luoghi")
+    changed = write_deck(decks_dir, "a2", "viaggi")
+
+    stats = search_index.SearchIndexBuilder(str(decks_dir)).build(str(out_dir))
+    assert (stats["notes"], stats["parsed"], stats["removed"]) == (4, 2, 0)
+    assert lookup(out_dir, "citt") == [
+        ["la città", "the city", "a1/luoghi"],
+        ["Vado in città domani", "I go to town tomorrow", "a1/luoghi"],
+        ["la città", "the city", "a2/viaggi"],
+        ["Vado in città domani", "I go to town tomorrow", "a2/viaggi"],
+    ]
+
+    stats = search_index.SearchIndexBuilder(str(decks_dir)).build(str(out_dir))
+    assert (stats["parsed"], stats["written"]) == (0, 0)
+
+    changed.write_text(
+        DECK.format(level="a2", topic="viaggi").replace("domani", "stasera"),
+        encoding="utf-8",
+    )
+    stats = search_index.SearchIndexBuilder(str(decks_dir)).build(str(out_dir))
+    assert stats["parsed"] == 1
+    assert stats["removed"] == 0
+    assert [doc[2] for doc in lookup(out_dir, "stasera")] == ["a2/viaggi"]
+    assert [doc[2] for doc in lookup(out_dir, "domani")] == ["a1/luoghi"]
+
+    (decks_dir / "a1" / "luoghi.toml").unlink()
+    stats = search_index.SearchIndexBuilder(str(decks_dir)).build(str(out_dir))
+    assert stats["notes"] == 2
+    assert not (out_dir / "terms" / "do.json").exists()
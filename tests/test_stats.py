@@ -0,0 +1,80 @@
+"""Tests for the columnar corpus statistics."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import stats  # noqa: E402
+
+DECK = """deck = "{level}::{topic}"
+model = "basic"
+
+[[notes]]
+note_id = 10001
+tags = ["{level}", "{topic}"]
+fields = ["uno", "one"]
+
+[[notes]]
+note_id = 10002
+tags = ["{level}", "{topic}"]
+fields = ["**dodici**", "twelve"]
+
+[[notes]]
+note_id = 10003
+model = "cloze"
+tags = ["{level}", "{topic}"]
+fields = ["{{{{c1::tre}}}}"]
+back = "three"
+"""
+
+
+def write_deck(decks_dir, level, topic):
+    """Write a three-note deck file and return its path."""
+    lvl_dir = decks_dir / level
+    lvl_dir.mkdir(parents=True, exist_ok=True)
+    path = lvl_dir / f"{topic}.toml"
+    path.write_text(DECK.format(level=level, topic=topic), encoding="utf-8")
+    return path
+
+
+def test_summary_of_loaded_corpus(tmp_path):
+    """Counts, lengths, cloze share and largest notes come from the columns."""
+    decks_dir = tmp_path / "decks"
+    write_deck(decks_dir, "a1", "numeri")
+    write_deck(decks_dir, "a2", "numeri")
+    corpus = stats.load_corpus(str(decks_dir))
+    assert len(corpus) == 6
+    assert corpus.field(1, 0) == "**dodici**"
+    assert corpus.field(2, 1) == "three"
+
+    summary = stats.summarize(corpus, top=1, chunk_notes=2)
+    assert summary["by_level_topic"] == [
+        {"level": "a1", "topic": "numeri", "notes": 3},
+        {"level": "a2", "topic": "numeri", "notes": 3},
+    ]
+    assert summary["lengths"]["front"]["max"] == len("{{c1::tre}}")
+    assert summary["lengths"]["total"]["p50"] == 16
+    assert summary["cloze"][-1] == {
+        "level": "all",
+        "notes": 6,
+        "cloze": 2,
+        "share": 0.3333,
+    }
+    assert summary["largest"][0]["source"] == 16
+    assert summary["largest"][0]["rendered"] == len("<strong>dodici</strong>twelve")
+    assert [row["chunks"] for row in summary["chunks"]] == [2, 2]
+    assert "Cloze share:" in stats.format_summary(summary)
+
+
+def test_synthetic_corpus_percentiles_match_sorting():
+    """Percentiles read from value counts agree with a full sort."""
+    corpus = stats.synthetic_corpus(5000, seed=3)
+    assert len(corpus) == 5000
+    totals = sorted(corpus.field_lengths()[2])
+    summary = stats.length_summary(corpus)["total"]
+    for pct in stats.PERCENTILES:
+        assert summary[f"p{pct}"] == totals[len(totals) * pct // 100]
+    assert summary["max"] == totals[-1]
+    assert (
+        sum(row["notes"] for row in stats.length_summary(corpus)["histogram"]) == 5000
+    )